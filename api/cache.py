@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import functools
+import logging
+import time
+
+import psycopg2
+
+from api.database import fetch_all
+from scripts.config import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_VERSION_CHECK_SECONDS
+
+class ResponseCache:
+    """
+    In-process cache of endpoint responses keyed by endpoint name and parameters.
+    Entries expire after ttl_seconds, the least recently used entry is evicted beyond max_entries,
+    and the whole cache is dropped when the pipeline bumps meta.data_version (checked at most
+    every version_check_seconds).
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS, version_check_seconds=CACHE_VERSION_CHECK_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._data_version = None
+        self._version_checked_at = float("-inf")
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    async def _refresh_data_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_seconds:
+            return
+        self._version_checked_at = now
+        try:
+            rows = await fetch_all("SELECT version FROM meta.data_version WHERE id = 1;")
+        except psycopg2.Error as e:
+            # No pipeline run has created the marker yet, or the check failed; TTLs still bound staleness
+            logging.warning(f"Could not read meta.data_version: {e}")
+            return
+        version = rows[0][0] if rows else 0
+        # Includes the first version read: entries cached while it was unknown may predate it
+        if version != self._data_version and self._entries:
+            logging.info(f"Data version changed from {self._data_version} to {version}, clearing response cache")
+            self.clear()
+            self.stats["invalidations"] += 1
+        self._data_version = version
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, key):
+        """Returns (True, value) for a live entry, (False, None) otherwise."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def cached(self, endpoint):
+        """Decorator caching an async endpoint's result under (endpoint, its keyword arguments)."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(**kwargs):
+                await self._refresh_data_version()
+                key = (endpoint, tuple(sorted(kwargs.items())))
+                hit, value = self.get(key)
+                if hit:
+                    self.stats["hits"] += 1
+                    return value
+                self.stats["misses"] += 1
+                value = await func(**kwargs)
+                self.set(key, value)
+                return value
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Counters plus current size, for the stats endpoint."""
+        return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries, "data_version": self._data_version}
+
+response_cache = ResponseCache()
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+import logging
+import threading
+
+import anyio
+
+from psycopg2.pool import ThreadedConnectionPool
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from scripts.config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, DB_POOL_MIN_CONN, DB_POOL_MAX_CONN
+
+# Created once at application startup by init_pool() and closed at shutdown by close_pool()
+_pool = None
+# ThreadedConnectionPool raises instead of waiting when it is exhausted, so callers queue on this first
+_pool_slots = None
+
+def init_pool(min_conn=DB_POOL_MIN_CONN, max_conn=DB_POOL_MAX_CONN):
+    """Opens the shared connection pool."""
+    global _pool, _pool_slots
+    _pool = ThreadedConnectionPool(
+        min_conn, max_conn,
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+    _pool_slots = threading.BoundedSemaphore(max_conn)
+    logging.info(f"Database connection pool opened ({min_conn}-{max_conn} connections).")
+
+def close_pool():
+    """Closes every connection in the shared pool."""
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+        logging.info("Database connection pool closed.")
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a connection from the pool, blocking while all of them are in use.
+    Connections run in autocommit mode, since the API only reads; a connection that broke
+    while borrowed is discarded instead of being returned to the pool.
+    """
+    if _pool is None:
+        raise RuntimeError("Database connection pool is not initialised")
+    with _pool_slots:
+        conn = _pool.getconn()
+        try:
+            conn.autocommit = True
+            yield conn
+        finally:
+            _pool.putconn(conn, close=bool(conn.closed))
+
+def _fetch_all(query, params):
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+async def fetch_all(query, params=None):
+    """Runs a query on a pooled connection in a worker thread, so the event loop never blocks on the database."""
+    return await run_in_threadpool(_fetch_all, query, params)
+
+def stream_rows(query, params=None, batch_size=5000):
+    """
+    Yields lists of at most batch_size rows from a server-side cursor, so a result of any size is read
+    with constant memory. Meant to be iterated from a worker thread (Starlette does that for a sync
+    StreamingResponse body); the pooled connection stays borrowed until the generator is exhausted or
+    closed, and closing it early (see iterate_closing) closes the cursor and returns the connection.
+    """
+    with pooled_connection() as conn:
+        # Named cursors only exist inside a transaction, so this connection leaves autocommit until it is returned
+        conn.autocommit = False
+        cur = conn.cursor(name="stream_rows")
+        try:
+            cur.itersize = batch_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            # Also runs on GeneratorExit, when the consumer stops partway
+            if not conn.closed:
+                cur.close()
+                conn.rollback()
+
+async def iterate_closing(iterator):
+    """
+    Iterates a sync generator in worker threads, like a StreamingResponse body, and closes it afterwards,
+    including when the client disconnects partway; otherwise it (and any pooled connection it holds)
+    would only be released when garbage-collected.
+    """
+    try:
+        async for item in iterate_in_threadpool(iterator):
+            yield item
+    finally:
+        with anyio.CancelScope(shield=True): # The response task may be cancelled by the disconnect
+            await run_in_threadpool(iterator.close)
@@ -1,18 +1,58 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, closing
+from datetime import date
+from typing import Optional
+import base64
+import json
+import math
+import time
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import psycopg2
-from scripts.config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+from api.database import init_pool, close_pool, fetch_all, iterate_closing, stream_rows
+from api.cache import response_cache
+from scripts.instrumentation import REGISTRY
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+@asynccontextmanager
+async def lifespan(app):
+    """Opens the database connection pool at startup and closes it at shutdown, including a failed one."""
+    init_pool()
+    try:
+        yield
+    finally:
+        close_pool()
+
 app = FastAPI(
     title="Medical Data API",
     description="API for querying medical product and channel activity data from Telegram.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Observes every request in the api_request_duration_seconds histogram, labelled by method, route template
+    (so /api/channels/{channel_name}/activity is one series, not one per channel) and status code.
+    Streamed responses are timed until their headers are sent.
+    """
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REGISTRY.observe(
+            "api_request_duration_seconds", time.perf_counter() - started,
+            method=request.method, route=route.path if route else "unmatched", status=status_code
+        )
+
 # Pydantic models for API responses
 class ProductResponse(BaseModel):
     product_name: str
@@ -22,119 +62,519 @@ class ChannelActivityResponse(BaseModel):
     date: str
     message_count: int
 
+class ChannelTrendResponse(BaseModel):
+    channel_name: str
+    period: str # First day of the day, week (Monday) or month
+    message_count: int
+    image_message_count: int
+    image_share: float
+
+class VisualContentTrendResponse(BaseModel):
+    channel_name: str
+    period: str
+    detected_class: str
+    detection_count: int
+    image_count: int # Sum of daily distinct images, so an image reposted on two days counts twice
+    avg_confidence: float
+
+class PriceTrendResponse(BaseModel):
+    product_name: str
+    period: str
+    min_price: float
+    median_price: float
+    max_price: float
+    price_count: int # Prices observed in the period
+
 class ImageDetectionResponse(BaseModel):
+    detection_id: int # Pass the last one back as ?after_id= to get the next page
     message_id: int
     image_path: str
     detected_class: str
     confidence: float
     bbox_xyxy: list[float] # Assuming bbox_xyxy is a list of floats
 
-def get_db_connection():
-    """Establishes and returns a PostgreSQL database connection."""
+class MessageSearchResult(BaseModel):
+    message_id: int
+    channel_name: str
+    date: Optional[str]
+    message_text: str
+    rank: float
+
+class MessageSearchResponse(BaseModel):
+    results: list[MessageSearchResult]
+    next_cursor: Optional[str] # Pass back as ?cursor= to get the next page; null on the last page
+
+def encode_cursor(*values):
+    """Opaque keyset pagination cursor holding the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _is_cursor_value(value, expected_type):
+    if isinstance(value, bool):
+        return False
+    if expected_type is float:
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    if expected_type is int:
+        return isinstance(value, int) and -2**63 <= value < 2**63 # BIGINT range
+    return isinstance(value, expected_type)
+
+def decode_cursor(cursor, types):
+    """
+    Inverse of encode_cursor; rejects anything that is not a list of values of the given types
+    (one per sort key column) with a 400, so a tampered cursor never reaches the query.
+    """
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-        )
-        logging.info("Database connection established.")
-        return conn
-    except psycopg2.Error as e:
-        logging.error(f"Failed to connect to database: {e}")
-        raise
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(_is_cursor_value(value, expected_type) for value, expected_type in zip(values, types))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
 
 @app.get("/api/reports/top-products", response_model=list[ProductResponse], summary="Get top mentioned products")
+@response_cache.cached("top-products")
 async def top_products(limit: int = 10):
     """
-    Retrieves the top N products mentioned in Telegram messages based on text content.
+    Retrieves the top N products by number of messages mentioning them.
+    Mentions are extracted at load time with the product dictionary matcher and pre-aggregated by dbt.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT message_text, COUNT(*) as mention_count
-            FROM dbt_marts.fct_messages
-            WHERE message_text ILIKE '%paracetamol%' OR message_text ILIKE '%antibiotic%' OR message_text ILIKE '%vaccine%' -- Example keywords
-            GROUP BY message_text
-            ORDER BY mention_count DESC
+        results = await fetch_all("""
+            SELECT product_name, message_count
+            FROM dbt_marts.agg_product_mentions
+            ORDER BY message_count DESC
             LIMIT %s;
         """, (limit,))
-        results = cur.fetchall()
-        cur.close()
         return [{"product_name": row[0], "mention_count": row[1]} for row in results]
     except psycopg2.Error as e:
         logging.error(f"Error fetching top products: {e}")
         raise # Re-raise for FastAPI to handle as an internal server error
-    finally:
-        if conn:
-            conn.close()
 
 @app.get("/api/channels/{channel_name}/activity", response_model=list[ChannelActivityResponse], summary="Get daily activity for a specific channel")
+@response_cache.cached("channel-activity")
 async def channel_activity(channel_name: str):
     """
-    Retrieves the daily message count for a specified Telegram channel.
+    Retrieves the daily message count for a specified Telegram channel, from the agg_channel_daily rollup.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT dd.date_pk, COUNT(fm.message_id) as message_count
-            FROM dbt_marts.fct_messages fm
-            JOIN dbt_marts.dim_channels dc ON fm.channel_sk = dc.channel_sk
-            JOIN dbt_marts.dim_dates dd ON fm.date_pk = dd.date_pk
+        results = await fetch_all("""
+            SELECT acd.date_pk, acd.message_count
+            FROM dbt_marts.agg_channel_daily acd
+            JOIN dbt_marts.dim_channels dc ON acd.channel_sk = dc.channel_sk
             WHERE dc.channel_name = %s
-            GROUP BY dd.date_pk
-            ORDER BY dd.date_pk;
+            ORDER BY acd.date_pk;
         """, (channel_name,))
-        results = cur.fetchall()
-        cur.close()
         return [{"date": str(row[0]), "message_count": row[1]} for row in results]
     except psycopg2.Error as e:
         logging.error(f"Error fetching channel activity: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
+
+TREND_GRANULARITIES = ("day", "week", "month") # Passed to date_trunc as is
+
+def trend_filters(channel, date_from, date_to, alias):
+    """WHERE conditions and parameters for the rollup-backed trend endpoints."""
+    conditions = []
+    params = {}
+    if channel:
+        conditions.append("dc.channel_name = %(channel)s")
+        params["channel"] = channel
+    if date_from:
+        conditions.append(f"{alias}.date_pk >= %(date_from)s")
+        params["date_from"] = date_from
+    if date_to:
+        conditions.append(f"{alias}.date_pk <= %(date_to)s")
+        params["date_to"] = date_to
+    return conditions, params
+
+@app.get("/api/reports/channel-trends", response_model=list[ChannelTrendResponse], summary="Message volume and image share over time")
+@response_cache.cached("channel-trends")
+async def channel_trends(
+    granularity: str = Query("day", description="day, week or month"),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    Messages and the share of them carrying an image, per channel per period.
+    Served from the agg_channel_daily rollup; weeks and months are sums of its days.
+    """
+    if granularity not in TREND_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {TREND_GRANULARITIES}")
+    conditions, params = trend_filters(channel, date_from, date_to, "acd")
+    params["granularity"] = granularity
+    try:
+        results = await fetch_all(f"""
+            SELECT
+                dc.channel_name,
+                date_trunc(%(granularity)s, acd.date_pk)::date AS period,
+                SUM(acd.message_count) AS message_count,
+                SUM(acd.image_message_count) AS image_message_count
+            FROM dbt_marts.agg_channel_daily acd
+            JOIN dbt_marts.dim_channels dc ON acd.channel_sk = dc.channel_sk
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            GROUP BY dc.channel_name, period
+            ORDER BY dc.channel_name, period;
+        """, params)
+        return [
+            {
+                "channel_name": row[0],
+                "period": str(row[1]),
+                "message_count": row[2],
+                "image_message_count": row[3],
+                "image_share": round(row[3] / row[2], 4) if row[2] else 0.0
+            }
+            for row in results
+        ]
+    except psycopg2.Error as e:
+        logging.error(f"Error fetching channel trends: {e}")
+        raise
+
+@app.get("/api/reports/visual-content-trends", response_model=list[VisualContentTrendResponse], summary="Detected object classes over time")
+@response_cache.cached("visual-content-trends")
+async def visual_content_trends(
+    granularity: str = Query("day", description="day, week or month"),
+    channel: Optional[str] = None,
+    detected_class: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    YOLO detections per class per channel per period, with the number of images and average confidence.
+    Served from the agg_detections_daily rollup; weeks and months are sums of its days.
+    """
+    if granularity not in TREND_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {TREND_GRANULARITIES}")
+    conditions, params = trend_filters(channel, date_from, date_to, "adt")
+    if detected_class:
+        conditions.append("adt.detected_class = %(detected_class)s")
+        params["detected_class"] = detected_class
+    params["granularity"] = granularity
+    try:
+        results = await fetch_all(f"""
+            SELECT
+                dc.channel_name,
+                date_trunc(%(granularity)s, adt.date_pk)::date AS period,
+                adt.detected_class,
+                SUM(adt.detection_count) AS detection_count,
+                SUM(adt.image_count) AS image_count,
+                SUM(adt.confidence_sum) / SUM(adt.detection_count) AS avg_confidence
+            FROM dbt_marts.agg_detections_daily adt
+            JOIN dbt_marts.dim_channels dc ON adt.channel_sk = dc.channel_sk
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            GROUP BY dc.channel_name, period, adt.detected_class
+            ORDER BY dc.channel_name, period, detection_count DESC;
+        """, params)
+        return [
+            {
+                "channel_name": row[0],
+                "period": str(row[1]),
+                "detected_class": row[2],
+                "detection_count": row[3],
+                "image_count": row[4],
+                "avg_confidence": row[5]
+            }
+            for row in results
+        ]
+    except psycopg2.Error as e:
+        logging.error(f"Error fetching visual content trends: {e}")
+        raise
+
+@app.get("/api/reports/price-trends", response_model=list[PriceTrendResponse], summary="Product prices over time")
+@response_cache.cached("price-trends")
+async def price_trends(
+    product: Optional[str] = None,
+    granularity: str = Query("month", description="day, week or month"),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    """
+    Minimum, median and maximum advertised price in birr per product per period, from fct_product_prices.
+    Ranges count with their lower bound for the minimum, upper bound for the maximum and midpoint for the median.
+    """
+    if granularity not in TREND_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {TREND_GRANULARITIES}")
+    conditions, params = trend_filters(channel, date_from, date_to, "fpp")
+    if product:
+        conditions.append("fpp.product_name = %(product)s")
+        params["product"] = product
+    params["granularity"] = granularity
+    try:
+        results = await fetch_all(f"""
+            SELECT
+                fpp.product_name,
+                date_trunc(%(granularity)s, fpp.date_pk)::date AS period,
+                MIN(fpp.price_min) AS min_price,
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY fpp.price) AS median_price,
+                MAX(fpp.price_max) AS max_price,
+                COUNT(*) AS price_count
+            FROM dbt_marts.fct_product_prices fpp
+            JOIN dbt_marts.dim_channels dc ON fpp.channel_sk = dc.channel_sk
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            GROUP BY fpp.product_name, period
+            ORDER BY fpp.product_name, period;
+        """, params)
+        return [
+            {
+                "product_name": row[0],
+                "period": str(row[1]),
+                "min_price": row[2],
+                "median_price": row[3],
+                "max_price": row[4],
+                "price_count": row[5]
+            }
+            for row in results
+        ]
+    except psycopg2.Error as e:
+        logging.error(f"Error fetching price trends: {e}")
+        raise
+
+DETECTION_EXPORT_FORMATS = ("ndjson", "arrow")
+DETECTION_COLUMNS = ("detection_id", "message_id", "image_path", "detected_class", "confidence", "x1", "y1", "x2", "y2",
+                     "channel_sk", "date_pk")
+
+def detection_filters(detected_class, channel_sk, date_from, date_to, min_confidence, after_id):
+    """Builds the WHERE clause and parameters shared by the detections page and export endpoints."""
+    conditions = []
+    params = {}
+    for condition, name, value in (
+        ("fid.detected_class = %(detected_class)s", "detected_class", detected_class),
+        ("fid.channel_sk = %(channel_sk)s", "channel_sk", channel_sk),
+        ("fid.date_pk >= %(date_from)s", "date_from", date_from),
+        ("fid.date_pk <= %(date_to)s", "date_to", date_to),
+        ("fid.confidence >= %(min_confidence)s", "min_confidence", min_confidence),
+        ("fid.detection_id > %(after_id)s", "after_id", after_id)
+    ):
+        if value is not None:
+            conditions.append(condition)
+            params[name] = value
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
 
 @app.get("/api/images/detections", response_model=list[ImageDetectionResponse], summary="Get all image detections")
-async def get_image_detections(limit: int = 100):
+@response_cache.cached("image-detections")
+async def get_image_detections(
+    limit: int = Query(100, ge=1, le=1000),
+    after_id: Optional[int] = Query(None, description="detection_id of the last row of the previous page"),
+    detected_class: Optional[str] = None,
+    channel_sk: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1)
+):
     """
-    Retrieves a list of image detections with their associated message details.
+    Retrieves a page of image detections in detection_id order, optionally filtered by class, channel,
+    date range and minimum confidence. Pages are keyset-paginated: pass the last detection_id as after_id.
     """
-    conn = None
+    where, params = detection_filters(detected_class, channel_sk, date_from, date_to, min_confidence, after_id)
+    params["limit"] = limit
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
+        results = await fetch_all(f"""
             SELECT
+                fid.detection_id,
                 fid.message_id,
                 fid.image_path,
                 fid.detected_class,
                 fid.confidence,
-                fid.bbox_xyxy
+                fid.x1,
+                fid.y1,
+                fid.x2,
+                fid.y2
             FROM dbt_marts.fct_image_detections fid
-            LIMIT %s;
-        """, (limit,))
-        results = cur.fetchall()
-        cur.close()
-        # Convert bbox_xyxy from a list of strings (from JSONB) to list of floats if necessary
-        # psycopg2 might return JSONB as a Python dict/list directly, so no extra parsing needed if so.
+            {where}
+            ORDER BY fid.detection_id
+            LIMIT %(limit)s;
+        """, params)
+        # The box is stored as four REAL columns; the response keeps the [x1, y1, x2, y2] list shape
         return [
             {
-                "message_id": row[0],
-                "image_path": row[1],
-                "detected_class": row[2],
-                "confidence": row[3],
-                "bbox_xyxy": row[4] # This should already be a list/dict from JSONB
+                "detection_id": row[0],
+                "message_id": row[1],
+                "image_path": row[2],
+                "detected_class": row[3],
+                "confidence": row[4],
+                "bbox_xyxy": [row[5], row[6], row[7], row[8]]
             }
             for row in results
         ]
     except psycopg2.Error as e:
         logging.error(f"Error fetching image detections: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
-# You can add more endpoints here as needed for other reports
-# e.g., /api/reports/price-trends, /api/reports/visual-content-trends
\ No newline at end of file
+def iter_detections_ndjson(row_batches):
+    """One JSON object per detection, a chunk per fetched batch. Closing it closes row_batches."""
+    with closing(row_batches):
+        for rows in row_batches:
+            yield "".join(
+                json.dumps(dict(zip(DETECTION_COLUMNS, row)), default=str) + "\n"
+                for row in rows
+            ).encode("utf-8")
+
+class _ChunkSink:
+    """Write-only file object that keeps what was written until drain() hands it over."""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_detections_arrow(row_batches):
+    """An Arrow IPC stream: the schema, then one record batch per fetched batch. Closing it closes row_batches."""
+    import pyarrow as pa # Only needed for Arrow exports
+
+    schema = pa.schema([
+        ("detection_id", pa.int64()), ("message_id", pa.int64()), ("image_path", pa.string()),
+        ("detected_class", pa.string()), ("confidence", pa.float32()),
+        ("x1", pa.float32()), ("y1", pa.float32()), ("x2", pa.float32()), ("y2", pa.float32()),
+        ("channel_sk", pa.string()), ("date_pk", pa.date32())
+    ])
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    with closing(row_batches):
+        for rows in row_batches:
+            columns = zip(*rows)
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    writer.close() # Writes the end-of-stream marker
+    yield sink.drain()
+
+@app.get("/api/images/detections/export", summary="Stream image detections in bulk")
+def export_image_detections(
+    fmt: str = Query("ndjson", alias="format", description="ndjson or arrow (Arrow IPC stream)"),
+    detected_class: Optional[str] = None,
+    channel_sk: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1)
+):
+    """
+    Streams every detection matching the filters, in detection_id order, as NDJSON or an Arrow IPC stream.
+    Rows come from a server-side cursor a batch at a time, so memory stays flat however many rows match.
+    Not cached: the result is as large as the table.
+    """
+    if fmt not in DETECTION_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {DETECTION_EXPORT_FORMATS}")
+    where, params = detection_filters(detected_class, channel_sk, date_from, date_to, min_confidence, None)
+    row_batches = stream_rows(f"""
+        SELECT {", ".join(f"fid.{column}" for column in DETECTION_COLUMNS)}
+        FROM dbt_marts.fct_image_detections fid
+        {where}
+        ORDER BY fid.detection_id;
+    """, params)
+    if fmt == "arrow":
+        body, media_type = iter_detections_arrow(row_batches), "application/vnd.apache.arrow.stream"
+    else:
+        body, media_type = iter_detections_ndjson(row_batches), "application/x-ndjson"
+    return StreamingResponse(iterate_closing(body), media_type=media_type)
+
+@app.get("/api/messages/search", response_model=MessageSearchResponse, summary="Search message text")
+@response_cache.cached("message-search")
+async def search_messages(
+    q: str = Query(..., min_length=2, description="Words to search for"),
+    channel: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    fuzzy: bool = Query(False, description="Trigram similarity instead of full-text matching, tolerant of misspellings"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """
+    Searches message text, optionally within one channel and a date range, most relevant first.
+    Full-text search uses the GIN index on fct_messages.message_tsv; fuzzy search uses the pg_trgm index
+    on message_text. Results are keyset-paginated on (rank, channel_sk, message_id), since message ids are only
+    unique within a channel, so later pages cost the same as the first.
+    """
+    if fuzzy:
+        rank_expression = "word_similarity(%(q)s, fm.message_text)"
+        conditions = ["%(q)s <%% fm.message_text"]
+    else:
+        rank_expression = "ts_rank(fm.message_tsv, websearch_to_tsquery('simple', %(q)s))"
+        conditions = ["fm.message_tsv @@ websearch_to_tsquery('simple', %(q)s)"]
+    params = {"q": q, "channel": channel, "date_from": date_from, "date_to": date_to, "limit": limit}
+    if channel:
+        conditions.append("dc.channel_name = %(channel)s")
+    if date_from:
+        conditions.append("fm.date_pk >= %(date_from)s")
+    if date_to:
+        conditions.append("fm.date_pk <= %(date_to)s")
+    keyset = ""
+    if cursor:
+        params["cursor_rank"], params["cursor_channel"], params["cursor_id"] = decode_cursor(cursor, (float, str, int))
+        keyset = "WHERE (rank, channel_sk, message_id) < (%(cursor_rank)s::real, %(cursor_channel)s, %(cursor_id)s)"
+
+    try:
+        results = await fetch_all(f"""
+            WITH matches AS (
+                SELECT
+                    fm.message_id,
+                    fm.channel_sk,
+                    dc.channel_name,
+                    fm.date_pk,
+                    fm.message_text,
+                    ({rank_expression})::real AS rank
+                FROM dbt_marts.fct_messages fm
+                JOIN dbt_marts.dim_channels dc ON fm.channel_sk = dc.channel_sk
+                WHERE {" AND ".join(conditions)}
+            )
+            SELECT message_id, channel_name, date_pk, message_text, rank, channel_sk
+            FROM matches
+            {keyset}
+            ORDER BY rank DESC, channel_sk DESC, message_id DESC
+            LIMIT %(limit)s;
+        """, params)
+    except psycopg2.Error as e:
+        logging.error(f"Error searching messages: {e}")
+        raise
+
+    next_cursor = encode_cursor(results[-1][4], results[-1][5], results[-1][0]) if len(results) == limit else None
+    return {
+        "results": [
+            {
+                "message_id": row[0],
+                "channel_name": row[1],
+                "date": str(row[2]) if row[2] else None,
+                "message_text": row[3],
+                "rank": row[4]
+            }
+            for row in results
+        ],
+        "next_cursor": next_cursor
+    }
+
+@app.get("/api/cache/stats", summary="Response cache counters")
+async def cache_stats():
+    """
+    Returns hit/miss/eviction counters of the response cache and the data version it was last validated against.
+    """
+    return response_cache.snapshot()
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: per-route request latency histograms plus the response cache's counters and size.
+    """
+    for name, value in response_cache.snapshot().items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if name in response_cache.stats:
+            REGISTRY.set_counter(f"api_response_cache_{name}_total", value)
+        else:
+            REGISTRY.set_gauge(f"api_response_cache_{name}", value)
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# You can add more endpoints here as needed for other reports
\ No newline at end of file
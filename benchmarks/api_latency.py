@@ -0,0 +1,127 @@
+"""
+Concurrency benchmark for the FastAPI service.
+
+Fires --requests requests per endpoint from --concurrency client threads at a running API
+and reports p50/p99 latency and requests/second. Save a run with --output and compare two
+runs (e.g. before and after a change) with --compare.
+
+Examples:
+    uvicorn api.main:app --port 8000 --workers 1
+    python benchmarks/api_latency.py --concurrency 32 --requests 500 --output after.json
+    python benchmarks/api_latency.py --compare before.json after.json
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ENDPOINTS = [
+    "/api/reports/top-products?limit=10",
+    "/api/channels/Chemed/activity",
+    "/api/images/detections?limit=100",
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def timed_request(url, timeout):
+    """Returns (latency in seconds, HTTP status or None on a connection error)."""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return time.perf_counter() - started, status
+
+
+def benchmark_endpoint(base_url, path, concurrency, requests, timeout):
+    url = base_url.rstrip("/") + path
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(lambda _: timed_request(url, timeout), range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status is None or status >= 500)
+    return {
+        "endpoint": path,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "requests_per_second": round(requests / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def print_report(report):
+    print(f"{'endpoint':<45}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for entry in report["endpoints"]:
+        print(
+            f"{entry['endpoint']:<45}{entry['p50_ms']:>10.2f}{entry['p99_ms']:>10.2f}"
+            f"{entry['requests_per_second']:>10.1f}{entry['errors']:>8}"
+        )
+
+
+def compare_reports(before_path, after_path):
+    with open(before_path) as f:
+        before = {e["endpoint"]: e for e in json.load(f)["endpoints"]}
+    with open(after_path) as f:
+        after = {e["endpoint"]: e for e in json.load(f)["endpoints"]}
+
+    print(f"{'endpoint':<45}{'p50 ms':>18}{'p99 ms':>18}{'req/s':>18}")
+    for endpoint, new in after.items():
+        old = before.get(endpoint)
+        if old is None:
+            continue
+        columns = "".join(
+            f"{old[key]:>8.1f} -> {new[key]:<6.1f}" for key in ("p50_ms", "p99_ms", "requests_per_second")
+        )
+        print(f"{endpoint:<45}{columns}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per endpoint before measuring")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    report = {"base_url": args.base_url, "endpoints": []}
+    for path in args.endpoints:
+        for _ in range(args.warmup):
+            timed_request(args.base_url.rstrip("/") + path, args.timeout)
+        report["endpoints"].append(
+            benchmark_endpoint(args.base_url, path, args.concurrency, args.requests, args.timeout)
+        )
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+End-to-end benchmark of the pipeline on synthetic data.
+
+Generates a synthetic raw data tree (see synthetic_data.py), then times each stage against the
+Postgres database configured through DB_* in .env: loading with load_json_to_postgres, price
+extraction, YOLO enrichment (the real model, or --stub-model to measure everything but inference),
+the dbt run, and every API endpoint under concurrent load. The report is JSON and keyed by stage
+and endpoint, so two runs (e.g. two commits) can be diffed with --compare.
+
+The synthetic rows are written to the real raw tables and dbt builds the real marts, so point DB_*
+at a scratch database. Raw rows from a previous benchmark run of the same tree are removed first;
+the marts are left to the dbt stage, so use --dbt-full-refresh when they must be rebuilt cold.
+
+Examples:
+    python benchmarks/pipeline_benchmark.py --days 7 --channels 5 --messages-per-day 500 --stub-model --start-api --output before.json
+    python benchmarks/pipeline_benchmark.py --stages load dbt api --skip-generate --start-api --output after.json
+    python benchmarks/pipeline_benchmark.py --compare before.json after.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "scripts"))
+sys.path.insert(0, REPO_DIR) # For scripts.instrumentation, which the scripts import as a package module
+
+import numpy as np
+from api_latency import benchmark_endpoint, timed_request
+from synthetic_data import generate
+from load_to_postgres import LOAD_MODES, get_db_connection, load_json_to_postgres
+from price_extractor import STAGE_NAME as PRICE_STAGE_NAME, run_price_extraction
+from yolo_enrichment import BATCH_SIZE, hash_file, run_yolo_detection_and_store
+from scripts.instrumentation import REGISTRY
+
+STAGES = ("load", "prices", "yolo", "dbt", "api")
+# run_yolo_detection_and_store logs failures instead of raising; these count them for the whole run, a shard
+# worker, and a batch (the yolo_batch span)
+YOLO_ERROR_COUNTERS = ("yolo_errors_total", "yolo_shard_errors_total", "yolo_batch_errors_total")
+DBT_PROJECT_DIR = os.path.join(REPO_DIR, "medical_data_dbt")
+
+
+class _StubTensor:
+    """Just enough of a torch tensor for extract_detections: .cpu().numpy()."""
+
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _StubBoxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy, self.cls, self.conf = _StubTensor(xyxy), _StubTensor(cls), _StubTensor(conf)
+
+    def __len__(self):
+        return len(self.xyxy.numpy())
+
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """
+    Stands in for the YOLO model: returns one fixed box per image without running inference,
+    so a benchmark measures decoding, hashing, batching and storing only.
+    """
+    names = {0: "bottle"}
+
+    def __call__(self, images, imgsz=None, verbose=False):
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            boxes = _StubBoxes(
+                np.array([[width * 0.25, height * 0.25, width * 0.75, height * 0.75]], dtype=np.float32),
+                np.zeros(1, dtype=np.float32),
+                np.full(1, 0.9, dtype=np.float32)
+            )
+            results.append(_StubResult(boxes))
+        return results
+
+
+def git_revision():
+    """Current commit, with a -dirty suffix when the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_synthetic_rows(data):
+    """
+    Deletes what a previous run of this tree left in the raw tables and the price extraction watermark,
+    so the load, price and YOLO stages start cold. The dbt marts are not touched: an incremental dbt run
+    keeps mart rows whose raw rows were deleted here, and only --dbt-full-refresh rebuilds them from scratch.
+    """
+    image_hashes = [hash_file(path) for path in glob.glob(os.path.join(data["media_dir"], "*", "*.jpg"))]
+    statements = [
+        ("raw.telegram_messages", "DELETE FROM raw.telegram_messages WHERE starts_with(source_file, %(messages_dir)s);"),
+        ("raw.load_manifest", "DELETE FROM raw.load_manifest WHERE starts_with(file_path, %(messages_dir)s);"),
+        ("raw.product_mentions", "DELETE FROM raw.product_mentions WHERE channel = ANY(%(channels)s);"),
+        ("raw.product_prices", "DELETE FROM raw.product_prices WHERE channel = ANY(%(channels)s);"),
+        ("raw.yolo_detections", "DELETE FROM raw.yolo_detections WHERE starts_with(image_path, %(media_dir)s);"),
+        ("raw.yolo_processed_images", "DELETE FROM raw.yolo_processed_images WHERE starts_with(image_path, %(media_dir)s);"),
+        ("raw.yolo_detection_cache", "DELETE FROM raw.yolo_detection_cache WHERE content_hash = ANY(%(image_hashes)s);"),
+        ("meta.stage_watermarks", "DELETE FROM meta.stage_watermarks WHERE stage = %(price_stage)s;"),
+    ]
+    params = {"messages_dir": data["messages_dir"], "media_dir": data["media_dir"], "channels": data["channels"],
+              "image_hashes": image_hashes, "price_stage": PRICE_STAGE_NAME}
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for table, statement in statements:
+                cur.execute("SELECT to_regclass(%s);", (table,))
+                if cur.fetchone()[0] is not None:
+                    cur.execute(statement, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timed(func, *args, **kwargs):
+    """Returns (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def per_second(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def bench_load(data, mode):
+    results, seconds = timed(
+        load_json_to_postgres, os.path.join(data["messages_dir"], "*", "*", "*"), mode=mode, skip_unchanged=False
+    )
+    rows = sum(r["rows"] for r in results)
+    return {"mode": mode, "files": len(results), "failed_files": sum(1 for r in results if r["status"] == "failed"),
+            "rows": rows, "seconds": round(seconds, 3), "rows_per_second": per_second(rows, seconds)}
+
+
+def bench_prices():
+    summary, seconds = timed(run_price_extraction)
+    return {**summary, "seconds": round(seconds, 3), "messages_per_second": per_second(summary["messages"], seconds)}
+
+
+def error_count(counter_names):
+    """Sum of the named counters in the process's metrics registry."""
+    return sum(metric["value"] for metric in REGISTRY.snapshot()
+               if metric["type"] == "counter" and metric["name"] in counter_names)
+
+
+def bench_yolo(data, stub_model, batch_size, workers):
+    options = {"model": StubModel(), "model_version": "benchmark-stub"} if stub_model else {"num_workers": workers}
+    errors_before = error_count(YOLO_ERROR_COUNTERS)
+    images, seconds = timed(
+        run_yolo_detection_and_store, batch_size=batch_size, source_prefix=data["messages_dir"], **options
+    )
+    errors = error_count(YOLO_ERROR_COUNTERS) - errors_before
+    if errors:
+        print(f"YOLO enrichment failed ({errors} errors); see the log above", file=sys.stderr)
+    return {"stub_model": stub_model, "batch_size": batch_size, "workers": 1 if stub_model else workers,
+            "succeeded": errors == 0, "images": images, "seconds": round(seconds, 3),
+            "images_per_second": per_second(images, seconds)}
+
+
+def bench_dbt(full_refresh):
+    command = ["dbt", "run"] + (["--full-refresh"] if full_refresh else [])
+    result, seconds = timed(subprocess.run, command, cwd=DBT_PROJECT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stdout[-2000:], result.stderr[-2000:], file=sys.stderr)
+    return {"full_refresh": full_refresh, "succeeded": result.returncode == 0, "seconds": round(seconds, 3)}
+
+
+def api_endpoints(data):
+    """Every endpoint of api/main.py, parameterised with names that exist in the synthetic data."""
+    channel = data["channels"][0]
+    return [
+        "/api/reports/top-products?limit=10",
+        f"/api/channels/{channel}/activity",
+        "/api/images/detections?limit=100",
+        "/api/images/detections?limit=100&min_confidence=0.5",
+        "/api/images/detections/export?format=ndjson",
+        "/api/messages/search?q=paracetamol",
+        "/api/messages/search?q=paracetmol&fuzzy=true",
+        f"/api/reports/channel-trends?granularity=week&channel={channel}",
+        "/api/reports/visual-content-trends?granularity=month",
+        "/api/reports/price-trends?granularity=week",
+    ]
+
+
+def start_api(port, cache_ttl):
+    """Starts uvicorn on port in the background and waits until it answers."""
+    env = {**os.environ, "CACHE_TTL_SECONDS": str(cache_ttl)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/openapi.json", timeout=2):
+                return process
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"API did not start on port {port}")
+
+
+def bench_api(base_url, endpoints, concurrency, requests, warmup, timeout):
+    entries = []
+    for path in endpoints:
+        for _ in range(warmup):
+            timed_request(base_url.rstrip("/") + path, timeout)
+        entries.append(benchmark_endpoint(base_url, path, concurrency, requests, timeout))
+    return entries
+
+
+def flatten_report(report):
+    """{metric name: number} for every numeric stage metric and endpoint latency/throughput."""
+    metrics = {}
+    for stage, values in report.get("stages", {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics[f"{stage}.{key}"] = value
+    for entry in report.get("endpoints", []):
+        for key in ("p50_ms", "p99_ms", "requests_per_second", "errors"):
+            metrics[f"api {entry['endpoint']}.{key}"] = entry[key]
+    return metrics
+
+
+def compare_reports(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before['meta'].get('git_revision')}  after: {after['meta'].get('git_revision')}")
+    old_metrics, new_metrics = flatten_report(before), flatten_report(after)
+    print(f"{'metric':<80}{'before':>12}{'after':>12}{'change':>10}")
+    for name, new in new_metrics.items():
+        old = old_metrics.get(name)
+        if old is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+        print(f"{name:<80}{old:>12}{new:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data/benchmark", help="Where the synthetic tree is (or gets) written")
+    parser.add_argument("--skip-generate", action="store_true", help="Reuse the tree already in --data-dir")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--messages-per-day", type=int, default=200, help="Messages per channel per day")
+    parser.add_argument("--image-ratio", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--load-mode", choices=LOAD_MODES, default="copy")
+    parser.add_argument("--stub-model", action="store_true", help="Replace YOLO with a stub that skips inference")
+    parser.add_argument("--yolo-batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--yolo-workers", type=int, default=1)
+    parser.add_argument("--dbt-full-refresh", action="store_true")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--start-api", action="store_true", help="Start uvicorn for the api stage instead of using --base-url")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--api-cache-ttl", type=int, default=0, help="CACHE_TTL_SECONDS for a started API; 0 times every query uncached")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    data_dir = os.path.abspath(args.data_dir)
+    scale = {"days": args.days, "channels": args.channels, "messages_per_day": args.messages_per_day,
+             "image_ratio": args.image_ratio, "seed": args.seed}
+    report = {
+        "meta": {"git_revision": git_revision(), "started_at": datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(), "scale": scale},
+        "stages": {},
+        "endpoints": []
+    }
+
+    if args.skip_generate:
+        messages_dir = os.path.join(data_dir, "telegram_messages")
+        channels = sorted({os.path.basename(path) for path in glob.glob(os.path.join(messages_dir, "*", "*")) if os.path.isdir(path)})
+        if not channels:
+            parser.error(f"--skip-generate: no synthetic data under {messages_dir}; run once without it first")
+        data = {"messages_dir": messages_dir, "media_dir": os.path.join(data_dir, "media"), "channels": channels}
+    else:
+        data, seconds = timed(generate, data_dir, args.days, args.channels, args.messages_per_day, args.image_ratio, seed=args.seed)
+        report["stages"]["generate"] = {"messages": data["messages"], "images": data["images"], "bytes": data["bytes"],
+                                        "seconds": round(seconds, 3)}
+    # Trailing separators so the prefix filters cannot match a sibling directory
+    data["messages_dir"] = os.path.join(data["messages_dir"], "")
+    data["media_dir"] = os.path.join(data["media_dir"], "")
+    reset_synthetic_rows(data)
+
+    if "load" in args.stages:
+        report["stages"]["load"] = bench_load(data, args.load_mode)
+    if "prices" in args.stages:
+        report["stages"]["prices"] = bench_prices()
+    if "yolo" in args.stages:
+        report["stages"]["yolo"] = bench_yolo(data, args.stub_model, args.yolo_batch_size, args.yolo_workers)
+    if "dbt" in args.stages:
+        report["stages"]["dbt"] = bench_dbt(args.dbt_full_refresh)
+    if "api" in args.stages:
+        api_process = start_api(args.api_port, args.api_cache_ttl) if args.start_api else None
+        base_url = f"http://localhost:{args.api_port}" if api_process else args.base_url
+        try:
+            report["endpoints"] = bench_api(base_url, api_endpoints(data), args.concurrency, args.requests, args.warmup, args.timeout)
+        finally:
+            if api_process:
+                api_process.terminate()
+                api_process.wait()
+        report["meta"]["api"] = {"base_url": base_url, "concurrency": args.concurrency, "requests": args.requests,
+                                 "cache_ttl": args.api_cache_ttl if api_process else None}
+
+    print(json.dumps(report["stages"], indent=2))
+    for entry in report["endpoints"]:
+        print(f"{entry['endpoint']:<60}{entry['p50_ms']:>10.2f}{entry['p99_ms']:>10.2f}{entry['requests_per_second']:>10.1f}{entry['errors']:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
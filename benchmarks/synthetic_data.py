@@ -0,0 +1,145 @@
+"""
+Synthetic Telegram data for benchmarks.
+
+Writes message files in the layout the scraper produces, at whatever scale is asked for:
+data/raw/telegram_messages/<date>/<channel>/<channel>_<date>.ndjson (one message per line;
+--file-format json writes the legacy JSON arrays instead) plus one JPEG per photo message,
+referenced by the message's photo_path. Message texts mix
+products from the product dictionary, prices in the formats price_extractor understands
+and filler words, in English and Amharic. The same --seed always produces the same tree.
+
+Example:
+    python benchmarks/synthetic_data.py --output-dir /tmp/bench --days 7 --channels 5 --messages-per-day 500
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+PRODUCT_DICTIONARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "product_dictionary.json")
+FILLER_WORDS = [
+    "available", "now", "in", "stock", "call", "us", "delivery", "Addis", "Ababa", "original", "new", "offer",
+    "አለ", "ይደውሉ", "አዲስ", "ዋጋ", "በቅናሽ", "ለማዘዝ"
+]
+GEEZ_NUMERALS = ["፶", "፻", "፻፶", "፪፻", "፭፻", "፲፪፻"]
+PRICE_FORMATS = [
+    "{amount} birr", "{amount} ETB", "ETB {amount}", "{amount} Br.", "{amount} ብር", "በ{amount} ብር",
+    "{amount}-{high} birr", "ከ{amount} እስከ {high} ብር"
+]
+
+
+def load_product_variants(path=PRODUCT_DICTIONARY_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return [variant for variants in json.load(f).values() for variant in variants]
+
+
+def random_price(rng):
+    """A price string in one of PRICE_FORMATS, occasionally written with Ge'ez numerals."""
+    if rng.random() < 0.05:
+        return f"{rng.choice(GEEZ_NUMERALS)} ብር"
+    amount = rng.randrange(20, 5000, 5)
+    return rng.choice(PRICE_FORMATS).format(amount=f"{amount:,}" if amount >= 1000 and rng.random() < 0.5 else amount,
+                                            high=amount + rng.randrange(50, 500, 50))
+
+
+def random_text(rng, product_variants):
+    """1-3 product lines with a price on most of them, padded with filler words."""
+    lines = []
+    for _ in range(rng.randint(1, 3)):
+        words = rng.sample(FILLER_WORDS, rng.randint(2, 6))
+        line = f"{rng.choice(product_variants)} {' '.join(words)}"
+        if rng.random() < 0.8:
+            line += f" {random_price(rng)}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def write_jpeg(path, rng, size):
+    """A noisy JPEG with a few filled rectangles, so decoding and detection have something to chew on."""
+    height, width = size
+    np_rng = np.random.default_rng(rng.randrange(2**32))
+    image = np_rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    for _ in range(rng.randint(1, 4)):
+        x1, y1 = rng.randrange(width // 2), rng.randrange(height // 2)
+        x2, y2 = x1 + rng.randrange(20, width // 2), y1 + rng.randrange(20, height // 2)
+        cv2.rectangle(image, (x1, y1), (x2, y2), tuple(rng.randrange(256) for _ in range(3)), thickness=-1)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+
+def generate(output_dir, days=3, channels=3, messages_per_day=200, image_ratio=0.4, image_size=(720, 960),
+             start_date="2024-01-01", seed=0, file_format="ndjson"):
+    """
+    Writes days x channels raw message files (file_format "ndjson" or "json") under output_dir/telegram_messages
+    and their photos under output_dir/media. Returns a summary dict with the paths and the number of messages,
+    images and bytes written.
+    """
+    rng = random.Random(seed)
+    product_variants = load_product_variants()
+    messages_dir = os.path.join(output_dir, "telegram_messages")
+    media_dir = os.path.join(output_dir, "media")
+    channel_names = [f"synthetic_channel_{index}" for index in range(channels)]
+    first_day = datetime.strptime(start_date, "%Y-%m-%d")
+
+    summary = {"messages_dir": messages_dir, "media_dir": media_dir, "channels": channel_names,
+               "messages": 0, "images": 0, "bytes": 0}
+    next_id = {channel: 1 for channel in channel_names}
+    for day_offset in range(days):
+        day = first_day + timedelta(days=day_offset)
+        day_str = day.strftime("%Y-%m-%d")
+        for channel in channel_names:
+            messages = []
+            for _ in range(messages_per_day):
+                message_id = next_id[channel]
+                next_id[channel] += 1
+                message = {
+                    "id": message_id,
+                    "date": (day + timedelta(seconds=rng.randrange(86400))).isoformat() + "+00:00",
+                    "text": random_text(rng, product_variants),
+                    "has_image": rng.random() < image_ratio
+                }
+                if message["has_image"]:
+                    photo_path = os.path.join(media_dir, channel, f"{message_id}.jpg")
+                    write_jpeg(photo_path, rng, image_size)
+                    message["photo_path"] = photo_path
+                    summary["images"] += 1
+                    summary["bytes"] += os.path.getsize(photo_path)
+                messages.append(message)
+
+            file_path = os.path.join(messages_dir, day_str, channel, f"{channel}_{day_str}.{file_format}")
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w", encoding="utf-8") as f:
+                if file_format == "ndjson":
+                    f.writelines(json.dumps(message, ensure_ascii=False) + "\n" for message in messages)
+                else:
+                    json.dump(messages, f, ensure_ascii=False, indent=4)
+            summary["messages"] += len(messages)
+            summary["bytes"] += os.path.getsize(file_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--messages-per-day", type=int, default=200, help="Messages per channel per day")
+    parser.add_argument("--image-ratio", type=float, default=0.4, help="Share of messages with a photo")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[720, 960], metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--file-format", choices=["ndjson", "json"], default="ndjson",
+                        help="ndjson as the scraper writes it, or the legacy JSON arrays")
+    args = parser.parse_args()
+
+    summary = generate(args.output_dir, args.days, args.channels, args.messages_per_day, args.image_ratio,
+                       tuple(args.image_size), args.start_date, args.seed, args.file_format)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
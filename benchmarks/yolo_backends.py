@@ -0,0 +1,121 @@
+"""
+Compares YOLO inference backends on a sample of scraped images.
+
+For each backend the same images are run through the batched inference path used by
+yolo_enrichment, and the harness reports images/second plus how closely its detections
+agree with the first (reference) backend: a detection agrees when a reference detection
+of the same class overlaps it with IoU >= --iou.
+
+Example:
+    python benchmarks/yolo_backends.py --backends torch onnx openvino --int8 --limit 200
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from ultralytics import YOLO
+from yolo_enrichment import BACKENDS, BATCH_SIZE, IMAGE_SIZE, detections_from_result, iter_image_batches, prepare_model
+
+
+def iou(a, b):
+    """Intersection over union of two xyxy boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def match_detections(reference, candidate, iou_threshold):
+    """Greedily pairs same-class detections by confidence; returns the number of matched pairs."""
+    unmatched = sorted(reference, key=lambda d: d["confidence"], reverse=True)
+    matches = 0
+    for detection in sorted(candidate, key=lambda d: d["confidence"], reverse=True):
+        best, best_iou = None, iou_threshold
+        for ref in unmatched:
+            if ref["detected_class"] != detection["detected_class"]:
+                continue
+            overlap = iou(ref["bbox_xyxy"], detection["bbox_xyxy"])
+            if overlap >= best_iou:
+                best, best_iou = ref, overlap
+        if best is not None:
+            unmatched.remove(best)
+            matches += 1
+    return matches
+
+
+def run_backend(backend, int8, image_paths, batch_size, imgsz):
+    """Runs one backend over image_paths; returns (detections per image path, images/second)."""
+    model = YOLO(prepare_model(backend, int8 and backend == "openvino"), task="detect")
+    jobs = [(path, path) for path in image_paths]
+
+    # Warm up on one batch so model loading and graph compilation are not timed
+    for batch in iter_image_batches(jobs[:batch_size], batch_size, imgsz=imgsz):
+        model([image for _, _, image, _ in batch], imgsz=imgsz, verbose=False)
+
+    detections = {}
+    started = time.perf_counter()
+    for batch in iter_image_batches(jobs, batch_size, imgsz=imgsz):
+        results = model([image for _, _, image, _ in batch], imgsz=imgsz, verbose=False)
+        for (path, _, _, scale), r in zip(batch, results):
+            detections[path] = detections_from_result(r, scale, model.names)
+    elapsed = time.perf_counter() - started
+    return detections, (len(detections) / elapsed if elapsed > 0 else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="data/raw/media/*/*.jpg", help="Glob of images; defaults to the scraper's media store")
+    parser.add_argument("--limit", type=int, default=100, help="Number of images to benchmark on")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--int8", action="store_true", help="Use the INT8 export for the openvino backend")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--imgsz", type=int, default=IMAGE_SIZE)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two detections to agree")
+    parser.add_argument("--output", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(args.images))[:args.limit]
+    if not image_paths:
+        sys.exit(f"No images found matching {args.images}")
+
+    report = {"images": len(image_paths), "batch_size": args.batch_size, "imgsz": args.imgsz, "backends": []}
+    reference = None
+    for backend in args.backends:
+        detections, images_per_second = run_backend(backend, args.int8, image_paths, args.batch_size, args.imgsz)
+        entry = {
+            "backend": backend + ("-int8" if args.int8 and backend == "openvino" else ""),
+            "images_per_second": round(images_per_second, 2),
+            "detections": sum(len(d) for d in detections.values()),
+        }
+        if reference is None:
+            reference = detections
+        else:
+            # Only images decoded in both runs can be compared
+            common = detections.keys() & reference.keys()
+            matched = sum(match_detections(reference[p], detections[p], args.iou) for p in common)
+            reference_total = sum(len(reference[p]) for p in common)
+            candidate_total = sum(len(detections[p]) for p in common)
+            entry["compared_images"] = len(common)
+            entry["agreement_recall"] = round(matched / reference_total, 4) if reference_total else 1.0
+            entry["agreement_precision"] = round(matched / candidate_total, 4) if candidate_total else 1.0
+        report["backends"].append(entry)
+
+    print(f"{'backend':<16}{'images/s':>10}{'detections':>12}{'recall':>9}{'precision':>11}")
+    for entry in report["backends"]:
+        print(
+            f"{entry['backend']:<16}{entry['images_per_second']:>10.2f}{entry['detections']:>12}"
+            f"{entry.get('agreement_recall', 1.0):>9.3f}{entry.get('agreement_precision', 1.0):>11.3f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+{#
+    Post-hook creating a pg_trgm GIN index on a text column, which dbt's indexes config cannot express.
+    The index is left unnamed (Postgres picks a free name, so it never collides with the index of the
+    backup table a full refresh swaps out) and is only created when the relation does not have one yet,
+    so incremental runs do not pile up duplicates.
+#}
+{% macro create_trigram_index(relation, column) %}
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_indexes
+            WHERE schemaname = '{{ relation.schema }}'
+              AND tablename = '{{ relation.identifier }}'
+              AND indexdef LIKE '%({{ column }} gin_trgm_ops)%'
+        ) THEN
+            CREATE INDEX ON {{ relation }} USING gin ({{ column }} gin_trgm_ops);
+        END IF;
+    END
+    $$
+{% endmacro %}
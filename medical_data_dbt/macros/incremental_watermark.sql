@@ -0,0 +1,13 @@
+{#
+    WHERE condition selecting the source rows loaded since the last incremental run:
+    {{ column }} past the newest value already in the target, minus a lookback window.
+    The lookback covers load transactions that were still open when the previous run read the source;
+    rows seen twice are simply merged again. Override with --vars '{incremental_lookback: "1 day"}'.
+#}
+{% macro incremental_watermark(column, target_column=none) %}
+    {{ column }} > (
+        SELECT COALESCE(MAX({{ target_column or column.split('.')[-1] }}), '-infinity'::timestamp)
+            - INTERVAL '{{ var("incremental_lookback", "1 hour") }}'
+        FROM {{ this }}
+    )
+{% endmacro %}
@@ -0,0 +1,22 @@
+{#
+    Pre-hook for incremental models merging on unique_key. Tables built before the model became
+    incremental have no unique index on the key and may hold duplicate rows, which a merge would keep,
+    so an incremental run against one fails with a pointer to the one-off `dbt run --full-refresh`
+    that rebuilds it. Renders nothing on the first build and on full refreshes.
+#}
+{% macro require_unique_key_index(relation, columns) %}
+    {% if is_incremental() %}
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_indexes
+            WHERE schemaname = '{{ relation.schema }}'
+              AND tablename = '{{ relation.identifier }}'
+              AND indexdef LIKE 'CREATE UNIQUE INDEX % USING btree ({{ columns | join(", ") }})'
+        ) THEN
+            RAISE EXCEPTION '{{ relation }} predates its unique key ({{ columns | join(", ") }}); run `dbt run --full-refresh -s {{ relation.identifier }}` once to rebuild it';
+        END IF;
+    END
+    $$
+    {% endif %}
+{% endmacro %}
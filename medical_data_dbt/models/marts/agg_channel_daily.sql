@@ -0,0 +1,40 @@
+-- models/marts/agg_channel_daily.sql
+-- Messages per channel per day, for the channel activity endpoints.
+-- Incremental: a run recomputes only the (channel, day) pairs that gained or changed messages since the previous one,
+-- and delete+insert swaps those days out whole.
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['channel_sk', 'date_pk'],
+    indexes=[
+        {'columns': ['channel_sk', 'date_pk'], 'unique': True},
+        {'columns': ['date_pk']}
+    ]
+) }}
+
+{% if is_incremental() %}
+WITH changed_days AS (
+    SELECT DISTINCT channel_sk, date_pk
+    FROM {{ ref('fct_messages') }}
+    WHERE {{ incremental_watermark('loaded_at', 'source_loaded_at') }}
+)
+{% endif %}
+SELECT
+    fm.channel_sk,
+    fm.date_pk,
+    COUNT(*) AS message_count,
+    COUNT(*) FILTER (WHERE fm.has_image) AS image_message_count,
+    ROUND(COUNT(*) FILTER (WHERE fm.has_image)::numeric / COUNT(*), 4) AS image_share,
+    SUM(fm.message_length) AS total_message_length,
+    MAX(fm.loaded_at) AS source_loaded_at -- Watermark for the next incremental run
+FROM
+    {{ ref('fct_messages') }} fm
+{% if is_incremental() %}
+JOIN
+    changed_days cd
+    ON fm.channel_sk = cd.channel_sk AND fm.date_pk = cd.date_pk
+{% endif %}
+WHERE
+    fm.date_pk IS NOT NULL
+GROUP BY
+    fm.channel_sk, fm.date_pk
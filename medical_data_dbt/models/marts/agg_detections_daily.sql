@@ -0,0 +1,39 @@
+-- models/marts/agg_detections_daily.sql
+-- Detections per class per channel per day, for /api/reports/visual-content-trends.
+-- Incremental like agg_channel_daily: a run recomputes every class of the (channel, day) pairs that gained detections.
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['channel_sk', 'date_pk'],
+    indexes=[
+        {'columns': ['channel_sk', 'date_pk', 'detected_class'], 'unique': True},
+        {'columns': ['detected_class', 'date_pk']}
+    ]
+) }}
+
+{% if is_incremental() %}
+WITH changed_days AS (
+    SELECT DISTINCT channel_sk, date_pk
+    FROM {{ ref('fct_image_detections') }}
+    WHERE {{ incremental_watermark('detection_timestamp', 'source_detection_timestamp') }}
+)
+{% endif %}
+SELECT
+    fid.channel_sk,
+    fid.date_pk,
+    fid.detected_class,
+    COUNT(*) AS detection_count,
+    COUNT(DISTINCT fid.image_path) AS image_count,
+    SUM(fid.confidence) AS confidence_sum, -- Kept as a sum so weekly and monthly averages can be derived from the days
+    MAX(fid.detection_timestamp) AS source_detection_timestamp -- Watermark for the next incremental run
+FROM
+    {{ ref('fct_image_detections') }} fid
+{% if is_incremental() %}
+JOIN
+    changed_days cd
+    ON fid.channel_sk = cd.channel_sk AND fid.date_pk = cd.date_pk
+{% endif %}
+WHERE
+    fid.channel_sk IS NOT NULL AND fid.date_pk IS NOT NULL
+GROUP BY
+    fid.channel_sk, fid.date_pk, fid.detected_class
@@ -0,0 +1,20 @@
+-- models/marts/agg_product_mentions.sql
+-- One row per product, so /api/reports/top-products is an index scan instead of a text scan of fct_messages
+{{ config(
+    materialized='table',
+    indexes=[
+        {'columns': ['message_count']},
+        {'columns': ['product_name'], 'unique': True}
+    ]
+) }}
+
+SELECT
+    product_name,
+    COUNT(*) AS message_count, -- Messages mentioning the product
+    SUM(mention_count) AS occurrence_count, -- Total occurrences, counting repeats within a message
+    MIN(date_pk) AS first_mentioned_on,
+    MAX(date_pk) AS last_mentioned_on
+FROM
+    {{ ref('fct_product_mentions') }}
+GROUP BY
+    product_name
@@ -1,10 +1,22 @@
-{{ config(materialized='table') }}
+-- models/marts/dim_channels.sql
+-- One row per channel; small enough to rebuild on every run.
+{{ config(
+    materialized='table',
+    indexes=[
+        {'columns': ['channel_sk'], 'unique': True},
+        {'columns': ['channel_name'], 'unique': True}
+    ]
+) }}
 
 SELECT
     {{ dbt_utils.generate_surrogate_key(['channel_username']) }} AS channel_sk, -- Stable surrogate key
     channel_username AS channel_name,
-    'Telegram' AS platform_source
+    'Telegram' AS platform_source,
+    MIN(message_timestamp) AS first_message_at,
+    MAX(message_timestamp) AS last_message_at
 FROM
     {{ ref('stg_telegram_messages') }}
 WHERE
-    channel_username IS NOT NULL
\ No newline at end of file
+    channel_username IS NOT NULL
+GROUP BY
+    channel_username
@@ -1,13 +1,42 @@
 -- models/marts/fct_image_detections.sql
-{{ config(materialized='table') }}
+-- Incremental: each run merges the detections stored (or re-stored) since the last one; `dbt run --full-refresh` rebuilds it.
+-- Indexes serve /api/images/detections and its export: keyset paging on detection_id, alone or after a class,
+-- channel or date filter, and a range scan for selective min_confidence thresholds
+-- Migrated detections (model_version 'legacy', see yolo_enrichment.py) are deleted from raw once their image is
+-- detected again; merge only upserts, so the post-hook drops them here too.
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key='detection_id',
+    on_schema_change='append_new_columns',
+    pre_hook=[
+        "{{ require_unique_key_index(this, ['detection_id']) }}"
+    ],
+    indexes=[
+        {'columns': ['detection_id'], 'unique': True},
+        {'columns': ['detected_class', 'detection_id']},
+        {'columns': ['channel_sk', 'detection_id']},
+        {'columns': ['date_pk', 'detection_id']},
+        {'columns': ['confidence', 'detection_id']},
+        {'columns': ['detection_timestamp']}
+    ],
+    post_hook=[
+        "DELETE FROM {{ this }} f WHERE f.model_version = 'legacy' AND NOT EXISTS (SELECT 1 FROM {{ source('raw', 'yolo_detections') }} r WHERE r.detection_id = f.detection_id)"
+    ]
+) }}
 
 SELECT
     syd.detection_id,
     syd.message_id,
     syd.image_path,
+    syd.model_version,
+    syd.box_index,
     syd.detected_class,
     syd.confidence,
-    syd.bbox_xyxy,
+    syd.x1,
+    syd.y1,
+    syd.x2,
+    syd.y2,
     syd.detection_timestamp,
     fmsg.channel_sk, -- Join with fct_messages to get channel_sk
     fmsg.date_pk     -- Join with fct_messages to get date_pk
@@ -15,6 +44,10 @@ FROM
     {{ ref('stg_yolo_detections') }} syd
 LEFT JOIN
     {{ ref('fct_messages') }} fmsg
-    ON syd.message_id = fmsg.message_id
+    -- message_id alone repeats across channels; the photo path pins the message the image came from
+    ON syd.message_id = fmsg.message_id AND syd.image_path = fmsg.photo_path
 WHERE
-    syd.detected_class IS NOT NULL -- Only include detections with a class
\ No newline at end of file
+    syd.detected_class IS NOT NULL -- Only include detections with a class
+{% if is_incremental() %}
+    AND {{ incremental_watermark('syd.detection_timestamp') }}
+{% endif %}
@@ -1,5 +1,26 @@
 -- models/marts/fct_messages.sql
-{{ config(materialized='table') }}
+-- Incremental: each run merges only the messages loaded (or reloaded) since the last one; `dbt run --full-refresh` rebuilds it.
+-- Rows are keyed by (channel_sk, message_id), since Telegram message ids are only unique within a channel.
+-- New rows are appended roughly in date order, so the BRIN index on date_pk stays selective without a CLUSTER.
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['channel_sk', 'message_id'],
+    on_schema_change='append_new_columns',
+    pre_hook=[
+        "{{ require_unique_key_index(this, ['channel_sk', 'message_id']) }}"
+    ],
+    indexes=[
+        {'columns': ['channel_sk', 'message_id'], 'unique': True},
+        {'columns': ['date_pk'], 'type': 'brin'},
+        {'columns': ['loaded_at']},
+        {'columns': ['message_tsv'], 'type': 'gin'},
+        {'columns': ['channel_sk', 'date_pk']}
+    ],
+    post_hook=[
+        "{{ create_trigram_index(this, 'message_text') }}"
+    ]
+) }}
 
 SELECT
     sm.message_id,
@@ -9,12 +30,18 @@ SELECT
     sm.has_image,
     sm.photo_path, -- Include photo_path from staging
     sm.source_file, -- Include source_file from staging
-    LENGTH(sm.message_text) AS message_length -- Use the correct column name
+    LENGTH(sm.message_text) AS message_length, -- Use the correct column name
+    to_tsvector('simple', COALESCE(sm.message_text, '')) AS message_tsv, -- 'simple' config: no stemming, so Amharic and English words are matched as written
+    sm.loaded_at
 FROM
     {{ ref('stg_telegram_messages') }} sm -- Alias staging model as 'sm'
-LEFT JOIN -- Use LEFT JOIN to keep all messages even if channel/date not found
+JOIN -- dim_channels holds every channel that has a message, so this never drops rows
     {{ ref('dim_channels') }} dc
     ON sm.channel_username = dc.channel_name -- Join on channel_name, not channel_sk directly
 LEFT JOIN
     {{ ref('dim_dates') }} dd
-    ON sm.message_timestamp::date = dd.date_pk -- Join on the date part of the timestamp
\ No newline at end of file
+    ON sm.message_timestamp::date = dd.date_pk -- Join on the date part of the timestamp
+{% if is_incremental() %}
+WHERE
+    {{ incremental_watermark('sm.loaded_at') }}
+{% endif %}
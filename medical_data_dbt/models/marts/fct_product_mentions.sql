@@ -0,0 +1,42 @@
+-- models/marts/fct_product_mentions.sql
+-- Incremental: each run merges the mentions extracted since the last one; `dbt run --full-refresh` rebuilds it.
+-- The loader replaces all mentions of a message whenever it (re)loads it, so the post-hook drops mart rows
+-- whose mention no longer exists in raw (a product edited out of a message, or a dictionary backfill).
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['channel_sk', 'message_id', 'product_name'],
+    on_schema_change='append_new_columns',
+    pre_hook=[
+        "{{ require_unique_key_index(this, ['channel_sk', 'message_id', 'product_name']) }}"
+    ],
+    indexes=[
+        {'columns': ['channel_sk', 'message_id', 'product_name'], 'unique': True},
+        {'columns': ['product_name']},
+        {'columns': ['date_pk']},
+        {'columns': ['extracted_at']}
+    ],
+    post_hook=[
+        "DELETE FROM {{ this }} f WHERE NOT EXISTS (SELECT 1 FROM {{ source('raw', 'product_mentions') }} r JOIN {{ ref('dim_channels') }} dc ON r.channel = dc.channel_name WHERE dc.channel_sk = f.channel_sk AND r.message_id = f.message_id AND r.product_name = f.product_name)"
+    ]
+) }}
+
+SELECT
+    spm.message_id,
+    dc.channel_sk,
+    sm.message_timestamp::date AS date_pk,
+    spm.product_name,
+    spm.mention_count,
+    spm.extracted_at -- Watermark for the next incremental run
+FROM
+    {{ ref('stg_product_mentions') }} spm
+JOIN
+    {{ ref('stg_telegram_messages') }} sm
+    ON spm.channel_username = sm.channel_username AND spm.message_id = sm.message_id
+JOIN -- dim_channels holds every channel that has a message, so this never drops rows
+    {{ ref('dim_channels') }} dc
+    ON spm.channel_username = dc.channel_name
+{% if is_incremental() %}
+WHERE
+    {{ incremental_watermark('spm.extracted_at') }}
+{% endif %}
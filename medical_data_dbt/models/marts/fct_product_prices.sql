@@ -0,0 +1,48 @@
+-- models/marts/fct_product_prices.sql
+-- One row per price attributed to a product; (product_name, date_pk) serves /api/reports/price-trends
+-- Incremental: each run merges the prices extracted since the last one; `dbt run --full-refresh` rebuilds it.
+-- Price extraction replaces all prices of a message whenever it re-reads it, and a price may lose its product,
+-- so the post-hook drops mart rows whose price is gone from raw or no longer attributed.
+{{ config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['channel_sk', 'message_id', 'price_index'],
+    on_schema_change='append_new_columns',
+    pre_hook=[
+        "{{ require_unique_key_index(this, ['channel_sk', 'message_id', 'price_index']) }}"
+    ],
+    indexes=[
+        {'columns': ['channel_sk', 'message_id', 'price_index'], 'unique': True},
+        {'columns': ['product_name', 'date_pk']},
+        {'columns': ['channel_sk', 'date_pk']},
+        {'columns': ['extracted_at']}
+    ],
+    post_hook=[
+        "DELETE FROM {{ this }} f WHERE NOT EXISTS (SELECT 1 FROM {{ source('raw', 'product_prices') }} r JOIN {{ ref('dim_channels') }} dc ON r.channel = dc.channel_name WHERE dc.channel_sk = f.channel_sk AND r.message_id = f.message_id AND r.price_index = f.price_index AND r.product_name IS NOT NULL)"
+    ]
+) }}
+
+SELECT
+    spp.message_id,
+    dc.channel_sk,
+    sm.message_timestamp::date AS date_pk,
+    spp.price_index,
+    spp.product_name,
+    spp.price_min,
+    spp.price_max,
+    spp.price,
+    spp.currency_text,
+    spp.extracted_at -- Watermark for the next incremental run
+FROM
+    {{ ref('stg_product_prices') }} spp
+JOIN
+    {{ ref('stg_telegram_messages') }} sm
+    ON spp.channel_username = sm.channel_username AND spp.message_id = sm.message_id
+JOIN
+    {{ ref('dim_channels') }} dc
+    ON spp.channel_username = dc.channel_name
+WHERE
+    spp.product_name IS NOT NULL
+{% if is_incremental() %}
+    AND {{ incremental_watermark('spp.extracted_at') }}
+{% endif %}
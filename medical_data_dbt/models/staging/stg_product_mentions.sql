@@ -0,0 +1,11 @@
+-- models/staging/stg_product_mentions.sql
+{{ config(materialized='view') }}
+
+SELECT
+    message_id,
+    channel AS channel_username, -- Same naming as stg_telegram_messages
+    product_name,
+    mention_count,
+    extracted_at
+FROM
+    {{ source('raw', 'product_mentions') }}
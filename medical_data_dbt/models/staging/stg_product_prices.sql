@@ -0,0 +1,15 @@
+-- models/staging/stg_product_prices.sql
+{{ config(materialized='view') }}
+
+SELECT
+    message_id,
+    channel AS channel_username, -- Same naming as stg_telegram_messages
+    price_index,
+    product_name, -- NULL when the price could not be tied to a single product
+    price_min,
+    price_max,
+    (price_min + price_max) / 2 AS price, -- Midpoint for ranges, the price itself otherwise
+    currency_text,
+    extracted_at
+FROM
+    {{ source('raw', 'product_prices') }}
@@ -8,8 +8,10 @@ SELECT
     text AS message_text, -- Changed to message_text for consistency
     has_image,
     photo_path,
-    source_file -- Ensure this column is selected if it exists in raw.telegram_messages
+    source_file, -- Ensure this column is selected if it exists in raw.telegram_messages
+    loaded_at -- Set on every insert or reload; watermark for the incremental marts
 FROM
     {{ source('raw', 'telegram_messages') }}
 WHERE
-    text IS NOT NULL
\ No newline at end of file
+    text IS NOT NULL
+    AND id IS NOT NULL -- MERGE never matches a NULL key, so the incremental marts would re-insert these rows every run
\ No newline at end of file
@@ -5,9 +5,14 @@ SELECT
     detection_id,
     message_id,
     image_path,
+    model_version,
+    box_index,
     detected_class,
     confidence,
-    bbox_xyxy,
+    x1, -- Bounding box corners in original image pixels
+    y1,
+    x2,
+    y2,
     detection_timestamp
 FROM
-    {{ source('raw', 'yolo_detections') }}
\ No newline at end of file
+    {{ source('raw', 'yolo_detections') }}
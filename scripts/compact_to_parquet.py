@@ -0,0 +1,72 @@
+import glob
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+
+logging.basicConfig(filename='compact.log', level=logging.INFO)
+
+RAW_DATA_BASE_DIR = "data/raw/telegram_messages"
+
+def compact_channel_day(channel_dir, remove_source=True):
+    """
+    Compacts the NDJSON files of one day/channel directory into a single Parquet file.
+    An existing compacted file in the directory is merged in, messages are de-duplicated on id
+    (the latest copy wins), and the result replaces <channel>_<date>.parquet atomically.
+    The NDJSON sources are removed afterwards unless remove_source is False.
+    Returns the Parquet path, or None if there was nothing to compact.
+    """
+    ndjson_files = sorted(glob.glob(os.path.join(channel_dir, "*.ndjson")))
+    if not ndjson_files:
+        return None
+
+    channel_name = os.path.basename(os.path.normpath(channel_dir))
+    day = os.path.basename(os.path.dirname(os.path.normpath(channel_dir)))
+    parquet_path = os.path.join(channel_dir, f"{channel_name}_{day}.parquet")
+
+    frames = [pd.read_parquet(parquet_path)] if os.path.exists(parquet_path) else []
+    # dtype=False keeps dates as the ISO strings the scraper wrote, same as the other landing formats
+    frames += [pd.read_json(path, lines=True, dtype=False) for path in ndjson_files]
+    messages = pd.concat(frames, ignore_index=True).drop_duplicates(subset="id", keep="last").sort_values("id")
+
+    temp_path = f"{parquet_path}.tmp"
+    messages.to_parquet(temp_path, index=False)
+    os.replace(temp_path, parquet_path)
+    logging.info(f"Compacted {len(ndjson_files)} NDJSON files ({len(messages)} messages) into {parquet_path}")
+
+    if remove_source:
+        for path in ndjson_files:
+            os.remove(path)
+    return parquet_path
+
+def compact_raw_files(base_dir=RAW_DATA_BASE_DIR, before_date=None, remove_source=True):
+    """
+    Compacts every day/channel directory under base_dir for days before before_date (default: today),
+    so the directory the scraper is still appending to is left alone.
+    Returns the list of Parquet files written.
+    """
+    before_date = before_date or datetime.now().strftime('%Y-%m-%d')
+    written = []
+    for channel_dir in sorted(glob.glob(os.path.join(base_dir, "*", "*"))):
+        day = os.path.basename(os.path.dirname(channel_dir))
+        if not os.path.isdir(channel_dir) or day >= before_date:
+            continue
+        try:
+            parquet_path = compact_channel_day(channel_dir, remove_source)
+            if parquet_path:
+                written.append(parquet_path)
+        except Exception as e:
+            logging.error(f"Error compacting {channel_dir}: {e}")
+    return written
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact past days' NDJSON landing files into Parquet.")
+    parser.add_argument("--base-dir", default=RAW_DATA_BASE_DIR)
+    parser.add_argument("--before", help="Only compact days before this YYYY-MM-DD (default: today)")
+    parser.add_argument("--keep-source", action="store_true", help="Keep the NDJSON files after compaction")
+    args = parser.parse_args()
+
+    compact_raw_files(args.base_dir, args.before, remove_source=not args.keep_source)
@@ -9,4 +9,36 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
\ No newline at end of file
+DB_PORT = os.getenv("DB_PORT")
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "1"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "10"))
+
+# YOLO enrichment: inference backend (torch, onnx or openvino), INT8 export (openvino only) and worker processes
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "torch")
+YOLO_INT8 = os.getenv("YOLO_INT8", "false").lower() == "true"
+YOLO_WORKERS = int(os.getenv("YOLO_WORKERS", "1"))
+
+# Compact past days' NDJSON landing files into Parquet before loading
+COMPACT_RAW_TO_PARQUET = os.getenv("COMPACT_RAW_TO_PARQUET", "false").lower() == "true"
+
+# Size of scraped photos kept in the media store: "full", or "thumb" (~800px) for images that only feed detection
+MEDIA_SIZE_VARIANT = os.getenv("MEDIA_SIZE_VARIANT", "full")
+
+# API response cache: entry lifetime, size bound, and how often to poll meta.data_version for pipeline updates
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_VERSION_CHECK_SECONDS = int(os.getenv("CACHE_VERSION_CHECK_SECONDS", "30"))
+
+# Product dictionary ({product: [English/Amharic variants]}) used to extract product mentions at load time
+PRODUCT_DICTIONARY_PATH = os.getenv(
+    "PRODUCT_DICTIONARY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "product_dictionary.json")
+)
+
+# Dagster pipeline: channels scraped, first daily partition, how many ops may run at once
+# (overall, and per stage for the per-channel load and YOLO ops) and files loaded in parallel per load op
+TELEGRAM_CHANNELS = [c.strip() for c in os.getenv("TELEGRAM_CHANNELS", "Chemed,lobelia4cosmetics,tikvahpharma").split(",") if c.strip()]
+PIPELINE_START_DATE = os.getenv("PIPELINE_START_DATE", "2023-01-01")
+PIPELINE_MAX_CONCURRENT = int(os.getenv("PIPELINE_MAX_CONCURRENT", "4"))
+LOAD_CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "4"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "2"))
+YOLO_CONCURRENCY = int(os.getenv("YOLO_CONCURRENCY", "1"))
@@ -0,0 +1,44 @@
+import logging
+import psycopg2
+from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+
+def create_data_version_table(cur):
+    """Creates meta.data_version, a single-row counter that is bumped whenever the marts change."""
+    cur.execute("""
+        CREATE SCHEMA IF NOT EXISTS meta;
+
+        CREATE TABLE IF NOT EXISTS meta.data_version (
+            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL,
+            updated_by VARCHAR(255),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def bump_data_version(updated_by):
+    """
+    Increments meta.data_version so API response caches drop results computed from older data.
+    updated_by names the pipeline step that changed the data. Returns the new version.
+    """
+    conn = psycopg2.connect(
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+    try:
+        cur = conn.cursor()
+        create_data_version_table(cur)
+        cur.execute("""
+            INSERT INTO meta.data_version (id, version, updated_by, updated_at)
+            VALUES (1, 1, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET
+                version = meta.data_version.version + 1,
+                updated_by = EXCLUDED.updated_by,
+                updated_at = EXCLUDED.updated_at
+            RETURNING version;
+        """, (updated_by,))
+        version = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        logging.info(f"Data version bumped to {version} by {updated_by}")
+        return version
+    finally:
+        conn.close()
@@ -0,0 +1,34 @@
+import io
+
+
+def _csv_field(value):
+    """
+    One CSV field for COPY: NULL is an unquoted empty field and every other value is quoted,
+    so empty strings and text such as '\\N' never read back as NULL.
+    """
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_rows(cur, table_name, columns, rows):
+    """
+    Streams rows into a table with COPY ... FROM STDIN.
+    Rows are serialised as CSV into an in-memory buffer, so a whole batch costs one round trip.
+    Returns the number of rows written.
+    """
+    buffer = io.StringIO()
+    row_count = 0
+    for row in rows:
+        buffer.write(",".join(map(_csv_field, row)))
+        buffer.write("\n")
+        row_count += 1
+    if row_count == 0:
+        return 0
+
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    return row_count
@@ -0,0 +1,217 @@
+from contextlib import contextmanager
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+# Upper bounds in seconds, wide enough for both API requests and whole pipeline stages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, math.inf)
+RUN_METRICS_TABLE = "meta.pipeline_run_metrics"
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms, each keyed by name and a set of labels.
+    Thread-safe; the pipeline snapshots it into meta.pipeline_run_metrics after every op,
+    and the API renders it in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {} # (name, labels) -> value
+        self._gauges = {} # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [count per bucket, sum, count]
+
+    def increment(self, name, value=1, **labels):
+        """Adds value to a counter."""
+        with self._lock:
+            key = (name, _label_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_counter(self, name, value, **labels):
+        """Overwrites a counter, for totals that are maintained elsewhere (e.g. the response cache's stats)."""
+        with self._lock:
+            self._counters[(name, _label_key(labels))] = value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        """Records one observation in a histogram."""
+        with self._lock:
+            key = (name, _label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Times the block into the {name}_seconds histogram. A block that raises also
+        increments {name}_errors_total before the exception propagates.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Every metric as a JSON-serialisable dict: {type, name, labels, value} for counters and gauges,
+        plus count and cumulative buckets ({upper bound: count}) for histograms, whose value is the sum.
+        """
+        with self._lock:
+            metrics = [
+                {"type": metric_type, "name": name, "labels": dict(labels), "value": value}
+                for metric_type, values in (("counter", self._counters), ("gauge", self._gauges))
+                for (name, labels), value in values.items()
+            ]
+            for (name, labels), (bucket_counts, total, count) in self._histograms.items():
+                cumulative, buckets = 0, {}
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    buckets["+Inf" if math.isinf(upper_bound) else repr(upper_bound)] = cumulative
+                metrics.append({"type": "histogram", "name": name, "labels": dict(labels), "value": total,
+                                "count": count, "buckets": buckets})
+        return metrics
+
+    def merge(self, snapshot):
+        """Folds in a snapshot taken in another process (e.g. a YOLO shard worker)."""
+        with self._lock:
+            for metric in snapshot:
+                key = (metric["name"], _label_key(metric["labels"]))
+                if metric["type"] == "counter":
+                    self._counters[key] = self._counters.get(key, 0) + metric["value"]
+                elif metric["type"] == "gauge":
+                    self._gauges[key] = metric["value"]
+                else:
+                    histogram = self._histograms.get(key)
+                    if histogram is None:
+                        histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+                    previous = 0
+                    for index, cumulative in enumerate(metric["buckets"].values()):
+                        histogram[0][index] += cumulative - previous
+                        previous = cumulative
+                    histogram[1] += metric["value"]
+                    histogram[2] += metric["count"]
+
+    def render_prometheus(self):
+        """The registry in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        typed = set()
+        # Sorted by exposed name, so every sample of a metric family follows its TYPE line
+        for metric in sorted(self.snapshot(), key=lambda m: (_INVALID_NAME_CHARS.sub("_", m["name"]), sorted(m["labels"].items()))):
+            name = _INVALID_NAME_CHARS.sub("_", metric["name"])
+            if name not in typed:
+                lines.append(f"# TYPE {name} {metric['type']}")
+                typed.add(name)
+            if metric["type"] == "histogram":
+                for upper_bound, count in metric["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels({**metric['labels'], 'le': upper_bound})} {count}")
+                lines.append(f"{name}_sum{_format_labels(metric['labels'])} {metric['value']}")
+                lines.append(f"{name}_count{_format_labels(metric['labels'])} {metric['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(metric['labels'])} {metric['value']}")
+        return "\n".join(lines) + "\n"
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = (f'{_INVALID_NAME_CHARS.sub("_", name)}="{_escape_label_value(value)}"' for name, value in sorted(labels.items()))
+    return "{" + ",".join(pairs) + "}"
+
+REGISTRY = MetricsRegistry()
+increment = REGISTRY.increment
+observe = REGISTRY.observe
+span = REGISTRY.span
+
+def create_run_metrics_table(cur):
+    """Creates meta.pipeline_run_metrics: one row per metric per op of a pipeline run."""
+    cur.execute(f"""
+        CREATE SCHEMA IF NOT EXISTS meta;
+
+        CREATE TABLE IF NOT EXISTS {RUN_METRICS_TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            run_id VARCHAR(64) NOT NULL,
+            step_key VARCHAR(255) NOT NULL,
+            partition_key VARCHAR(64),
+            metric_type VARCHAR(16) NOT NULL,
+            metric_name VARCHAR(255) NOT NULL,
+            labels JSONB NOT NULL,
+            value DOUBLE PRECISION NOT NULL, -- Counter or gauge value; sum of observations for histograms
+            sample_count BIGINT, -- Histograms only
+            buckets JSONB, -- Histograms only: cumulative count per upper bound
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS pipeline_run_metrics_run_idx ON {RUN_METRICS_TABLE} (run_id, step_key);
+        CREATE INDEX IF NOT EXISTS pipeline_run_metrics_name_idx ON {RUN_METRICS_TABLE} (metric_name, recorded_at);
+    """)
+
+def write_run_metrics(conn, run_id, step_key, partition_key=None, registry=REGISTRY):
+    """Appends a snapshot of registry to meta.pipeline_run_metrics and commits. Returns the number of rows written."""
+    rows = [
+        (run_id, step_key, partition_key, metric["type"], metric["name"], json.dumps(metric["labels"]),
+         metric["value"], metric.get("count"), json.dumps(metric["buckets"]) if "buckets" in metric else None)
+        for metric in registry.snapshot()
+    ]
+    with conn.cursor() as cur:
+        create_run_metrics_table(cur)
+        if rows:
+            execute_values(cur, f"""
+                INSERT INTO {RUN_METRICS_TABLE}
+                    (run_id, step_key, partition_key, metric_type, metric_name, labels, value, sample_count, buckets)
+                VALUES %s;
+            """, rows)
+    conn.commit()
+    return len(rows)
+
+@contextmanager
+def record_run_metrics(run_id, step_key, partition_key, connect, registry=REGISTRY):
+    """
+    Runs the block as one pipeline step: the registry starts empty, the whole block is timed as the
+    'pipeline_step' span, and the collected metrics are written to meta.pipeline_run_metrics through
+    a connection from connect() afterwards, whether or not the block failed. A failure to write
+    metrics is logged and never fails the step.
+    """
+    registry.reset()
+    try:
+        with registry.span("pipeline_step", step=step_key.split("[")[0]):
+            yield registry
+    finally:
+        try:
+            conn = connect()
+            try:
+                written = write_run_metrics(conn, run_id, step_key, partition_key, registry)
+                logging.info(f"Recorded {written} metrics for {step_key} of run {run_id}")
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f"Could not record metrics for {step_key} of run {run_id}: {e}")
@@ -1,22 +1,374 @@
 import json
 import psycopg2
+from psycopg2.extras import execute_values
 from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+from db_utils import copy_rows
+from scripts.instrumentation import increment, observe
+from product_matcher import create_product_mentions_table, write_product_mentions
 import glob
+import hashlib
 import logging
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 logging.basicConfig(filename='load.log', level=logging.INFO)
 
-def load_json_to_postgres(json_dir, table_name="raw.telegram_messages"):
-    conn = None
-    cur = None
+# Columns written for every message, in the order produced by message_to_row()
+MESSAGE_COLUMNS = ("id", "channel", "date", "text", "has_image", "photo_path", "source_file")
+
+# Ingestion modes supported by load_json_to_postgres:
+#   insert - one INSERT per message (original behaviour)
+#   batch  - multi-row INSERTs of BATCH_SIZE messages
+#   copy   - one COPY ... FROM STDIN per file
+LOAD_MODES = ("insert", "batch", "copy")
+BATCH_SIZE = 1000
+
+# Natural key of a Telegram message; reloading a file upserts on it instead of appending duplicates
+MESSAGE_KEY = ("channel", "id")
+
+# Records which files have been loaded so unchanged files can be skipped on the next run
+MANIFEST_TABLE = "raw.load_manifest"
+
+# Pools available to load_json_to_postgres_parallel
+POOL_EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+# Raw landing formats the loader understands; see iter_raw_messages()
+RAW_FILE_EXTENSIONS = (".json", ".ndjson", ".parquet")
+PARQUET_BATCH_SIZE = 10000
+
+_WHITESPACE = re.compile(r"\s*")
+_NUMBER_CONTINUATION = frozenset("0123456789.eE+-") # Characters that can extend a JSON number
+
+# One connection per pool worker (thread or process), opened lazily by _get_worker_connection()
+_worker_state = threading.local()
+_worker_connections = []
+_worker_connections_lock = threading.Lock()
+
+def message_to_row(msg, channel_name, json_file_path):
+    """Maps a scraped message dict to a tuple ordered like MESSAGE_COLUMNS."""
+    return (
+        msg.get("id"),
+        channel_name,
+        msg.get("date"),
+        msg.get("text"),
+        msg.get("has_image"),
+        msg.get("photo_path"),
+        json_file_path
+    )
+
+def channel_from_path(json_file_path):
+    """The channel name is the directory the JSON file lives in."""
+    path_parts = json_file_path.split(os.sep)
+    if len(path_parts) >= 2:
+        return path_parts[-2]
+    return "unknown_channel"
+
+def _staging_table_name(table_name):
+    """Name of the session-local temp table COPY writes to before merging into table_name."""
+    return f"_stage_{table_name.split('.')[-1]}"
+
+def _upsert_clause(table_name):
+    """
+    ON CONFLICT clause that overwrites a previously loaded message with the reloaded one.
+    loaded_at moves forward too, so the incremental dbt models pick the change up; a reload
+    that changes nothing leaves the row alone, so it is not merged into the marts again.
+    """
+    content_columns = [column for column in MESSAGE_COLUMNS if column not in MESSAGE_KEY]
+    updates = ", ".join(
+        [f"{column} = EXCLUDED.{column}" for column in content_columns] + ["loaded_at = CURRENT_TIMESTAMP"]
+    )
+    return (
+        f"ON CONFLICT ({', '.join(MESSAGE_KEY)}) DO UPDATE SET {updates} "
+        f"WHERE ({', '.join(f'{table_name}.{column}' for column in content_columns)}) IS DISTINCT FROM "
+        f"({', '.join(f'EXCLUDED.{column}' for column in content_columns)})"
+    )
+
+def _dedupe_rows(rows):
+    """
+    Keeps the last row per (channel, id) key.
+    A single multi-row INSERT ... ON CONFLICT cannot touch the same key twice.
+    """
+    key_positions = [MESSAGE_COLUMNS.index(column) for column in MESSAGE_KEY]
+    deduped = {}
+    for row in rows:
+        deduped[tuple(row[i] for i in key_positions)] = row
+    return list(deduped.values())
+
+def write_rows(cur, table_name, rows, mode="insert"):
+    """
+    Upserts message rows into table_name using the given ingestion mode.
+    Returns the number of rows written. Does not commit.
+    """
+    columns = ", ".join(MESSAGE_COLUMNS)
+    if mode == "copy":
+        # COPY cannot upsert, so rows land in a temp table and are merged with one INSERT ... SELECT
+        staging_table = _staging_table_name(table_name)
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging_table} (LIKE {table_name} INCLUDING DEFAULTS);"
+        )
+        row_count = copy_rows(cur, staging_table, MESSAGE_COLUMNS, rows)
+        cur.execute(f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT DISTINCT ON ({', '.join(MESSAGE_KEY)}) {columns}
+            FROM {staging_table}
+            ORDER BY {', '.join(MESSAGE_KEY)}, ctid DESC
+            {_upsert_clause(table_name)};
+        """)
+        cur.execute(f"TRUNCATE {staging_table};")
+        return row_count
+    if mode == "batch":
+        rows = _dedupe_rows(rows)
+        execute_values(
+            cur,
+            f"INSERT INTO {table_name} ({columns}) VALUES %s {_upsert_clause(table_name)}",
+            rows,
+            page_size=BATCH_SIZE
+        )
+        return len(rows)
+
+    row_count = 0
+    for row in rows:
+        cur.execute(
+            f"INSERT INTO {table_name} ({columns}) VALUES (%s, %s, %s, %s, %s, %s, %s) {_upsert_clause(table_name)}",
+            row
+        )
+        row_count += 1
+    return row_count
+
+def ensure_message_key(cur, table_name):
+    """
+    Adds the (channel, id) unique index that upserts rely on.
+    Tables created before the index existed may already hold duplicates, which are removed first.
+    """
+    schema, _, table = table_name.rpartition(".")
+    index_name = f"{table}_channel_id_key"
+    qualified_index = f"{schema}.{index_name}" if schema else index_name
+
+    cur.execute("SELECT to_regclass(%s);", (qualified_index,))
+    if cur.fetchone()[0] is not None:
+        return
+
+    cur.execute(f"""
+        DELETE FROM {table_name} a
+        USING {table_name} b
+        WHERE a.channel = b.channel AND a.id = b.id AND a.ctid < b.ctid;
+    """)
+    if cur.rowcount:
+        logging.info(f"Removed {cur.rowcount} duplicate rows from {table_name} before adding its unique key")
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(MESSAGE_KEY)});")
+
+def ensure_load_watermark(cur, table_name):
+    """
+    Adds the loaded_at column and its index to tables created before it existed.
+    fct_messages is built incrementally from the rows whose loaded_at is past its watermark.
+    """
+    table = table_name.rpartition(".")[2]
+    cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_loaded_at_idx ON {table_name} (loaded_at);")
+
+def get_db_connection():
+    """Establishes and returns a PostgreSQL database connection."""
+    return psycopg2.connect(
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+
+def create_manifest_table(cur):
+    """Creates the load manifest table if it doesn't exist."""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            file_path TEXT PRIMARY KEY,
+            file_size BIGINT NOT NULL,
+            file_mtime DOUBLE PRECISION NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            row_count INTEGER,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def get_manifest(cur):
+    """Returns {file_path: (file_size, file_mtime, content_hash)} for every file loaded so far."""
+    cur.execute(f"SELECT file_path, file_size, file_mtime, content_hash FROM {MANIFEST_TABLE};")
+    return {row[0]: (row[1], row[2], row[3]) for row in cur.fetchall()}
+
+def _read_manifest(conn):
+    cur = conn.cursor()
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+        return get_manifest(cur)
+    finally:
+        cur.close()
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_file_unchanged(cur, file_path, manifest_entry):
+    """
+    Decides whether a file matches its manifest entry.
+    Size and mtime are compared first; the content hash is only computed when they differ,
+    and a file that was merely touched gets its manifest entry refreshed instead of being reloaded.
+    Returns (unchanged, file_size, file_mtime, content_hash); content_hash is None when it was not needed.
+    """
+    stat = os.stat(file_path)
+    if manifest_entry is None:
+        return False, stat.st_size, stat.st_mtime, None
+
+    stored_size, stored_mtime, stored_hash = manifest_entry
+    if stored_size == stat.st_size and stored_mtime == stat.st_mtime:
+        return True, stat.st_size, stat.st_mtime, stored_hash
+
+    content_hash = hash_file(file_path)
+    if content_hash == stored_hash:
+        cur.execute(
+            f"UPDATE {MANIFEST_TABLE} SET file_size = %s, file_mtime = %s WHERE file_path = %s;",
+            (stat.st_size, stat.st_mtime, file_path)
         )
-        cur = conn.cursor()
+        return True, stat.st_size, stat.st_mtime, content_hash
+    return False, stat.st_size, stat.st_mtime, content_hash
+
+def record_manifest_entry(cur, file_path, file_size, file_mtime, content_hash, row_count):
+    """Upserts a file's manifest entry; runs in the same transaction as the file's rows."""
+    cur.execute(f"""
+        INSERT INTO {MANIFEST_TABLE} (file_path, file_size, file_mtime, content_hash, row_count, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (file_path) DO UPDATE SET
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            content_hash = EXCLUDED.content_hash,
+            row_count = EXCLUDED.row_count,
+            loaded_at = EXCLUDED.loaded_at;
+    """, (file_path, file_size, file_mtime, content_hash, row_count))
+
+def _check_json_array_end(f, buffer, pos, chunk_size):
+    """Raises unless only whitespace follows the closing bracket of a top-level JSON array."""
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            raise json.JSONDecodeError("Extra data after the JSON array", buffer, pos)
+        buffer, pos = f.read(chunk_size), 0
+        if not buffer:
+            return
+
+def iter_json_array(file_path, chunk_size=64 * 1024):
+    """
+    Yields the elements of a top-level JSON array one at a time.
+    The file is read in chunks and decoded incrementally, so only the current
+    element (plus one chunk) is held in memory instead of the whole dump.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = "", 0, False
+        state = "start" # start -> first -> (value -> separator)*
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    raise json.JSONDecodeError("Unexpected end of JSON array", buffer, pos)
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            if state == "start":
+                if buffer[pos] != "[":
+                    raise json.JSONDecodeError("Expected a JSON array", buffer, pos)
+                pos += 1
+                state = "first"
+            elif state == "separator":
+                if buffer[pos] == "]":
+                    _check_json_array_end(f, buffer, pos + 1, chunk_size)
+                    return
+                if buffer[pos] != ",":
+                    raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+                pos += 1
+                state = "value"
+            else:
+                if state == "first" and buffer[pos] == "]":
+                    _check_json_array_end(f, buffer, pos + 1, chunk_size)
+                    return
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                # An element running up to the end of the buffer may be truncated, and so may a number followed by
+                # what can only continue it ('1' of '1.25' or '1.5' of '1.5e10' cut at a chunk boundary): read more first
+                truncated = end is not None and (end == len(buffer) or buffer[end] in _NUMBER_CONTINUATION)
+                if end is None or (truncated and not eof):
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                yield element
+                pos = end
+                state = "separator"
+
+def iter_ndjson(file_path):
+    """
+    Yields one message per non-empty line of a newline-delimited JSON file.
+    A final line cut off mid-write (no trailing newline, not valid JSON) is skipped with a warning.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+                logging.warning(f"Skipping truncated last line of {file_path}")
 
+def iter_parquet(file_path, batch_size=PARQUET_BATCH_SIZE):
+    """Yields one message dict per row of a compacted Parquet file, reading a row batch at a time."""
+    import pyarrow.parquet as pq # Only needed once Parquet compaction is in use
+
+    parquet_file = pq.ParquetFile(file_path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield from record_batch.to_pylist()
+
+def iter_raw_messages(file_path):
+    """
+    Streams the messages of a raw landing file, picking the reader from its extension:
+    legacy .json arrays, .ndjson appended by the scraper, or .parquet written by compaction.
+    """
+    extension = os.path.splitext(file_path)[1]
+    if extension == ".ndjson":
+        return iter_ndjson(file_path)
+    if extension == ".parquet":
+        return iter_parquet(file_path)
+    return iter_json_array(file_path)
+
+def find_raw_files(pattern):
+    """Globs pattern and keeps the files in one of the RAW_FILE_EXTENSIONS formats."""
+    return [
+        path for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path) and os.path.splitext(path)[1] in RAW_FILE_EXTENSIONS
+    ]
+
+def _batched(iterable, size):
+    """Groups an iterable into lists of at most size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ensure_raw_tables(conn, table_name):
+    """Creates the raw schema, the messages table with its unique key, the load manifest and raw.product_mentions."""
+    cur = conn.cursor()
+    try:
         cur.execute(f"CREATE SCHEMA IF NOT EXISTS raw;")
 
         cur.execute(f"""
@@ -27,45 +379,123 @@ def load_json_to_postgres(json_dir, table_name="raw.telegram_messages"):
                 text TEXT,
                 has_image BOOLEAN,
                 photo_path VARCHAR,
-                source_file VARCHAR
+                source_file VARCHAR,
+                loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
+        ensure_load_watermark(cur, table_name)
+        ensure_message_key(cur, table_name)
+        create_manifest_table(cur)
+        create_product_mentions_table(cur)
+        conn.commit()
+    finally:
+        cur.close()
+
+def load_file(conn, json_file_path, table_name, mode, manifest_entry=None):
+    """
+    Loads a single raw file (.json, .ndjson or .parquet) in its own transaction.
+    Messages are parsed incrementally and pushed to the database in BATCH_SIZE batches,
+    together with the product mentions extracted from their text.
+    Never raises for file-level problems; returns a result dict with
+    file, status ('loaded', 'skipped' or 'failed'), rows, bytes, seconds and error.
+    """
+    started = time.perf_counter()
+    result = {"file": json_file_path, "status": "failed", "rows": 0, "bytes": 0, "seconds": 0.0, "error": None}
+    cur = conn.cursor()
+    try:
+        unchanged, file_size, file_mtime, content_hash = is_file_unchanged(cur, json_file_path, manifest_entry)
+        if unchanged:
+            conn.commit() # Persist a refreshed mtime, if any
+            result["status"] = "skipped"
+            return result
+        if content_hash is None:
+            content_hash = hash_file(json_file_path)
+
+        channel_name = channel_from_path(json_file_path)
+        rows = (message_to_row(msg, channel_name, json_file_path) for msg in iter_raw_messages(json_file_path))
+        row_count = 0
+        for batch in _batched(rows, BATCH_SIZE):
+            row_count += write_rows(cur, table_name, batch, mode)
+            # Product extraction runs once per loaded message, in the same transaction as the message itself
+            write_product_mentions(cur, [(row[1], row[0], row[3]) for row in batch])
+        record_manifest_entry(cur, json_file_path, file_size, file_mtime, content_hash, row_count)
         conn.commit()
 
-        json_files = glob.glob(json_dir, recursive=True)
-        logging.info(f"Found {len(json_files)} JSON files to load from {json_dir}")
+        elapsed = time.perf_counter() - started
+        rows_per_second = row_count / elapsed if elapsed > 0 else 0.0
+        logging.info(
+            f"Successfully loaded {row_count} rows from {json_file_path} to {table_name} "
+            f"in {elapsed:.3f}s ({rows_per_second:.0f} rows/s, mode={mode})"
+        )
+        result.update(status="loaded", rows=row_count, bytes=file_size)
+
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON from {json_file_path}: {e}")
+        result["error"] = str(e)
+        conn.rollback()
+    except Exception as e:
+        logging.error(f"Error processing file {json_file_path}: {e}")
+        result["error"] = str(e)
+        conn.rollback()
+    finally:
+        cur.close()
+        result["seconds"] = time.perf_counter() - started
+    return result
+
+def _log_summary(results):
+    loaded = [r for r in results if r["status"] == "loaded"]
+    skipped = [r for r in results if r["status"] == "skipped"]
+    failed = [r for r in results if r["status"] == "failed"]
+    logging.info(
+        f"Loaded {len(loaded)} files ({sum(r['rows'] for r in loaded)} rows), "
+        f"skipped {len(skipped)} unchanged files already recorded in {MANIFEST_TABLE}, "
+        f"{len(failed)} files failed"
+    )
+    for r in failed:
+        logging.error(f"Failed to load {r['file']}: {r['error']}")
+
+def _record_metrics(results):
+    """
+    Adds the per-file results to the instrumentation registry. Runs in the calling process,
+    so loads done in process pool workers are counted too.
+    """
+    for r in results:
+        channel = channel_from_path(r["file"])
+        increment("load_files_total", channel=channel, status=r["status"])
+        if r["status"] == "failed":
+            increment("load_errors_total", channel=channel)
+        if r["status"] != "loaded":
+            continue
+        increment("load_rows_total", r["rows"], channel=channel)
+        increment("load_bytes_total", r["bytes"], channel=channel)
+        observe("load_file_seconds", r["seconds"], channel=channel) # Per channel only: a file label would add a series per file
+
+def load_json_to_postgres(json_dir, table_name="raw.telegram_messages", mode="insert", skip_unchanged=True):
+    """
+    Loads every raw file (.json, .ndjson or .parquet) matching the json_dir glob into table_name.
+    Each file is committed (or rolled back) on its own; rows/second per file is logged
+    so the ingestion modes in LOAD_MODES can be compared.
+    Messages are upserted on (channel, id), and files already recorded in the load manifest
+    with the same contents are skipped unless skip_unchanged is False.
+    Returns the per-file result dicts produced by load_file().
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}', expected one of {LOAD_MODES}")
+
+    conn = None
+    results = []
+    try:
+        conn = get_db_connection()
+        ensure_raw_tables(conn, table_name)
+        manifest = _read_manifest(conn) if skip_unchanged else {}
+
+        json_files = find_raw_files(json_dir)
+        logging.info(f"Found {len(json_files)} raw files to load from {json_dir} (mode={mode})")
 
         for json_file_path in json_files:
-            try:
-                with open(json_file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                path_parts = json_file_path.split(os.sep)
-                if len(path_parts) >= 2:
-                    channel_name = path_parts[-2]
-                else:
-                    channel_name = "unknown_channel"
-
-                for msg in data:
-                    msg_id = msg.get("id")
-                    msg_date = msg.get("date")
-                    msg_text = msg.get("text")
-                    msg_has_image = msg.get("has_image")
-                    msg_photo_path = msg.get("photo_path")
-
-                    cur.execute(
-                        f"INSERT INTO {table_name} (id, channel, date, text, has_image, photo_path, source_file) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                        (msg_id, channel_name, msg_date, msg_text, msg_has_image, msg_photo_path, json_file_path)
-                    )
-                conn.commit()
-                logging.info(f"Successfully loaded data from {json_file_path} to {table_name}")
-
-            except json.JSONDecodeError as e:
-                logging.error(f"Error decoding JSON from {json_file_path}: {e}")
-                if conn: conn.rollback()
-            except Exception as e:
-                logging.error(f"Error processing file {json_file_path}: {e}")
-                if conn: conn.rollback()
+            results.append(load_file(conn, json_file_path, table_name, mode, manifest.get(json_file_path)))
+        _log_summary(results)
+        _record_metrics(results)
 
     except psycopg2.Error as e:
         logging.error(f"Database connection or operation error: {e}")
@@ -74,16 +504,102 @@ def load_json_to_postgres(json_dir, table_name="raw.telegram_messages"):
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
     finally:
-        if cur:
-            cur.close()
         if conn:
             conn.close()
         logging.info("Database connection closed.")
+    return results
+
+def _get_worker_connection():
+    """Returns the calling worker's own connection, opening it on first use."""
+    conn = getattr(_worker_state, "conn", None)
+    if conn is None or conn.closed:
+        conn = get_db_connection()
+        _worker_state.conn = conn
+        with _worker_connections_lock:
+            _worker_connections.append(conn)
+    return conn
+
+def _load_file_in_worker(json_file_path, table_name, mode, manifest_entry):
+    """Pool task: loads one file on the worker's connection and always returns a result dict."""
+    try:
+        conn = _get_worker_connection()
+    except Exception as e:
+        logging.error(f"Worker could not connect to load {json_file_path}: {e}")
+        return {"file": json_file_path, "status": "failed", "rows": 0, "bytes": 0, "seconds": 0.0, "error": str(e)}
+    return load_file(conn, json_file_path, table_name, mode, manifest_entry)
+
+def _close_worker_connections():
+    with _worker_connections_lock:
+        while _worker_connections:
+            conn = _worker_connections.pop()
+            if not conn.closed:
+                conn.close()
 
+def load_json_to_postgres_parallel(json_dir, table_name="raw.telegram_messages", mode="copy",
+                                   skip_unchanged=True, max_workers=4, executor="thread"):
+    """
+    Parallel variant of load_json_to_postgres.
+    Files are spread across a pool of max_workers threads or processes (executor='thread' or 'process'),
+    each worker holding its own connection. A failing file is recorded in the results
+    and does not stop the other files from loading.
+    Returns one result dict per file, as produced by load_file().
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}', expected one of {LOAD_MODES}")
+    if executor not in POOL_EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}', expected one of {tuple(POOL_EXECUTORS)}")
+
+    # DDL and the manifest read happen once, before any worker starts
+    conn = get_db_connection()
+    try:
+        ensure_raw_tables(conn, table_name)
+        manifest = _read_manifest(conn) if skip_unchanged else {}
+    finally:
+        conn.close()
+
+    json_files = find_raw_files(json_dir)
+    logging.info(
+        f"Found {len(json_files)} raw files to load from {json_dir} "
+        f"(mode={mode}, {max_workers} {executor} workers)"
+    )
+
+    results = []
+    try:
+        with POOL_EXECUTORS[executor](max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_load_file_in_worker, path, table_name, mode, manifest.get(path)): path
+                for path in json_files
+            }
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e: # e.g. a worker process died
+                    logging.error(f"Worker failed while loading {futures[future]}: {e}")
+                    results.append({"file": futures[future], "status": "failed", "rows": 0, "bytes": 0, "seconds": 0.0, "error": str(e)})
+    finally:
+        _close_worker_connections() # Process workers close theirs when the process exits
+
+    _log_summary(results)
+    _record_metrics(results)
+    return results
 
 if __name__ == "__main__":
-    json_data_path = "data/raw/telegram_messages/*/*/*.json"
-    
-    logging.info(f"Starting data load from {json_data_path} to PostgreSQL...")
-    load_json_to_postgres(json_data_path)
-    logging.info("Data load process completed.")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load scraped Telegram JSON/NDJSON/Parquet files into PostgreSQL.")
+    parser.add_argument("--pattern", default="data/raw/telegram_messages/*/*/*")
+    parser.add_argument("--mode", choices=LOAD_MODES, default="copy")
+    parser.add_argument("--reload-all", action="store_true", help="Ignore the load manifest and reload every file")
+    parser.add_argument("--workers", type=int, default=1, help="Load files in parallel with this many workers")
+    parser.add_argument("--executor", choices=tuple(POOL_EXECUTORS), default="thread")
+    args = parser.parse_args()
+
+    logging.info(f"Starting data load from {args.pattern} to PostgreSQL (mode={args.mode})...")
+    if args.workers > 1:
+        load_json_to_postgres_parallel(
+            args.pattern, mode=args.mode, skip_unchanged=not args.reload_all,
+            max_workers=args.workers, executor=args.executor
+        )
+    else:
+        load_json_to_postgres(args.pattern, mode=args.mode, skip_unchanged=not args.reload_all)
+    logging.info("Data load process completed.")
@@ -1,103 +1,232 @@
+import asyncio
 import os
+import re
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging # Import logging
-from dagster import job, op, schedule, Definitions
+from dagster import (
+    job, op, Definitions, Field, In, Nothing, DynamicOut, DynamicOutput, DailyPartitionsDefinition,
+    multiprocess_executor, build_schedule_from_partitioned_job
+)
 
 # Configure logging for Dagster
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Corrected imports for your scripts
-from scripts.scrape_telegram import scrape_channel
-from scripts.load_to_postgres import load_json_to_postgres
+from scripts.scrape_telegram import scrape_channels
+from scripts.load_to_postgres import load_json_to_postgres_parallel, get_db_connection
+from scripts.compact_to_parquet import compact_channel_day
+from scripts.config import (
+    COMPACT_RAW_TO_PARQUET, TELEGRAM_CHANNELS, PIPELINE_START_DATE, PIPELINE_MAX_CONCURRENT, LOAD_CONCURRENCY, LOAD_WORKERS,
+    YOLO_CONCURRENCY
+)
+from scripts.price_extractor import run_price_extraction
 from scripts.yolo_enrichment import run_yolo_detection_and_store # Corrected function name
+from scripts.data_version import bump_data_version
+# As a package module, like every script imports it: a bare `instrumentation` would be a second module with its own REGISTRY
+from scripts.instrumentation import record_run_metrics, span
 
 # Define constants for paths
 # These paths are relative to the /app WORKDIR in the Docker container
 RAW_DATA_BASE_DIR = "data/raw/telegram_messages"
 DBT_PROJECT_DIR = "medical_data_dbt"
-IMAGE_DATA_PATTERN = "data/raw/telegram_messages/*/*/images/*.jpg"
+STAGE_TAG = "medical_data/stage" # Op tag the executor's per-stage concurrency limits key on
+WAREHOUSE_TAG = "medical_data/warehouse" # Run tag dagster.yaml's run coordinator limits to one run at a time
 
-@op
-def scrape_op():
+# One partition per scrape day: a run processes data/raw/telegram_messages/<partition date>/ only
+daily_partitions = DailyPartitionsDefinition(start_date=PIPELINE_START_DATE)
+
+# Ops of a run execute in parallel processes; the per-channel load and YOLO ops are further capped per stage
+# (each YOLO op may itself start YOLO_WORKERS processes)
+pipeline_executor = multiprocess_executor.configured({
+    "max_concurrent": PIPELINE_MAX_CONCURRENT,
+    "tag_concurrency_limits": [
+        {"key": STAGE_TAG, "value": "load", "limit": LOAD_CONCURRENCY},
+        {"key": STAGE_TAG, "value": "yolo", "limit": YOLO_CONCURRENCY}
+    ]
+})
+
+def channel_dir(partition_key, channel):
+    """Landing directory of one channel for one partition day."""
+    return os.path.join(RAW_DATA_BASE_DIR, partition_key, channel)
+
+def is_latest_partition(time_window, now=None):
     """
-    Scrapes Telegram messages for specified channels and saves raw data to files.
+    Whether a partition is the day in progress or the one that ended less than a day ago, i.e. the
+    day the scheduled run (just after midnight) or a manual run for today is processing.
     """
-    channels = ["Chemed", "lobelia4cosmetics", "tikvahpharma"]
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    
-    logging.info(f"Starting Telegram scraping for date: {today_str}")
-    for channel in channels:
-        output_dir = os.path.join(RAW_DATA_BASE_DIR, today_str, channel)
-        logging.info(f"Scraping channel {channel} to {output_dir}")
-        scrape_channel(f"https://t.me/{channel}", output_dir)
-    logging.info("Telegram scraping completed.")
+    now = now or datetime.now(timezone.utc)
+    return time_window.end > now - timedelta(days=1)
 
-@op
-def load_to_postgres_op():
+def op_metrics(context):
     """
-    Loads scraped JSON data from files into the raw.telegram_messages PostgreSQL table.
+    Context manager collecting the metrics of an op's body (spans, rows, images, bytes, errors) and writing them
+    to meta.pipeline_run_metrics under the run id, step key (e.g. load_channel_op[Chemed]) and partition day.
+    Each op records its own, since ops run in separate processes.
     """
-    # The load_json_to_postgres function expects a glob pattern
-    input_pattern = os.path.join(RAW_DATA_BASE_DIR, "*", "*")
-    logging.info(f"Loading JSON data to PostgreSQL from pattern: {input_pattern}")
-    load_json_to_postgres(input_pattern)
-    logging.info("JSON data loading to PostgreSQL completed.")
+    step_key = context.get_step_execution_context().step.key
+    partition_key = context.partition_key if context.has_partition_key else None
+    return record_run_metrics(context.run_id, step_key, partition_key, get_db_connection)
 
-@op
-def dbt_run_op():
+@op(
+    out=DynamicOut(str),
+    config_schema={"scrape": Field(bool, default_value=True, description="Set to false to only reprocess files already on disk")}
+)
+def scrape_op(context):
     """
-    Executes dbt run to transform data in the data warehouse.
+    Scrapes Telegram messages for the configured channels into the partition's directory, then fans out
+    one downstream branch per channel that has files for that day.
+    All channels share one client and are scraped concurrently inside this op, since a Telegram session
+    cannot be opened from several processes at once; each only fetches messages newer than its checkpoint.
+    A scrape fetches everything posted up to now, so only runs of the latest partition scrape: the scheduled
+    run just after midnight files the day that just ended under that day. Backfills and runs of older days
+    skip scraping, since Telegram only serves what is new; past days are rebuilt from the files on disk.
     """
-    logging.info(f"Running dbt transformations in project: {DBT_PROJECT_DIR}")
-    # The subprocess command needs to be run from the /app directory
-    # and reference the dbt project correctly.
-    # Using cwd ensures the command is run from the correct directory.
-    result = subprocess.run(
-        ["dbt", "run"],
-        cwd=DBT_PROJECT_DIR, # Run dbt from within the medical_data_dbt directory
-        capture_output=True,
-        text=True,
-        check=False # Do not raise an exception for non-zero exit codes immediately
-    )
-    logging.info(f"dbt run stdout:\n{result.stdout}")
-    if result.stderr:
-        logging.error(f"dbt run stderr:\n{result.stderr}")
-    result.check_returncode() # Raise CalledProcessError if dbt run failed
-    logging.info("dbt transformations completed successfully.")
+    partition_key = context.partition_key
+    is_backfill = "dagster/backfill" in context.run.tags
+    if context.op_config["scrape"] and not is_backfill and is_latest_partition(context.partition_time_window):
+        logging.info(f"Starting Telegram scraping for partition: {partition_key}")
+        with op_metrics(context):
+            summary = asyncio.run(scrape_channels(
+                [f"https://t.me/{channel}" for channel in TELEGRAM_CHANNELS],
+                os.path.join(RAW_DATA_BASE_DIR, partition_key)
+            ))
+        for channel_url, result in summary.items():
+            logging.info(f"Scraped {channel_url}: {result}")
+        logging.info("Telegram scraping completed.")
+    else:
+        logging.info(f"Not scraping for partition {partition_key}; processing files already on disk.")
+
+    for channel in TELEGRAM_CHANNELS:
+        if os.path.isdir(channel_dir(partition_key, channel)):
+            # Mapping keys only allow letters, digits and underscores
+            yield DynamicOutput(channel, mapping_key=re.sub(r"[^A-Za-z0-9_]", "_", channel))
+
+@op(
+    tags={STAGE_TAG: "load"},
+    config_schema={"reload": Field(bool, default_value=False, description="Reload files even if the load manifest has them unchanged")}
+)
+def load_channel_op(context, channel: str) -> str:
+    """
+    Loads one channel's raw files (.ndjson, .parquet and legacy .json) for the partition day into raw.telegram_messages.
+    Past days are first compacted to Parquet when COMPACT_RAW_TO_PARQUET=true; the current day is left alone
+    while the scraper may still append to it. Files recorded unchanged in raw.load_manifest are skipped unless reload is set.
+    """
+    directory = channel_dir(context.partition_key, channel)
+    with op_metrics(context):
+        if COMPACT_RAW_TO_PARQUET and context.partition_key < datetime.now().strftime('%Y-%m-%d'):
+            with span("compact_channel_day", channel=channel):
+                compact_channel_day(directory)
+        logging.info(f"Loading raw data to PostgreSQL from: {directory}")
+        # Bulk COPY per file, LOAD_WORKERS files at a time; channels are loaded in parallel by the executor
+        results = load_json_to_postgres_parallel(
+            os.path.join(directory, "*"), mode="copy", skip_unchanged=not context.op_config["reload"],
+            max_workers=LOAD_WORKERS
+        )
+    failed = [r["file"] for r in results if r["status"] == "failed"]
+    if failed:
+        logging.error(f"{len(failed)} files failed to load: {failed}")
+    logging.info(f"Raw data loading for {channel} completed.")
+    return channel
+
+@op(tags={STAGE_TAG: "yolo"})
+def yolo_channel_op(context, channel: str) -> str:
+    """
+    Runs YOLO object detection on the images of the messages loaded from one channel's partition directory.
+    The backend and number of worker processes come from YOLO_BACKEND / YOLO_WORKERS in the environment.
+    """
+    # Images are found through the photo_path of loaded messages, since media-store file names are not message ids
+    source_prefix = channel_dir(context.partition_key, channel) + os.sep
+    logging.info(f"Starting YOLO enrichment for images of messages loaded from {source_prefix}")
+    with op_metrics(context):
+        run_yolo_detection_and_store(source_prefix=source_prefix)
+    logging.info(f"YOLO enrichment for {channel} completed.")
+    return channel
 
 @op
-def yolo_enrichment_op():
+def extract_prices_op(context, loaded_channels: list):
     """
-    Runs YOLO object detection on images and stores results in PostgreSQL.
+    Parses prices from the messages loaded since the previous run into raw.product_prices,
+    attributing them to products from the product dictionary. Runs once every channel is loaded.
     """
-    logging.info(f"Starting YOLO enrichment for images matching: {IMAGE_DATA_PATTERN}")
-    run_yolo_detection_and_store(IMAGE_DATA_PATTERN)
-    logging.info("YOLO enrichment completed.")
+    with op_metrics(context):
+        summary = run_price_extraction()
+    logging.info(f"Price extraction completed after loading {loaded_channels}: {summary}")
 
-@job
-def medical_data_pipeline():
+def run_dbt(*args):
+    """Runs a dbt command in DBT_PROJECT_DIR, logging its output and raising if it fails."""
+    command = ["dbt", *args]
+    logging.info(f"Running {' '.join(command)} in project: {DBT_PROJECT_DIR}")
+    with span("dbt", command=" ".join(args)):
+        # Using cwd ensures the command is run from the correct directory.
+        result = subprocess.run(
+            command,
+            cwd=DBT_PROJECT_DIR, # Run dbt from within the medical_data_dbt directory
+            capture_output=True,
+            text=True,
+            check=False # Do not raise an exception for non-zero exit codes immediately
+        )
+        logging.info(f"dbt stdout:\n{result.stdout}")
+        if result.stderr:
+            logging.error(f"dbt stderr:\n{result.stderr}")
+        result.check_returncode() # Raise CalledProcessError if dbt failed
+
+@op(
+    ins={"start": In(Nothing)},
+    config_schema={
+        "full_refresh": Field(bool, default_value=False, description="Rebuild the incremental models from scratch")
+    }
+)
+def dbt_run_op(context):
     """
-    The main data pipeline job, orchestrating scraping, loading, dbt, and YOLO enrichment.
+    Executes dbt run to transform data in the data warehouse.
+    The fact models are incremental, so a normal run only merges rows loaded since the previous one;
+    set full_refresh in the op config to rebuild them from all raw data.
     """
-    # Define dependencies using the >> operator
-    scrape_op_result = scrape_op()
-    load_op_result = load_to_postgres_op(start_after=scrape_op_result) # Explicit dependency
-    dbt_run_op_result = dbt_run_op(start_after=load_op_result) # Explicit dependency
-    yolo_enrichment_op(start_after=dbt_run_op_result) # Explicit dependency
+    args = ["run"]
+    if context.op_config["full_refresh"]:
+        args.append("--full-refresh")
+    with op_metrics(context):
+        run_dbt(*args)
+    logging.info("dbt transformations completed successfully.")
+    bump_data_version("dbt_run_op") # Invalidates API response caches
 
+@op(ins={"start": In(Nothing)})
+def refresh_detections_op(context, detected_channels: list):
+    """
+    Merges the detections of every channel into fct_image_detections and its daily rollup once both the
+    YOLO ops and the main dbt run are done, then invalidates API response caches.
+    """
+    logging.info(f"Refreshing detection models after YOLO enrichment of {detected_channels}")
+    with op_metrics(context):
+        run_dbt("run", "--select", "fct_image_detections+")
+    bump_data_version("refresh_detections_op") # Invalidates API response caches
 
-@schedule(cron_schedule="0 0 * * *", job=medical_data_pipeline, name="daily_medical_data_pipeline")
-def daily_pipeline_schedule(context):
+@job(partitions_def=daily_partitions, executor_def=pipeline_executor, tags={WAREHOUSE_TAG: "dbt"})
+def medical_data_pipeline():
     """
-    Schedules the medical_data_pipeline to run daily at midnight.
+    The main data pipeline job, orchestrating scraping, loading, dbt, and YOLO enrichment for one day.
+    Each channel's load and YOLO enrichment run as their own ops, in parallel with other channels,
+    and YOLO runs alongside price extraction and dbt; backfilling a date range runs one job per day.
+    Runs of different days share the price watermark and the dbt models, so the run coordinator in dagster.yaml
+    dequeues one run tagged WAREHOUSE_TAG at a time; a backfill runs its days one after another.
+    Every op records its timings and counts in meta.pipeline_run_metrics, keyed by run id and step.
     """
-    # You can add run configuration here if needed
-    return {}
+    channels = scrape_op()
+    loaded = channels.map(load_channel_op)
+    detected = loaded.map(yolo_channel_op)
+    prices_done = extract_prices_op(loaded.collect())
+    dbt_done = dbt_run_op(start=prices_done)
+    refresh_detections_op(detected.collect(), start=dbt_done)
+
+# Runs at midnight for the day that just ended
+daily_pipeline_schedule = build_schedule_from_partitioned_job(
+    medical_data_pipeline, hour_of_day=0, name="daily_medical_data_pipeline"
+)
 
 # Define your Dagster repository
 # This tells Dagster what jobs, schedules, etc., are available in this file.
 defs = Definitions(
     jobs=[medical_data_pipeline],
     schedules=[daily_pipeline_schedule],
-)
\ No newline at end of file
+)
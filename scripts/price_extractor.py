@@ -0,0 +1,263 @@
+from datetime import timedelta
+import functools
+import logging
+import re
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+from db_utils import copy_rows
+from scripts.instrumentation import increment, span
+from product_matcher import get_product_matcher
+
+STAGE_NAME = "price_extraction" # Row in meta.stage_watermarks
+BATCH_SIZE = 5000 # Messages parsed per DataFrame
+WATERMARK_LOOKBACK = timedelta(hours=1) # Re-reads loads that were still committing during the previous run
+MAX_PRICE = 10_000_000 # Anything larger is a phone number or an id, not a price in birr
+PRICE_COLUMNS = ("channel", "message_id", "price_index", "product_name", "price_min", "price_max", "currency_text")
+
+# Amounts: 1200, 1,200, 1200.50, or Ge'ez numerals such as ፲፪፻ (1200)
+_NUMBER = r"(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|[፩-፼]+"
+# ETB and the ways birr is written in posts; matched on case-folded text
+_CURRENCY = r"etb|birr|br\.?|ብር"
+# 1000-1200, 1000 to 1200, ከ1000 እስከ 1200 ('from ... to')
+_RANGE_SEPARATOR = r"\s*(?:-|–|to|እስከ)\s*"
+# Amounts may carry the prefix ከ ('from') or በ ('for'), written attached to the number: በ፪፻ ብር
+PRICE_PATTERN = re.compile(
+    rf"(?<![\w.,])(?:[ከበ]\s*)?(?P<low_after>{_NUMBER})(?:{_RANGE_SEPARATOR}(?P<high_after>{_NUMBER}))?\s*(?P<currency_after>{_CURRENCY})(?!\w)"
+    rf"|(?<!\w)(?P<currency_before>{_CURRENCY})\s*:?\s*(?P<low_before>{_NUMBER})(?:{_RANGE_SEPARATOR}(?P<high_before>{_NUMBER}))?(?![\w,])"
+)
+
+_GEEZ_DIGITS = {chr(0x1369 + i): i + 1 for i in range(9)} # ፩..፱
+_GEEZ_DIGITS.update({chr(0x1372 + i): (i + 1) * 10 for i in range(9)}) # ፲..፺
+_GEEZ_HUNDRED = "፻" # 100
+_GEEZ_TEN_THOUSAND = "፼" # 10000
+
+def geez_to_int(numeral):
+    """
+    Converts a Ge'ez numeral to an int, e.g. ፲፪፻፴፬ -> 1234.
+    Digits add up within a group; ፻ multiplies the group before it by 100 and ፼ everything before it by 10000.
+    """
+    total = group = current = 0
+    for char in numeral:
+        if char in _GEEZ_DIGITS:
+            current += _GEEZ_DIGITS[char]
+        elif char == _GEEZ_HUNDRED:
+            group += (current or 1) * 100
+            current = 0
+        elif char == _GEEZ_TEN_THOUSAND:
+            total = (total + group + (current or (0 if group else 1))) * 10000
+            group = current = 0
+    return total + group + current
+
+def parse_amounts(amounts):
+    """Converts a Series of matched amount strings (Arabic or Ge'ez digits, or NaN) to floats."""
+    arabic = pd.to_numeric(amounts.str.replace(",", "", regex=False), errors="coerce")
+    geez = amounts.str.match(r"[፩-፼]", na=False)
+    if geez.any():
+        # Ge'ez numerals are positional-multiplicative, so they are converted per distinct value rather than per row
+        unique_numerals = amounts[geez].unique()
+        converted = dict(zip(unique_numerals, map(geez_to_int, unique_numerals)))
+        arabic[geez] = amounts[geez].map(converted)
+    return arabic.astype(float)
+
+def _coalesce(matches, first, second):
+    """The first group where it matched, the second elsewhere (fillna would downcast an all-NaN object column)."""
+    return matches[first].where(matches[first].notna(), matches[second])
+
+def extract_prices(messages):
+    """
+    Parses every price in a DataFrame of messages (columns channel, message_id, text) in one vectorized pass.
+    Returns a DataFrame with one row per price: channel, message_id, price_index (order within the message),
+    price_min, price_max (equal unless the price is a range) and currency_text (the currency as written).
+    """
+    texts = messages["text"].fillna("").str.normalize("NFC").str.casefold()
+    matches = texts.str.extractall(PRICE_PATTERN)
+    if matches.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+
+    low = parse_amounts(_coalesce(matches, "low_after", "low_before"))
+    high = parse_amounts(_coalesce(matches, "high_after", "high_before")).fillna(low)
+    prices = pd.DataFrame({
+        "row": matches.index.get_level_values(0),
+        "price_min": low.where(high >= low, high).to_numpy(), # '1200-1000 birr' is still the range 1000..1200
+        "price_max": high.where(high >= low, low).to_numpy(),
+        "currency_text": _coalesce(matches, "currency_after", "currency_before").to_numpy()
+    })
+    prices = prices[(prices["price_min"] > 0) & (prices["price_max"] <= MAX_PRICE)]
+    prices["price_index"] = prices.groupby("row").cumcount()
+    prices["channel"] = messages["channel"].to_numpy()[prices["row"]]
+    prices["message_id"] = messages["message_id"].to_numpy()[prices["row"]]
+    return prices.reset_index(drop=True)
+
+@functools.lru_cache(maxsize=4)
+def product_pattern(matcher):
+    """
+    Regex alternation over the matcher's variants for pandas' vectorized str methods, with the same
+    whole-word rule as ProductMatcher.find: a variant must not touch a character str.isalnum accepts.
+    Longer variants come first, so overlapping variants resolve leftmost-longest as in count_mentions.
+    """
+    variants = sorted(matcher.variants, key=len, reverse=True)
+    return re.compile(rf"(?<![^\W_])(?P<variant>{'|'.join(map(re.escape, variants))})(?![^\W_])")
+
+def find_products(texts, matcher):
+    """
+    Lists the products named in a Series of texts in one vectorized pass: a DataFrame with
+    row (position in texts), product_index (order of first appearance) and product_name.
+    """
+    if not matcher.variants:
+        return pd.DataFrame(columns=["row", "product_name", "product_index"])
+    texts = texts.fillna("").str.normalize("NFC").str.casefold()
+    matches = texts.str.extractall(product_pattern(matcher))
+    products = pd.DataFrame({
+        "row": matches.index.get_level_values(0),
+        "product_name": matches["variant"].map(matcher.variants).to_numpy()
+    })
+    # A product repeated later in the message keeps its first position
+    products = products.drop_duplicates().reset_index(drop=True)
+    products["product_index"] = products.groupby("row").cumcount()
+    return products
+
+def attribute_prices(messages, prices, matcher=None):
+    """
+    Adds product_name to the prices of extract_prices: every price of a message that names one product
+    goes to that product, and when a message names as many products as it has prices (a price list),
+    they are paired in order of appearance. Other prices keep a null product_name.
+    """
+    prices = prices.copy()
+    prices["product_name"] = None
+    if prices.empty:
+        return prices
+    matcher = matcher or get_product_matcher()
+    priced_rows = prices["row"].unique()
+    products = find_products(messages["text"].iloc[priced_rows].reset_index(drop=True), matcher)
+    if products.empty:
+        return prices
+    products["row"] = priced_rows[products["row"]] # Back to positions in messages, as prices["row"]
+    product_counts = products.groupby("row")["product_name"].transform("size")
+    price_counts = prices.groupby("row")["price_index"].transform("size")
+
+    single = products[product_counts == 1][["row", "product_name"]]
+    by_row = prices[["row"]].merge(single, on="row", how="left")["product_name"]
+    paired = prices[["row", "price_index"]].assign(price_count=price_counts).merge(
+        products.assign(product_count=product_counts),
+        left_on=["row", "price_index", "price_count"], right_on=["row", "product_index", "product_count"], how="left"
+    )["product_name"]
+    # where() rather than fillna(), which would downcast; astype(object) because the result is an
+    # all-NaN float column when nothing in the batch is attributable, and None cannot be stored in it
+    product_names = by_row.where(by_row.notna(), paired).astype(object)
+    prices["product_name"] = product_names.where(product_names.notna(), None).to_numpy()
+    return prices
+
+def create_price_tables(cur):
+    """Creates raw.product_prices (one row per price found in a message) and meta.stage_watermarks."""
+    cur.execute("""
+        CREATE SCHEMA IF NOT EXISTS raw;
+        CREATE SCHEMA IF NOT EXISTS meta;
+
+        CREATE TABLE IF NOT EXISTS raw.product_prices (
+            channel VARCHAR NOT NULL,
+            message_id BIGINT NOT NULL,
+            price_index SMALLINT NOT NULL,
+            product_name VARCHAR(255),
+            price_min NUMERIC(12, 2) NOT NULL,
+            price_max NUMERIC(12, 2) NOT NULL,
+            currency_text VARCHAR(16) NOT NULL,
+            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel, message_id, price_index)
+        );
+
+        CREATE TABLE IF NOT EXISTS meta.stage_watermarks (
+            stage VARCHAR(64) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def write_prices(cur, messages, prices):
+    """
+    Replaces the stored prices of every message in the batch with the newly extracted ones,
+    so a reloaded message whose text changed drops stale prices. Does not commit.
+    """
+    execute_values(
+        cur,
+        """
+        DELETE FROM raw.product_prices pp
+        USING (VALUES %s) AS loaded (channel, message_id)
+        WHERE pp.channel = loaded.channel AND pp.message_id = loaded.message_id;
+        """,
+        list(messages[["channel", "message_id"]].itertuples(index=False, name=None)),
+        template="(%s, %s::bigint)"
+    )
+    return copy_rows(cur, "raw.product_prices", PRICE_COLUMNS, prices[list(PRICE_COLUMNS)].itertuples(index=False, name=None))
+
+def run_price_extraction(batch_size=BATCH_SIZE, full_refresh=False):
+    """
+    Extracts prices from the messages loaded since the previous run (every message with full_refresh)
+    and advances the stage watermark. Returns {"messages": n, "prices": n, "attributed": n}.
+    """
+    conn = psycopg2.connect(
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+    summary = {"messages": 0, "prices": 0, "attributed": 0}
+    try:
+        write_cur = conn.cursor()
+        create_price_tables(write_cur)
+        write_cur.execute("SELECT watermark FROM meta.stage_watermarks WHERE stage = %s;", (STAGE_NAME,))
+        row = write_cur.fetchone()
+        since = None if full_refresh or row is None else row[0] - WATERMARK_LOOKBACK
+
+        read_cur = conn.cursor(name="price_extraction") # Server-side cursor: messages are streamed, not fetched at once
+        read_cur.execute("""
+            SELECT channel, id, text, loaded_at FROM raw.telegram_messages
+            WHERE %(since)s::timestamp IS NULL OR loaded_at > %(since)s::timestamp;
+        """, {"since": since})
+        newest = None
+        while True:
+            rows = read_cur.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = pd.DataFrame(rows, columns=["channel", "message_id", "text", "loaded_at"])
+            # Prices are keyed by (channel, message_id), so rows missing either cannot be stored and are skipped
+            messages = batch.dropna(subset=["channel", "message_id"]).reset_index(drop=True)
+            messages["message_id"] = messages["message_id"].astype("int64")
+            if len(messages) < len(batch):
+                logging.warning(f"Skipped {len(batch) - len(messages)} messages without a channel or message id")
+            with span("price_batch"):
+                prices = attribute_prices(messages, extract_prices(messages))
+                write_prices(write_cur, messages, prices)
+            attributed = int(prices["product_name"].notna().sum())
+            summary["messages"] += len(messages)
+            summary["prices"] += len(prices)
+            summary["attributed"] += attributed
+            increment("price_messages_total", len(messages))
+            increment("prices_extracted_total", len(prices))
+            increment("prices_attributed_total", attributed)
+            batch_newest = batch["loaded_at"].max()
+            newest = batch_newest if newest is None or batch_newest > newest else newest
+        read_cur.close()
+
+        if newest is not None:
+            write_cur.execute("""
+                INSERT INTO meta.stage_watermarks (stage, watermark, updated_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (stage) DO UPDATE SET
+                    watermark = GREATEST(meta.stage_watermarks.watermark, EXCLUDED.watermark),
+                    updated_at = EXCLUDED.updated_at;
+            """, (STAGE_NAME, newest.to_pydatetime()))
+        write_cur.close()
+        conn.commit()
+        logging.info(f"Extracted prices: {summary}")
+        return summary
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Extract prices from loaded Telegram messages.")
+    parser.add_argument("--full-refresh", action="store_true", help="Re-extract every message, not only new ones")
+    args = parser.parse_args()
+    run_price_extraction(full_refresh=args.full_refresh)
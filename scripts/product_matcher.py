@@ -0,0 +1,182 @@
+from collections import Counter, deque
+import functools
+import json
+import logging
+import unicodedata
+
+import psycopg2
+from psycopg2.extras import execute_values
+from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, PRODUCT_DICTIONARY_PATH
+
+def normalize_text(text):
+    """Case-folds and NFC-normalizes text so English and Amharic variants match regardless of case or encoding form."""
+    return unicodedata.normalize("NFC", text).casefold()
+
+class ProductMatcher:
+    """
+    Aho-Corasick automaton over every variant in a product dictionary ({product: [variants]}).
+    One pass over a message finds all variants at once, however many products the dictionary holds.
+    Matches must start and end on a word boundary, so 'cipro' does not match inside 'ciprofloxacin'.
+    """
+
+    def __init__(self, dictionary):
+        self._goto = [{}] # state -> {char: next state}
+        self._fail = [0]
+        self._outputs = [[]] # state -> [(product, variant length)]
+        self.variants = {} # normalized variant -> product
+        for product, variants in dictionary.items():
+            for variant in variants:
+                self.variants[normalize_text(variant)] = product
+                self._add(normalize_text(variant), product)
+        self._build_failure_links()
+
+    def _add(self, variant, product):
+        state = 0
+        for char in variant:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((product, len(variant)))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find(self, text):
+        """Yields (product, start, end) for every whole-word variant occurrence in text."""
+        text = normalize_text(text)
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for product, length in self._outputs[state]:
+                start, end = index - length + 1, index + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+                    yield product, start, end
+
+    def count_mentions(self, text):
+        """
+        Returns a Counter of product -> occurrences in text. Overlapping matches are resolved
+        leftmost-longest, so 'hand sanitizer' counts once, not also as 'sanitizer'.
+        """
+        if not text:
+            return Counter()
+        counts = Counter()
+        covered_until = 0
+        for product, start, end in sorted(self.find(text), key=lambda match: (match[1], -match[2])):
+            if start >= covered_until:
+                counts[product] += 1
+                covered_until = end
+        return counts
+
+def load_product_dictionary(path=PRODUCT_DICTIONARY_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@functools.lru_cache(maxsize=1)
+def get_product_matcher(path=PRODUCT_DICTIONARY_PATH):
+    """Builds the matcher for a dictionary file once per process."""
+    dictionary = load_product_dictionary(path)
+    logging.info(f"Built product matcher for {len(dictionary)} products from {path}")
+    return ProductMatcher(dictionary)
+
+def create_product_mentions_table(cur):
+    """Creates raw.product_mentions: one row per product mentioned in a message."""
+    cur.execute("""
+        CREATE SCHEMA IF NOT EXISTS raw;
+
+        CREATE TABLE IF NOT EXISTS raw.product_mentions (
+            channel VARCHAR NOT NULL,
+            message_id BIGINT NOT NULL,
+            product_name VARCHAR(255) NOT NULL,
+            mention_count INTEGER NOT NULL,
+            extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel, message_id, product_name)
+        );
+    """)
+
+def write_product_mentions(cur, messages, matcher=None):
+    """
+    Extracts product mentions from (channel, message_id, text) tuples and replaces the stored
+    mentions of those messages, so a reloaded message whose text changed drops stale products.
+    Does not commit. Returns the number of mention rows written.
+    """
+    matcher = matcher or get_product_matcher()
+    latest_text = {} # The last copy of a message in the batch wins, as it does for the message upsert
+    for channel, message_id, text in messages:
+        if channel is not None and message_id is not None:
+            latest_text[(channel, message_id)] = text
+    if not latest_text:
+        return 0
+    rows = [
+        (channel, message_id, product, count)
+        for (channel, message_id), text in latest_text.items()
+        for product, count in matcher.count_mentions(text).items()
+    ]
+
+    execute_values(
+        cur,
+        """
+        DELETE FROM raw.product_mentions pm
+        USING (VALUES %s) AS loaded (channel, message_id)
+        WHERE pm.channel = loaded.channel AND pm.message_id = loaded.message_id;
+        """,
+        list(latest_text),
+        template="(%s, %s::bigint)"
+    )
+    execute_values(
+        cur,
+        """
+        INSERT INTO raw.product_mentions (channel, message_id, product_name, mention_count)
+        VALUES %s
+        ON CONFLICT (channel, message_id, product_name) DO UPDATE SET
+            mention_count = EXCLUDED.mention_count,
+            extracted_at = CURRENT_TIMESTAMP;
+        """,
+        rows
+    )
+    return len(rows)
+
+def backfill_product_mentions(batch_size=5000):
+    """
+    Runs the matcher over every message already in raw.telegram_messages, e.g. after the
+    dictionary changes. New messages are matched by the loader as they arrive.
+    """
+    conn = psycopg2.connect(
+        dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
+    )
+    try:
+        write_cur = conn.cursor()
+        create_product_mentions_table(write_cur)
+        read_cur = conn.cursor(name="product_mentions_backfill") # Server-side cursor: messages are streamed, not fetched at once
+        read_cur.execute("SELECT channel, id, text FROM raw.telegram_messages;")
+        total = 0
+        while True:
+            messages = read_cur.fetchmany(batch_size)
+            if not messages:
+                break
+            total += write_product_mentions(write_cur, messages)
+        read_cur.close()
+        write_cur.close()
+        conn.commit()
+        logging.info(f"Backfilled {total} product mentions")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    backfill_product_mentions()
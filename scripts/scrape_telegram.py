@@ -1,19 +1,121 @@
-from telethon.sync import TelegramClient
-from telethon.tl.types import InputMessagesFilterPhotos
+from telethon import TelegramClient
+import asyncio
 import json
 import os
 from datetime import datetime
-from config import TELEGRAM_API_ID, TELEGRAM_API_HASH
+from config import TELEGRAM_API_ID, TELEGRAM_API_HASH, MEDIA_SIZE_VARIANT
+from scripts.instrumentation import increment, span
+import glob
+import hashlib
 import logging
 
 logging.basicConfig(filename='scrape.log', level=logging.INFO)
 
-async def scrape_channel(channel_url, output_dir):
-    async with TelegramClient('session', TELEGRAM_API_ID, TELEGRAM_API_HASH) as client:
-        channel = await client.get_entity(channel_url)
-        os.makedirs(output_dir, exist_ok=True)
-        messages = []
-        async for message in client.iter_messages(channel, limit=100):
+SESSION_NAME = 'session'
+CHECKPOINT_DIR = "data/raw/checkpoints" # One <channel>.json per channel holding the last scraped message id
+INITIAL_LIMIT = 100 # Messages fetched for a channel that has no checkpoint yet
+CHANNEL_CONCURRENCY = 3 # Channels scraped at the same time
+MEDIA_CONCURRENCY = 4 # Photos downloaded at the same time, across all channels
+MEDIA_STORE_DIR = "data/raw/media" # Content-addressed photo store shared by all days and channels
+MEDIA_SIZE_VARIANTS = ("full", "thumb")
+THUMB_SIZE_TYPES = ("x", "m") # Telegram photo sizes tried for the thumb variant: 800px box, then 320px box
+
+def channel_name_from_url(channel_url):
+    """'https://t.me/Chemed' -> 'Chemed'"""
+    return channel_url.rstrip('/').split('/')[-1]
+
+def load_checkpoint(checkpoint_dir, channel_name):
+    """Returns the highest message id scraped so far for a channel, or 0 if it was never scraped."""
+    checkpoint_path = os.path.join(checkpoint_dir, f"{channel_name}.json")
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, 'r') as f:
+        return json.load(f).get("min_id", 0)
+
+def save_checkpoint(checkpoint_dir, channel_name, min_id):
+    """Records min_id for the next run; written to a temp file first so a crash never leaves a partial checkpoint."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(checkpoint_dir, f"{channel_name}.json")
+    with open(f"{checkpoint_path}.tmp", 'w') as f:
+        json.dump({"min_id": min_id, "updated_at": datetime.now().isoformat()}, f)
+    os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+
+def media_store_path(photo_id, variant, media_store_dir=MEDIA_STORE_DIR):
+    """
+    Path of a photo in the content-addressed media store: a hash of Telegram's photo id and the size
+    variant, fanned out over 256 subdirectories. The same photo reposted anywhere maps to the same file.
+    """
+    digest = hashlib.sha256(f"photo:{photo_id}:{variant}".encode()).hexdigest()
+    return os.path.join(media_store_dir, digest[:2], f"{digest}.jpg")
+
+def select_photo_size(photo, variant):
+    """Returns the photo size to download for a variant, or None for Telegram's default (the largest)."""
+    if variant == "full":
+        return None
+    sizes = {getattr(size, "type", None): size for size in getattr(photo, "sizes", None) or []}
+    for size_type in THUMB_SIZE_TYPES:
+        if size_type in sizes:
+            return sizes[size_type]
+    return None
+
+def _remove_partial_downloads(partial_path):
+    """Deletes partial_path and any variant of it Telethon wrote with an extension appended."""
+    for path in glob.glob(glob.escape(partial_path) + "*"):
+        os.remove(path)
+
+async def _media_worker(media_queue, failed_media):
+    """
+    Downloads queued (channel_name, message, photo_path, thumb) items until cancelled.
+    The ids of messages whose photo failed to download are added to failed_media[channel_name].
+    """
+    while True:
+        channel_name, message, photo_path, thumb = await media_queue.get()
+        # Download next to the final path and rename, so a half-written file never counts as present
+        partial_path = f"{photo_path}.{message.id}.part"
+        try:
+            os.makedirs(os.path.dirname(photo_path), exist_ok=True)
+            _remove_partial_downloads(partial_path) # Left behind by a run that crashed mid-download
+            if thumb is None:
+                downloaded_path = await message.download_media(file=partial_path)
+            else:
+                downloaded_path = await message.download_media(file=partial_path, thumb=thumb)
+            if downloaded_path is None:
+                raise ValueError("the message has no downloadable photo")
+            # Telethon returns the path it actually wrote, which may carry an extension it added
+            os.replace(downloaded_path, photo_path)
+            increment("scrape_media_downloads_total")
+            increment("scrape_media_bytes_total", os.path.getsize(photo_path))
+        except Exception as e:
+            logging.error(f"Error downloading photo for message {message.id} to {photo_path}: {e}")
+            increment("scrape_media_errors_total")
+            failed_media.setdefault(channel_name, set()).add(message.id)
+            _remove_partial_downloads(partial_path)
+        finally:
+            media_queue.task_done()
+
+async def scrape_channel_messages(client, channel_url, output_dir, media_queue, checkpoint_dir=CHECKPOINT_DIR, initial_limit=INITIAL_LIMIT,
+                                  media_store_dir=MEDIA_STORE_DIR, media_variant=MEDIA_SIZE_VARIANT, queued_media=None):
+    """
+    Fetches the messages of one channel posted after its checkpoint and appends them, one JSON object per line,
+    to the channel's NDJSON file for the day in output_dir as they arrive.
+    Photos are referenced by their path in the content-addressed media store and only handed to media_queue
+    when that object is neither on disk nor already queued (queued_media, shared across channels).
+    The queue is bounded, so a slow download backlog also slows down message fetching.
+    Returns (channel_name, newest message id seen, number of messages written).
+    """
+    channel = await client.get_entity(channel_url)
+    min_id = load_checkpoint(checkpoint_dir, channel.username)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = f"{output_dir}/{channel.username}_{datetime.now().strftime('%Y-%m-%d')}.ndjson"
+
+    # With a checkpoint, fetch everything newer than it; a channel's first run is capped at initial_limit
+    fetch_kwargs = {"min_id": min_id, "limit": None} if min_id else {"limit": initial_limit}
+    message_count = 0
+    max_id = min_id
+    output_file = None
+    queued_media = set() if queued_media is None else queued_media
+    try:
+        async for message in client.iter_messages(channel, **fetch_kwargs):
             msg_data = {
                 "id": message.id,
                 "date": message.date.isoformat(),
@@ -21,18 +123,100 @@ async def scrape_channel(channel_url, output_dir):
                 "has_image": message.photo is not None
             }
             if message.photo:
-                photo_path = f"{output_dir}/images/{message.id}.jpg"
-                os.makedirs(f"{output_dir}/images", exist_ok=True)
-                await message.download_media(file=photo_path)
+                photo_path = media_store_path(message.photo.id, media_variant, media_store_dir)
+                if photo_path not in queued_media and not os.path.exists(photo_path):
+                    queued_media.add(photo_path)
+                    await media_queue.put((channel.username, message, photo_path, select_photo_size(message.photo, media_variant)))
                 msg_data["photo_path"] = photo_path
-            messages.append(msg_data)
-        output_path = f"{output_dir}/{channel.username}_{datetime.now().strftime('%Y-%m-%d')}.json"
-        with open(output_path, 'w') as f:
-            json.dump(messages, f, indent=2)
-        logging.info(f"Scraped {channel.username} at {datetime.now()}")
+            if output_file is None: # Only create the file once there is something to write
+                output_file = open(output_path, 'a', encoding='utf-8')
+            output_file.write(json.dumps(msg_data, ensure_ascii=False) + "\n")
+            message_count += 1
+            max_id = max(max_id, message.id)
+    finally:
+        if output_file:
+            output_file.close()
+    increment("scrape_messages_total", message_count, channel=channel.username)
+    logging.info(f"Scraped {message_count} new messages from {channel.username} (after id {min_id}) at {datetime.now()}")
+    return channel.username, max_id, message_count
+
+async def _scrape_with_client(client, channel_urls, base_output_dir, checkpoint_dir, initial_limit, channel_concurrency, media_concurrency,
+                              media_store_dir, media_variant):
+    if media_variant not in MEDIA_SIZE_VARIANTS:
+        raise ValueError(f"Unknown media size variant '{media_variant}', expected one of {MEDIA_SIZE_VARIANTS}")
+    media_queue = asyncio.Queue(maxsize=media_concurrency * 4)
+    queued_media = set() # Store paths already queued this run, so a photo reposted in several channels downloads once
+    failed_media = {} # {channel name: ids of messages whose photo failed to download}
+    workers = [asyncio.create_task(_media_worker(media_queue, failed_media)) for _ in range(media_concurrency)]
+    semaphore = asyncio.Semaphore(channel_concurrency)
+
+    async def scrape_one(channel_url):
+        async with semaphore:
+            channel_name = channel_name_from_url(channel_url)
+            output_dir = os.path.join(base_output_dir, channel_name)
+            with span("scrape_channel", channel=channel_name): # A failed channel also counts in scrape_channel_errors_total
+                return await scrape_channel_messages(
+                    client, channel_url, output_dir, media_queue, checkpoint_dir, initial_limit,
+                    media_store_dir, media_variant, queued_media
+                )
+
+    try:
+        results = await asyncio.gather(*(scrape_one(url) for url in channel_urls), return_exceptions=True)
+        await media_queue.join() # Checkpoints only move once every queued photo has been handled
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    summary = {}
+    for channel_url, result in zip(channel_urls, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error scraping {channel_url}: {result}")
+            summary[channel_url] = {"error": str(result)}
+            continue
+        channel_name, max_id, message_count = result
+        failed_ids = failed_media.get(channel_name)
+        if failed_ids:
+            # Stop just below the first message whose photo is missing, so the next run fetches it again and retries
+            # the download; messages after it are re-fetched too, which the loader's upsert absorbs
+            max_id = min(failed_ids) - 1
+            logging.warning(f"{len(failed_ids)} photos of {channel_name} failed to download; holding its checkpoint at {max_id}")
+        if message_count:
+            save_checkpoint(checkpoint_dir, channel_name, max_id)
+        summary[channel_url] = {"messages": message_count, "min_id": max_id, "failed_media": len(failed_ids or ())}
+    return summary
+
+async def scrape_channels(channel_urls, base_output_dir, client=None, checkpoint_dir=CHECKPOINT_DIR, initial_limit=INITIAL_LIMIT,
+                          channel_concurrency=CHANNEL_CONCURRENCY, media_concurrency=MEDIA_CONCURRENCY,
+                          media_store_dir=MEDIA_STORE_DIR, media_variant=MEDIA_SIZE_VARIANT):
+    """
+    Scrapes several channels concurrently over a single Telegram client.
+    Each channel is written to base_output_dir/<channel name>/, only messages newer than the
+    channel's checkpoint are fetched, and photos go through a shared pool of media_concurrency downloaders
+    into the content-addressed store at media_store_dir ('full' size, or a smaller 'thumb' for media_variant).
+    A channel that fails is logged and reported without affecting the others.
+
+    client defaults to a TelegramClient on SESSION_NAME. Any object with the same async surface can be
+    passed instead (get_entity(url) returning an object with .username, and iter_messages(entity, limit=, min_id=)
+    yielding messages with id, date, text, photo (with .id) and an async download_media(file=, thumb=) returning the
+    path written), e.g. an in-process fake.
+    A channel's checkpoint only moves past messages whose photos were stored; a failed download is retried next run.
+    Returns {channel_url: {"messages": n, "min_id": id, "failed_media": n} or {"error": message}}.
+    """
+    args = (channel_urls, base_output_dir, checkpoint_dir, initial_limit, channel_concurrency, media_concurrency,
+            media_store_dir, media_variant)
+    if client is not None:
+        return await _scrape_with_client(client, *args)
+    async with TelegramClient(SESSION_NAME, TELEGRAM_API_ID, TELEGRAM_API_HASH) as client:
+        return await _scrape_with_client(client, *args)
+
+async def scrape_channel(channel_url, output_dir):
+    """Scrapes a single channel into output_dir; kept for callers of the original one-channel API."""
+    return await scrape_channels([channel_url], os.path.dirname(output_dir.rstrip('/')))
 
 if __name__ == "__main__":
-    import asyncio
     channels = ["Chemed", "lobelia4cosmetics", "tikvahpharma"]
-    for channel in channels:
-        asyncio.run(scrape_channel(f"https://t.me/{channel}", f"data/raw/telegram_messages/{datetime.now().strftime('%Y-%m-%d')}/{channel}"))
\ No newline at end of file
+    asyncio.run(scrape_channels(
+        [f"https://t.me/{channel}" for channel in channels],
+        f"data/raw/telegram_messages/{datetime.now().strftime('%Y-%m-%d')}"
+    ))
@@ -1,15 +1,39 @@
 import os
 import json
+import time
 import psycopg2
-from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
-from ultralytics import YOLO
+from psycopg2.extras import execute_values
+from config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, YOLO_BACKEND, YOLO_INT8, YOLO_WORKERS
+from db_utils import copy_rows
+from scripts.instrumentation import REGISTRY, increment, span
+import cv2
+import numpy as np
 import logging
 import glob
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime # For parsing date from path if needed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='yolo_enrichment.log')
 
+# Batched inference settings
+BATCH_SIZE = 16 # Images per model call
+DECODE_WORKERS = 4 # Threads decoding and resizing images ahead of the model
+PREFETCH_BATCHES = 2 # How many batches the decoders may run ahead
+IMAGE_SIZE = 640 # Inference size; images are downsized to this before batching
+
+MODEL_WEIGHTS = 'yolov8n.pt' # 'yolov8n.pt' is the nano model, good for quick testing
+BACKENDS = ("torch", "onnx", "openvino") # PyTorch weights, or a CPU-optimized export of them
+
+# Column order of the rows store_detections() writes to raw.yolo_detections
+DETECTION_COLUMNS = (
+    "message_id", "image_path", "model_version", "box_index",
+    "detected_class", "confidence", "x1", "y1", "x2", "y2"
+)
+LEGACY_MODEL_VERSION = "legacy" # Recorded for detections stored before model versions were tracked
+
 def get_db_connection():
     """Establishes and returns a PostgreSQL database connection."""
     try:
@@ -23,7 +47,11 @@ def get_db_connection():
         raise
 
 def create_raw_detections_table(conn):
-    """Creates the raw.yolo_detections table if it doesn't exist."""
+    """
+    Creates the raw.yolo_detections table if it doesn't exist, migrating the old JSONB layout if needed.
+    Each row is one box, keyed by (message_id, image_path, model_version, box_index) so reruns upsert
+    instead of duplicating, with the box stored as four REAL columns.
+    """
     cur = conn.cursor()
     try:
         cur.execute("""
@@ -33,13 +61,25 @@ def create_raw_detections_table(conn):
                 detection_id SERIAL PRIMARY KEY,
                 message_id BIGINT NOT NULL,
                 image_path VARCHAR(512) NOT NULL,
+                model_version VARCHAR(128) NOT NULL,
+                box_index SMALLINT NOT NULL,
                 detected_class VARCHAR(255) NOT NULL,
                 confidence REAL NOT NULL,
-                bbox_xyxy JSONB,
+                x1 REAL NOT NULL,
+                y1 REAL NOT NULL,
+                x2 REAL NOT NULL,
+                y2 REAL NOT NULL,
                 detection_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
+        """)
+        migrate_legacy_detections(cur)
+        cur.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS yolo_detections_natural_key
+                ON raw.yolo_detections (message_id, image_path, model_version, box_index);
             CREATE INDEX IF NOT EXISTS idx_yolo_detections_message_id ON raw.yolo_detections (message_id);
             CREATE INDEX IF NOT EXISTS idx_yolo_detections_image_path ON raw.yolo_detections (image_path);
+            -- Watermark for the incremental fct_image_detections model
+            CREATE INDEX IF NOT EXISTS idx_yolo_detections_timestamp ON raw.yolo_detections (detection_timestamp);
         """)
         conn.commit()
         logging.info("raw.yolo_detections table ensured to exist.")
@@ -50,6 +90,254 @@ def create_raw_detections_table(conn):
     finally:
         cur.close()
 
+def migrate_legacy_detections(cur):
+    """
+    Converts a raw.yolo_detections table still using the bbox_xyxy JSONB column to the current layout.
+    Rows without a usable box (NULL, or not an array of four numbers) and exact duplicate rows left by
+    earlier reruns are dropped, the rest are numbered per image and tagged with LEGACY_MODEL_VERSION
+    since the model that produced them was not recorded. store_detections() later replaces them.
+    """
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'raw' AND table_name = 'yolo_detections' AND column_name = 'bbox_xyxy';
+    """)
+    if cur.fetchone() is None:
+        return
+
+    logging.info("Migrating raw.yolo_detections from JSONB boxes to REAL columns...")
+    # CASE, not OR: jsonb_array_length() raises on anything but an array
+    cur.execute("""
+        DELETE FROM raw.yolo_detections
+        WHERE CASE
+            WHEN jsonb_typeof(bbox_xyxy) = 'array' THEN
+                jsonb_array_length(bbox_xyxy) <> 4
+                OR EXISTS (SELECT 1 FROM jsonb_array_elements(bbox_xyxy) AS e (value) WHERE jsonb_typeof(e.value) <> 'number')
+            ELSE TRUE
+        END;
+    """)
+    if cur.rowcount:
+        logging.warning(f"Dropped {cur.rowcount} legacy detections without a usable bbox_xyxy")
+    cur.execute("""
+        DELETE FROM raw.yolo_detections a
+        USING raw.yolo_detections b
+        WHERE a.message_id = b.message_id
+          AND a.image_path = b.image_path
+          AND a.detected_class = b.detected_class
+          AND a.confidence = b.confidence
+          AND a.bbox_xyxy = b.bbox_xyxy
+          AND a.detection_id > b.detection_id;
+
+        ALTER TABLE raw.yolo_detections
+            ADD COLUMN IF NOT EXISTS model_version VARCHAR(128),
+            ADD COLUMN IF NOT EXISTS box_index SMALLINT,
+            ADD COLUMN IF NOT EXISTS x1 REAL,
+            ADD COLUMN IF NOT EXISTS y1 REAL,
+            ADD COLUMN IF NOT EXISTS x2 REAL,
+            ADD COLUMN IF NOT EXISTS y2 REAL;
+
+        UPDATE raw.yolo_detections d
+        SET model_version = %s,
+            box_index = numbered.box_index,
+            x1 = (d.bbox_xyxy->>0)::real,
+            y1 = (d.bbox_xyxy->>1)::real,
+            x2 = (d.bbox_xyxy->>2)::real,
+            y2 = (d.bbox_xyxy->>3)::real
+        FROM (
+            SELECT detection_id,
+                   ROW_NUMBER() OVER (PARTITION BY message_id, image_path ORDER BY detection_id) - 1 AS box_index
+            FROM raw.yolo_detections
+        ) numbered
+        WHERE d.detection_id = numbered.detection_id;
+
+        ALTER TABLE raw.yolo_detections
+            ALTER COLUMN model_version SET NOT NULL,
+            ALTER COLUMN box_index SET NOT NULL,
+            ALTER COLUMN x1 SET NOT NULL,
+            ALTER COLUMN y1 SET NOT NULL,
+            ALTER COLUMN x2 SET NOT NULL,
+            ALTER COLUMN y2 SET NOT NULL,
+            DROP COLUMN bbox_xyxy;
+    """, (LEGACY_MODEL_VERSION,))
+
+def create_detection_cache_tables(conn):
+    """
+    Creates the tables that let enrichment skip work it has already done:
+    raw.yolo_detection_cache holds detections per (image content hash, model version), shared by reposted images;
+    raw.yolo_processed_images records every (message, image path) already enriched with a model version.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE SCHEMA IF NOT EXISTS raw;
+
+            CREATE TABLE IF NOT EXISTS raw.yolo_detection_cache (
+                content_hash CHAR(64) NOT NULL,
+                model_version VARCHAR(128) NOT NULL,
+                detections JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, model_version)
+            );
+
+            CREATE TABLE IF NOT EXISTS raw.yolo_processed_images (
+                image_path VARCHAR(512) NOT NULL,
+                model_version VARCHAR(128) NOT NULL,
+                message_id BIGINT NOT NULL,
+                content_hash CHAR(64) NOT NULL,
+                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            -- Media-store paths are shared by every message reposting the same photo, so the key includes message_id
+            ALTER TABLE raw.yolo_processed_images DROP CONSTRAINT IF EXISTS yolo_processed_images_pkey;
+            CREATE UNIQUE INDEX IF NOT EXISTS yolo_processed_images_key
+                ON raw.yolo_processed_images (message_id, image_path, model_version);
+        """)
+        conn.commit()
+        logging.info("YOLO detection cache tables ensured to exist.")
+    except psycopg2.Error as e:
+        logging.error(f"Error creating YOLO detection cache tables: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_model_version(weights_path=MODEL_WEIGHTS, backend="torch", int8=False):
+    """
+    Identifies the model for cache keys: the weights file name plus a prefix of its content hash,
+    so swapping in different weights under the same name invalidates cached detections.
+    Exported backends get their own suffix since their detections can differ slightly from PyTorch's.
+    """
+    if os.path.exists(weights_path):
+        version = f"{os.path.basename(weights_path)}@{hash_file(weights_path)[:12]}"
+    else:
+        version = os.path.basename(weights_path)
+    if backend != "torch":
+        version += f"/{backend}{'-int8' if int8 else ''}"
+    return version
+
+def load_model(model_path):
+    """Loads YOLO weights or an exported model for detection."""
+    from ultralytics import YOLO # Only needed to run the model; planning, batching and storage work without it
+
+    return YOLO(model_path, task="detect")
+
+def prepare_model(backend="torch", int8=False, weights_path=MODEL_WEIGHTS, imgsz=IMAGE_SIZE):
+    """
+    Makes sure the model files for a backend exist and returns the path YOLO() should load.
+    The PyTorch weights are downloaded on first use; ONNX and OpenVINO models are exported
+    from them once and reused on later runs.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown YOLO backend '{backend}', expected one of {BACKENDS}")
+    if int8 and backend != "openvino":
+        raise ValueError("INT8 quantization is only supported for the openvino backend")
+
+    from ultralytics import YOLO
+
+    if not os.path.exists(weights_path):
+        YOLO(weights_path) # Downloads the weights
+    if backend == "torch":
+        return weights_path
+
+    stem = os.path.splitext(weights_path)[0]
+    if backend == "onnx":
+        export_path = f"{stem}.onnx"
+    else:
+        export_path = f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    if not os.path.exists(export_path):
+        logging.info(f"Exporting {weights_path} to {backend}{' (INT8)' if int8 else ''}...")
+        # dynamic=True keeps the batch dimension free so batched inference works on the export
+        export_path = YOLO(weights_path).export(format=backend, imgsz=imgsz, dynamic=True, int8=int8)
+    return export_path
+
+def get_processed_images(cur, model_version):
+    """Returns the set of (message_id, image_path) pairs already enriched with model_version."""
+    cur.execute("SELECT message_id, image_path FROM raw.yolo_processed_images WHERE model_version = %s;", (model_version,))
+    return {(row[0], row[1]) for row in cur.fetchall()}
+
+def get_cached_detections(cur, content_hashes, model_version):
+    """Returns {content_hash: detections} for the hashes that already have cached results."""
+    if not content_hashes:
+        return {}
+    cur.execute(
+        "SELECT content_hash, detections FROM raw.yolo_detection_cache WHERE model_version = %s AND content_hash = ANY(%s);",
+        (model_version, list(content_hashes))
+    )
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+def cache_detections(cur, entries, model_version):
+    """Stores detections for a list of (content_hash, detections) pairs."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO raw.yolo_detection_cache (content_hash, model_version, detections)
+        VALUES %s
+        ON CONFLICT (content_hash, model_version) DO NOTHING;
+        """,
+        [(content_hash, model_version, json.dumps(detections)) for content_hash, detections in entries],
+        template="(%s, %s, %s::jsonb)"
+    )
+
+def store_detections(cur, entries, model_version):
+    """
+    Writes detections for a list of (message_id, image_path, content_hash, detections) entries
+    and marks each image as processed with model_version. Does not commit.
+    The boxes are streamed with one COPY into a temp table and upserted on the table's natural key,
+    so storing the same image twice leaves a single set of rows. Migrated detections of the same
+    images (LEGACY_MODEL_VERSION) are deleted, so an image is never counted under both versions.
+    """
+    rows = [
+        (message_id, image_path, model_version, box_index, d["detected_class"], d["confidence"], *d["bbox_xyxy"])
+        for message_id, image_path, _, detections in entries
+        for box_index, d in enumerate(detections)
+    ]
+    if rows:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS _stage_yolo_detections (LIKE raw.yolo_detections INCLUDING DEFAULTS);")
+        copy_rows(cur, "_stage_yolo_detections", DETECTION_COLUMNS, rows)
+        columns = ", ".join(DETECTION_COLUMNS)
+        cur.execute(f"""
+            INSERT INTO raw.yolo_detections ({columns})
+            SELECT {columns} FROM _stage_yolo_detections
+            ON CONFLICT (message_id, image_path, model_version, box_index) DO UPDATE SET
+                detected_class = EXCLUDED.detected_class,
+                confidence = EXCLUDED.confidence,
+                x1 = EXCLUDED.x1,
+                y1 = EXCLUDED.y1,
+                x2 = EXCLUDED.x2,
+                y2 = EXCLUDED.y2,
+                detection_timestamp = CURRENT_TIMESTAMP;
+            TRUNCATE _stage_yolo_detections;
+        """)
+    execute_values(
+        cur,
+        """
+        INSERT INTO raw.yolo_processed_images (image_path, model_version, message_id, content_hash)
+        VALUES %s
+        ON CONFLICT (message_id, image_path, model_version) DO NOTHING;
+        """,
+        [(image_path, model_version, message_id, content_hash) for message_id, image_path, content_hash, _ in entries]
+    )
+    if entries and model_version != LEGACY_MODEL_VERSION:
+        execute_values(
+            cur,
+            """
+            DELETE FROM raw.yolo_detections d
+            USING (VALUES %s) AS superseded (message_id, image_path, model_version)
+            WHERE d.message_id = superseded.message_id
+              AND d.image_path = superseded.image_path
+              AND d.model_version = superseded.model_version;
+            """,
+            list({(message_id, image_path, LEGACY_MODEL_VERSION) for message_id, image_path, _, _ in entries}),
+            template="(%s::bigint, %s, %s)"
+        )
+    return len(rows)
+
 def get_image_paths(base_image_dir="data/raw/telegram_messages/*/*/images/*.jpg"):
     """
     Collects all image paths based on a glob pattern.
@@ -59,6 +347,37 @@ def get_image_paths(base_image_dir="data/raw/telegram_messages/*/*/images/*.jpg"
     logging.info(f"Found {len(image_files)} image files to process from {base_image_dir}")
     return image_files
 
+def get_image_jobs_from_messages(conn, source_prefix=None):
+    """
+    Collects (message_id, image_path) pairs from the photo references in raw.telegram_messages.
+    This covers both the content-addressed media store, where file names are hashes rather than
+    message ids, and images under the older per-day directories. Missing files are skipped.
+    With source_prefix, only messages loaded from raw files under that path (e.g. one day/channel directory) are used.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT DISTINCT id, photo_path
+            FROM raw.telegram_messages
+            WHERE has_image AND photo_path IS NOT NULL AND id IS NOT NULL
+              AND (%(source_prefix)s::text IS NULL OR starts_with(source_file, %(source_prefix)s::text));
+        """, {"source_prefix": source_prefix})
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    image_jobs = [(message_id, image_path) for message_id, image_path in rows if os.path.exists(image_path)]
+    logging.info(f"Found {len(image_jobs)} images referenced by raw.telegram_messages ({len(rows) - len(image_jobs)} missing on disk)")
+    return image_jobs
+
+def get_image_jobs_from_pattern(image_paths_pattern):
+    """Collects (message_id, image_path) pairs from a glob of <message_id>.jpg files."""
+    image_jobs = []
+    for image_path in get_image_paths(image_paths_pattern):
+        message_id = extract_message_id_from_path(image_path)
+        if message_id is not None: # Skip if message_id cannot be extracted
+            image_jobs.append((message_id, image_path))
+    return image_jobs
+
 def extract_message_id_from_path(image_path):
     """
     Extracts the message_id from the image path (e.g., '12345.jpg' -> 12345).
@@ -70,72 +389,285 @@ def extract_message_id_from_path(image_path):
         logging.warning(f"Could not extract message_id from image path '{image_path}': {e}")
         return None
 
-def run_yolo_detection_and_store(image_paths_pattern):
+def load_image(image_path, imgsz=IMAGE_SIZE):
+    """
+    Decodes an image and downsizes it so its longest side is at most imgsz.
+    Returns (image, scale) where scale maps coordinates on the returned image back to the original.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Could not decode image '{image_path}'")
+    height, width = image.shape[:2]
+    scale = imgsz / max(height, width)
+    if scale >= 1:
+        return image, 1.0
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+def iter_image_batches(image_jobs, batch_size=BATCH_SIZE, decode_workers=DECODE_WORKERS, imgsz=IMAGE_SIZE):
+    """
+    Takes (key, image_path) jobs and yields batches of (key, image_path, image, scale) tuples.
+    Images are decoded and resized in a background thread pool that stays
+    PREFETCH_BATCHES batches ahead of the consumer, so decoding overlaps with inference.
+    Images that fail to decode are logged and left out of their batch.
+    """
+    jobs = iter(image_jobs)
+    window = deque()
+    with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+        def submit_next():
+            job = next(jobs, None)
+            if job is None:
+                return
+            window.append((job, pool.submit(load_image, job[1], imgsz)))
+
+        for _ in range(batch_size * (PREFETCH_BATCHES + 1)):
+            submit_next()
+
+        batch = []
+        while window:
+            (key, image_path), future = window.popleft()
+            submit_next()
+            try:
+                image, scale = future.result()
+            except Exception as e:
+                logging.error(f"Error decoding image {image_path}: {e}")
+                increment("yolo_decode_errors_total")
+                continue
+            batch.append((key, image_path, image, scale))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def extract_detections(result, scale):
+    """
+    Pulls all boxes of one result out as arrays in a single device-to-host copy each.
+    Returns (xyxy, class_ids, confidences); xyxy is in original image coordinates.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    xyxy = boxes.xyxy.cpu().numpy() / scale
+    class_ids = boxes.cls.cpu().numpy().astype(np.int64)
+    confidences = boxes.conf.cpu().numpy()
+    return xyxy, class_ids, confidences
+
+def detections_from_result(result, scale, names):
+    """Converts one result into a list of {detected_class, confidence, bbox_xyxy} dicts."""
+    xyxy, class_ids, confidences = extract_detections(result, scale)
+    return [
+        {"detected_class": names[class_id], "confidence": confidence, "bbox_xyxy": bbox_xyxy}
+        for bbox_xyxy, class_id, confidence in zip(xyxy.tolist(), class_ids.tolist(), confidences.tolist())
+    ]
+
+def plan_detection_jobs(conn, candidate_jobs, model_version, decode_workers=DECODE_WORKERS):
+    """
+    Works out which of the (message_id, image_path) candidate_jobs still need inference with model_version.
+    Already processed images are skipped, and images whose content hash is cached get the cached
+    detections stored (and committed) straight away.
+    Returns {content_hash: [(message_id, image_path), ...]} for the images left to detect.
+    """
+    cur = conn.cursor()
+    try:
+        processed = get_processed_images(cur, model_version)
+        image_jobs = [job for job in candidate_jobs if job not in processed]
+        logging.info(f"{len(candidate_jobs) - len(image_jobs)} images already processed with {model_version}, {len(image_jobs)} new")
+        if not image_jobs:
+            return {}
+
+        # Group new images by content so each distinct image is detected at most once
+        with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+            content_hashes = list(pool.map(hash_file, [image_path for _, image_path in image_jobs]))
+        jobs_by_hash = {}
+        for (message_id, image_path), content_hash in zip(image_jobs, content_hashes):
+            jobs_by_hash.setdefault(content_hash, []).append((message_id, image_path))
+
+        cached = get_cached_detections(cur, jobs_by_hash.keys(), model_version)
+        if cached:
+            entries = [
+                (message_id, image_path, content_hash, cached[content_hash])
+                for content_hash in cached
+                for message_id, image_path in jobs_by_hash.pop(content_hash)
+            ]
+            detection_count = store_detections(cur, entries, model_version)
+            conn.commit()
+            increment("yolo_images_total", len(entries), source="cache")
+            increment("yolo_detections_total", detection_count, source="cache")
+            logging.info(f"Reused cached detections for {len(entries)} images")
+        return jobs_by_hash
+    finally:
+        cur.close()
+
+def detect_and_store(conn, model, model_version, jobs_by_hash, batch_size=BATCH_SIZE, decode_workers=DECODE_WORKERS, imgsz=IMAGE_SIZE):
+    """
+    Runs batched inference on one image per content hash in jobs_by_hash, caches the results
+    and stores them for every image sharing that hash. Each batch is committed on its own.
+    Returns the number of images run through the model.
+    """
+    cur = conn.cursor()
+    started = time.perf_counter()
+    processed_images = 0
+    inference_jobs = [(content_hash, jobs[0][1]) for content_hash, jobs in jobs_by_hash.items()]
+    try:
+        for batch in iter_image_batches(inference_jobs, batch_size, decode_workers, imgsz):
+            try:
+                with span("yolo_batch"): # Inference and storage; decoding overlaps with it in the background
+                    # One model call for the whole batch
+                    results = model([image for _, _, image, _ in batch], imgsz=imgsz, verbose=False)
+
+                    cache_entries = []
+                    entries = []
+                    for (content_hash, _, _, scale), r in zip(batch, results):
+                        detections = detections_from_result(r, scale, model.names)
+                        cache_entries.append((content_hash, detections))
+                        # Duplicates of this image get the same detections under their own message_id
+                        entries.extend(
+                            (message_id, image_path, content_hash, detections)
+                            for message_id, image_path in jobs_by_hash[content_hash]
+                        )
+
+                    cache_detections(cur, cache_entries, model_version)
+                    detection_count = store_detections(cur, entries, model_version)
+                    conn.commit()
+                processed_images += len(batch)
+                increment("yolo_images_total", len(batch), source="model")
+                increment("yolo_detections_total", detection_count, source="model")
+                logging.info(f"Processed and stored {detection_count} detections for a batch of {len(batch)} images")
+
+            except Exception as e:
+                logging.error(f"Error running YOLO detection on batch starting with {batch[0][1]}: {e}")
+                conn.rollback() # Rollback changes for this batch if an error occurs
+    finally:
+        cur.close()
+
+    elapsed = time.perf_counter() - started
+    images_per_second = processed_images / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Processed {processed_images} images in {elapsed:.1f}s ({images_per_second:.1f} images/s, batch_size={batch_size})")
+    return processed_images
+
+def _detect_shard(shard, model_path, model_version, batch_size, decode_workers, imgsz, torch_threads):
+    """
+    Worker-process entry point for sharded enrichment: loads the model once, opens its own
+    connection and runs detect_and_store over its share of the images.
+    Returns (images run through the model, snapshot of the worker's instrumentation metrics).
+    """
+    REGISTRY.reset() # Pool processes can be reused; only this shard's metrics go back to the parent
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads) # Keep N workers from oversubscribing the cores
+    conn = get_db_connection()
+    try:
+        model = load_model(model_path)
+        processed_images = detect_and_store(conn, model, model_version, shard, batch_size, decode_workers, imgsz)
+        return processed_images, REGISTRY.snapshot()
+    finally:
+        conn.close()
+
+def detect_and_store_sharded(model_path, model_version, jobs_by_hash, num_workers, batch_size=BATCH_SIZE,
+                             decode_workers=DECODE_WORKERS, imgsz=IMAGE_SIZE):
+    """
+    Splits jobs_by_hash round-robin into num_workers shards and runs each shard in its own process.
+    A failing shard is logged and does not stop the others. The workers' metrics are merged into this process's registry.
+    Returns the number of images run through the model.
+    """
+    items = list(jobs_by_hash.items())
+    shards = [dict(items[i::num_workers]) for i in range(num_workers)]
+    shards = [shard for shard in shards if shard]
+    torch_threads = max(1, (os.cpu_count() or 1) // len(shards))
+    logging.info(f"Running YOLO detection on {len(items)} images across {len(shards)} worker processes")
+
+    processed_images = 0
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [
+            pool.submit(_detect_shard, shard, model_path, model_version, batch_size, decode_workers, imgsz, torch_threads)
+            for shard in shards
+        ]
+        for future in as_completed(futures):
+            try:
+                shard_images, shard_metrics = future.result()
+                processed_images += shard_images
+                REGISTRY.merge(shard_metrics)
+            except Exception as e:
+                logging.error(f"YOLO shard worker failed: {e}")
+                increment("yolo_shard_errors_total")
+    return processed_images
+
+def run_yolo_detection_and_store(image_paths_pattern=None, batch_size=BATCH_SIZE, decode_workers=DECODE_WORKERS, imgsz=IMAGE_SIZE,
+                                 backend=YOLO_BACKEND, int8=YOLO_INT8, num_workers=YOLO_WORKERS, source_prefix=None,
+                                 model=None, model_version=None):
     """
     Runs YOLOv8 detection on images and stores results in PostgreSQL.
+    Images are the photos referenced by raw.telegram_messages, or the <message_id>.jpg files matching
+    image_paths_pattern when one is given; source_prefix narrows the former to messages loaded from one raw directory.
+    Images already processed with the current model version are skipped, and images whose
+    content hash is in raw.yolo_detection_cache (e.g. reposts of the same photo) reuse the
+    cached detections under their own message_id instead of being run through the model.
+    Remaining images are decoded by a prefetching thread pool and sent to the model in batches
+    of batch_size; each batch's detections are written and committed together.
+    backend picks the PyTorch weights or an exported ONNX/OpenVINO model (see BACKENDS);
+    with num_workers > 1 the images are sharded across that many processes.
+    model replaces the YOLO model with any object that has .names and is called like one (e.g. the
+    benchmark's stub); it always runs in this process and its detections are stored under model_version.
+    Returns the number of images run through the model.
     """
     conn = None
     try:
         conn = get_db_connection()
         create_raw_detections_table(conn)
-        cur = conn.cursor()
+        create_detection_cache_tables(conn)
 
-        # Load the YOLOv8n model (will download if not present)
-        logging.info("Loading YOLOv8n model...")
-        model = YOLO('yolov8n.pt') # 'yolov8n.pt' is the nano model, good for quick testing
-        logging.info("YOLOv8n model loaded successfully.")
+        if image_paths_pattern:
+            candidate_jobs = get_image_jobs_from_pattern(image_paths_pattern)
+        else:
+            candidate_jobs = get_image_jobs_from_messages(conn, source_prefix)
+        if not candidate_jobs:
+            logging.warning("No image files found. Skipping YOLO detection.")
+            return 0
 
-        image_paths = get_image_paths(image_paths_pattern)
-        if not image_paths:
-            logging.warning("No image files found matching the pattern. Skipping YOLO detection.")
-            return
+        if model is None:
+            # Download/export the model up front so its version is known and workers only load it
+            model_path = prepare_model(backend, int8)
+            model_version = get_model_version(MODEL_WEIGHTS, backend, int8)
+        else:
+            model_version = model_version or "custom"
 
-        for image_path in image_paths:
-            message_id = extract_message_id_from_path(image_path)
-            if message_id is None:
-                continue # Skip if message_id cannot be extracted
+        jobs_by_hash = plan_detection_jobs(conn, candidate_jobs, model_version, decode_workers)
+        if not jobs_by_hash:
+            return 0
 
-            try:
-                # Run inference on the image
-                results = model(image_path)
-
-                # Process results and insert into DB
-                for r in results:
-                    # r.boxes contains detected bounding boxes and their attributes
-                    # r.names is a dictionary mapping class IDs to class names
-                    for box in r.boxes:
-                        detected_class_id = int(box.cls[0])
-                        detected_class_name = model.names[detected_class_id]
-                        confidence = float(box.conf[0])
-                        bbox_xyxy = box.xyxy[0].tolist() # Convert tensor to list for JSONB
-
-                        cur.execute(
-                            """
-                            INSERT INTO raw.yolo_detections (
-                                message_id, image_path, detected_class, confidence, bbox_xyxy
-                            ) VALUES (%s, %s, %s, %s, %s::jsonb);
-                            """,
-                            (message_id, image_path, detected_class_name, confidence, json.dumps(bbox_xyxy))
-                        )
-                conn.commit()
-                logging.info(f"Processed and stored detections for image: {image_path}")
-
-            except Exception as e:
-                logging.error(f"Error processing image {image_path} for YOLO detection: {e}")
-                conn.rollback() # Rollback changes for this image if an error occurs
+        if model is None and num_workers > 1:
+            return detect_and_store_sharded(model_path, model_version, jobs_by_hash, num_workers, batch_size, decode_workers, imgsz)
+        if model is None:
+            logging.info(f"Loading {backend} model from {model_path}...")
+            model = load_model(model_path)
+            logging.info("Model loaded successfully.")
+        return detect_and_store(conn, model, model_version, jobs_by_hash, batch_size, decode_workers, imgsz)
 
     except Exception as e:
         logging.critical(f"Fatal error during YOLO detection process: {e}")
+        increment("yolo_errors_total")
+        return 0
     finally:
         if conn:
             conn.close()
             logging.info("Database connection closed.")
 
 if __name__ == "__main__":
-    # The glob pattern to find your image files
-    # Assumes images are stored like: data/raw/telegram_messages/YYYY-MM-DD/channel_name/images/message_id.jpg
-    image_data_path_pattern = "data/raw/telegram_messages/*/*/images/*.jpg"
-    
-    logging.info(f"Starting YOLO enrichment process for images matching: {image_data_path_pattern}")
-    run_yolo_detection_and_store(image_data_path_pattern)
-    logging.info("YOLO enrichment process completed.")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run YOLO detection on scraped images and store the results.")
+    # By default images come from the photo_path of loaded messages; a glob of <message_id>.jpg files also works,
+    # e.g. data/raw/telegram_messages/*/*/images/*.jpg for the old per-day layout
+    parser.add_argument("--pattern", help="Glob of <message_id>.jpg images to process instead of the loaded messages' photos")
+    parser.add_argument("--backend", choices=BACKENDS, default=YOLO_BACKEND)
+    parser.add_argument("--int8", action="store_true", default=YOLO_INT8, help="Use an INT8-quantized export (openvino only)")
+    parser.add_argument("--workers", type=int, default=YOLO_WORKERS, help="Shard images across this many processes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.info(f"Starting YOLO enrichment process for images from: {args.pattern or 'raw.telegram_messages'}")
+    run_yolo_detection_and_store(
+        args.pattern, batch_size=args.batch_size, backend=args.backend, int8=args.int8, num_workers=args.workers
+    )
+    logging.info("YOLO enrichment process completed.")
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import psycopg2
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules in scripts/ import each other by bare name (from config import ...), as when run from that directory
+sys.path.insert(0, os.path.join(ROOT_DIR, "scripts"))
+sys.path.insert(0, ROOT_DIR)
+# For the benchmark helpers some tests reuse (e.g. its stub YOLO model)
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+# Tests touching Postgres run against a dedicated, disposable database named by TEST_DB_NAME
+# (the other connection settings come from DB_* as usual) and are skipped when it is not set.
+# Every module connecting through config.DB_NAME then uses that database too.
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+if TEST_DB_NAME:
+    os.environ["DB_NAME"] = TEST_DB_NAME
+
+
+@pytest.fixture
+def db_conn():
+    """A connection to the test database, with the raw and meta schemas dropped beforehand."""
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME is not set")
+    from config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+    conn = psycopg2.connect(dbname=TEST_DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS raw, meta CASCADE;")
+    conn.commit()
+    yield conn
+    conn.close()
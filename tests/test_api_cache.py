@@ -0,0 +1,70 @@
+import asyncio
+
+import psycopg2
+import pytest
+
+pytest.importorskip("fastapi")
+
+import api.cache
+from api.cache import ResponseCache
+
+
+class FakeVersionTable:
+    """Stands in for fetch_all on meta.data_version: a version number, or None while the table is missing."""
+
+    def __init__(self, version=None):
+        self.version = version
+
+    async def __call__(self, query, params=None):
+        if self.version is None:
+            raise psycopg2.errors.UndefinedTable('relation "meta.data_version" does not exist')
+        return [(self.version,)]
+
+
+@pytest.fixture
+def version_table(monkeypatch):
+    table = FakeVersionTable()
+    monkeypatch.setattr(api.cache, "fetch_all", table)
+    return table
+
+
+def make_endpoint(cache):
+    calls = []
+
+    @cache.cached("report")
+    async def report(limit):
+        calls.append(limit)
+        return [limit, len(calls)]
+
+    return report, calls
+
+
+def test_cached_responses_are_reused_until_the_version_changes(version_table):
+    version_table.version = 1
+    cache = ResponseCache(ttl_seconds=3600, version_check_seconds=0)
+    report, _ = make_endpoint(cache)
+
+    assert asyncio.run(report(limit=10)) == [10, 1]
+    assert asyncio.run(report(limit=10)) == [10, 1]
+    version_table.version = 2
+    assert asyncio.run(report(limit=10)) == [10, 2]
+    assert cache.stats["invalidations"] == 1
+
+
+def test_responses_cached_before_the_first_version_is_known_are_dropped(version_table):
+    cache = ResponseCache(ttl_seconds=3600, version_check_seconds=0)
+    report, _ = make_endpoint(cache)
+
+    assert asyncio.run(report(limit=10)) == [10, 1] # meta.data_version does not exist yet
+    version_table.version = 1 # The first pipeline run creates it
+    assert asyncio.run(report(limit=10)) == [10, 2]
+    assert cache.snapshot()["data_version"] == 1
+
+
+def test_first_version_on_an_empty_cache_is_not_an_invalidation(version_table):
+    version_table.version = 5
+    cache = ResponseCache(ttl_seconds=3600, version_check_seconds=0)
+    report, _ = make_endpoint(cache)
+
+    asyncio.run(report(limit=10))
+    assert cache.stats["invalidations"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import api.database
+from api.database import close_pool, init_pool, iterate_closing, pooled_connection, stream_rows
+
+
+@pytest.fixture
+def pool(db_conn):
+    init_pool(min_conn=1, max_conn=1) # One connection: a stream that kept it would block every later borrow
+    yield
+    close_pool()
+
+
+def open_cursors():
+    # Fails instead of blocking forever when the connection was never returned
+    assert api.database._pool_slots.acquire(timeout=5), "the pooled connection was not returned"
+    api.database._pool_slots.release()
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM pg_cursors;")
+            return cur.fetchone()[0]
+
+
+def test_abandoned_stream_closes_its_cursor_and_returns_the_connection(pool):
+    batches = stream_rows("SELECT generate_series(1, 100);", batch_size=10)
+    assert [row for (row,) in next(batches)] == list(range(1, 11))
+    assert not api.database._pool_slots.acquire(blocking=False) # Borrowed by the stream
+
+    batches.close() # What the response does when the client disconnects partway
+
+    assert open_cursors() == 0
+
+
+def test_iterate_closing_closes_the_body_when_the_response_stops_early(pool):
+    closed = []
+
+    def body():
+        try:
+            for batch in stream_rows("SELECT generate_series(1, 100);", batch_size=10):
+                yield batch
+        finally:
+            closed.append(True)
+
+    async def read_one_chunk():
+        chunks = iterate_closing(body())
+        first = await chunks.__anext__()
+        await chunks.aclose() # Starlette stops iterating the body on disconnect
+        return first
+
+    assert len(asyncio.run(read_one_chunk())) == 10
+    assert closed == [True]
+    assert open_cursors() == 0
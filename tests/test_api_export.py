@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+import api.main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    queries = []
+
+    def fake_stream_rows(query, params=None):
+        queries.append((query, params))
+        yield [(1, 10, "a.jpg", "bottle", 0.9, 1.0, 2.0, 3.0, 4.0, "sk_a", "2024-01-01")]
+
+    monkeypatch.setattr(api.main, "stream_rows", fake_stream_rows)
+    client = TestClient(api.main.app) # Not entered: no lifespan, so no connection pool is opened
+    client.queries = queries
+    return client
+
+
+def test_export_reads_the_format_query_parameter(client):
+    response = client.get("/api/images/detections/export", params={"format": "ndjson", "min_confidence": 0.5})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert json.loads(response.text.splitlines()[0])["detected_class"] == "bottle"
+    assert client.queries[0][1] == {"min_confidence": 0.5}
+
+
+def test_export_rejects_an_unknown_format(client):
+    response = client.get("/api/images/detections/export", params={"format": "xml"})
+    assert response.status_code == 400
+    assert not client.queries
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import api.main
+
+
+def test_pool_is_closed_when_the_app_fails_after_startup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api.main, "init_pool", lambda: calls.append("init"))
+    monkeypatch.setattr(api.main, "close_pool", lambda: calls.append("close"))
+
+    async def fail_while_running():
+        lifespan = api.main.lifespan(api.main.app)
+        await lifespan.__aenter__()
+        error = RuntimeError("startup failed")
+        suppressed = await lifespan.__aexit__(RuntimeError, error, None)
+        assert not suppressed
+
+    asyncio.run(fail_while_running())
+    assert calls == ["init", "close"]
@@ -0,0 +1,93 @@
+import base64
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import api.main
+from api.cache import response_cache
+from api.main import decode_cursor, encode_cursor
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(0.5, "abc", 7), (float, str, int)) == [0.5, "abc", 7]
+    assert decode_cursor(encode_cursor(0, "abc", 7), (float, str, int)) == [0, "abc", 7] # A rank serialised as 0
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 json",
+    raw_cursor({"rank": 0.5}),
+    raw_cursor([0.5, "abc"]),
+    raw_cursor(["0.5", "abc", 7]),
+    raw_cursor([0.5, 12, 7]),
+    raw_cursor([0.5, "abc", "7"]),
+    raw_cursor([0.5, "abc", 7.5]),
+    raw_cursor([0.5, "abc", True]),
+    raw_cursor([0.5, "abc", 2**70]),
+    raw_cursor([0.5, "abc", None]),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, (float, str, int))
+    assert excinfo.value.status_code == 400
+
+
+def test_non_finite_rank_is_rejected():
+    cursor = base64.urlsafe_b64encode(b'[NaN, "abc", 7]').decode()
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, (float, str, int))
+
+
+@pytest.fixture
+def search_client(db_conn):
+    """The API against a minimal dbt_marts with the same message id in two channels, all equally relevant."""
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            DROP SCHEMA IF EXISTS dbt_marts CASCADE;
+            CREATE SCHEMA dbt_marts;
+            CREATE TABLE dbt_marts.dim_channels (channel_sk VARCHAR PRIMARY KEY, channel_name VARCHAR);
+            CREATE TABLE dbt_marts.fct_messages (
+                message_id BIGINT, channel_sk VARCHAR, date_pk DATE, message_text TEXT, message_tsv TSVECTOR
+            );
+            INSERT INTO dbt_marts.dim_channels VALUES ('sk_a', 'Chemed'), ('sk_b', 'lobelia4cosmetics');
+            INSERT INTO dbt_marts.fct_messages
+            SELECT message_id, channel_sk, DATE '2024-01-01', 'paracetamol in stock', to_tsvector('simple', 'paracetamol in stock')
+            FROM (VALUES (1), (2)) AS ids (message_id), (VALUES ('sk_a'), ('sk_b')) AS channels (channel_sk);
+        """)
+    db_conn.commit()
+    response_cache.clear()
+    try:
+        with TestClient(api.main.app) as client:
+            yield client
+    finally:
+        response_cache.clear()
+        with db_conn.cursor() as cur:
+            cur.execute("DROP SCHEMA dbt_marts CASCADE;")
+        db_conn.commit()
+
+
+def test_search_pages_through_equal_ranks_across_channels(search_client):
+    seen, cursor = [], None
+    while True:
+        params = {"q": "paracetamol", "limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = search_client.get("/api/messages/search", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend((row["channel_name"], row["message_id"]) for row in page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == [("Chemed", 1), ("Chemed", 2), ("lobelia4cosmetics", 1), ("lobelia4cosmetics", 2)]
+
+
+def test_search_rejects_a_tampered_cursor(search_client):
+    response = search_client.get("/api/messages/search", params={"q": "paracetamol", "cursor": raw_cursor([0.5, "sk_a", "1; DROP"])})
+    assert response.status_code == 400
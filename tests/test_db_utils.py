@@ -0,0 +1,43 @@
+import csv
+import io
+
+from db_utils import copy_rows
+
+
+class FakeCursor:
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+
+def read_back(data):
+    """Parses COPY csv input the way Postgres does: an unquoted empty field is NULL."""
+    rows = []
+    for line in data.splitlines():
+        fields = next(csv.reader(io.StringIO(line)))
+        raw_fields = line.split(",")
+        rows.append([None if raw == "" else field for raw, field in zip(raw_fields, fields)])
+    return rows
+
+
+def test_copy_rows_keeps_null_empty_string_and_backslash_n_apart():
+    cur = FakeCursor()
+    assert copy_rows(cur, "raw.t", ("a", "b", "c"), [(None, "", "\\N")]) == 1
+    assert "NULL" not in cur.sql
+    assert read_back(cur.data) == [[None, "", "\\N"]]
+
+
+def test_copy_rows_quotes_separators_quotes_and_newlines():
+    cur = FakeCursor()
+    copy_rows(cur, "raw.t", ("id", "text"), [(1, 'a, "b"\nc')])
+    assert next(csv.reader(io.StringIO(cur.data))) == ["1", 'a, "b"\nc']
+
+
+def test_copy_rows_skips_empty_batches():
+    cur = FakeCursor()
+    assert copy_rows(cur, "raw.t", ("a",), []) == 0
+    assert cur.sql is None
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from scripts.instrumentation import MetricsRegistry
+
+
+def metric(registry, name, **labels):
+    matches = [m for m in registry.snapshot() if m["name"] == name and m["labels"] == {k: str(v) for k, v in labels.items()}]
+    assert len(matches) == 1, f"{name} {labels}: {matches}"
+    return matches[0]
+
+
+def test_counters_gauges_and_histograms_are_keyed_by_labels():
+    registry = MetricsRegistry(buckets=(0.1, 1, math.inf))
+    registry.increment("rows_total", 5, channel="Chemed")
+    registry.increment("rows_total", 2, channel="Chemed")
+    registry.increment("rows_total", channel="tikvahpharma")
+    registry.set_gauge("queue_depth", 3)
+    registry.set_gauge("queue_depth", 1)
+    for value in (0.05, 0.5, 0.5, 7):
+        registry.observe("load_seconds", value, channel="Chemed")
+
+    assert metric(registry, "rows_total", channel="Chemed")["value"] == 7
+    assert metric(registry, "rows_total", channel="tikvahpharma")["value"] == 1
+    assert metric(registry, "queue_depth")["value"] == 1
+    histogram = metric(registry, "load_seconds", channel="Chemed")
+    assert histogram["count"] == 4
+    assert histogram["value"] == pytest.approx(8.05)
+    assert histogram["buckets"] == {"0.1": 1, "1": 3, "+Inf": 4}
+
+
+def test_span_times_the_block_and_counts_errors():
+    registry = MetricsRegistry()
+    with registry.span("stage", step="load"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span("stage", step="load"):
+            raise ValueError("boom")
+
+    assert metric(registry, "stage_seconds", step="load")["count"] == 2
+    assert metric(registry, "stage_errors_total", step="load")["value"] == 1
+
+
+def test_merge_adds_counters_and_histograms_and_overwrites_gauges():
+    worker = MetricsRegistry(buckets=(0.1, 1, math.inf))
+    worker.increment("images_total", 3)
+    worker.set_gauge("model_loaded", 1)
+    worker.observe("batch_seconds", 0.05)
+    worker.observe("batch_seconds", 2)
+
+    parent = MetricsRegistry(buckets=(0.1, 1, math.inf))
+    parent.increment("images_total", 4)
+    parent.set_gauge("model_loaded", 0)
+    parent.observe("batch_seconds", 0.5)
+    parent.merge(worker.snapshot())
+
+    assert metric(parent, "images_total")["value"] == 7
+    assert metric(parent, "model_loaded")["value"] == 1
+    histogram = metric(parent, "batch_seconds")
+    assert histogram["count"] == 3
+    assert histogram["value"] == pytest.approx(2.55)
+    assert histogram["buckets"] == {"0.1": 1, "1": 2, "+Inf": 3}
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry(buckets=(0.5, math.inf))
+    registry.increment("api.requests_total", route="/api/x", status=200)
+    registry.increment("api.requests_total", route="/api/x", status=500)
+    registry.observe("api_request_duration_seconds", 0.2, route='/api/"quoted"\n')
+
+    assert registry.render_prometheus() == (
+        "# TYPE api_request_duration_seconds histogram\n"
+        'api_request_duration_seconds_bucket{le="0.5",route="/api/\\"quoted\\"\\n"} 1\n'
+        'api_request_duration_seconds_bucket{le="+Inf",route="/api/\\"quoted\\"\\n"} 1\n'
+        'api_request_duration_seconds_sum{route="/api/\\"quoted\\"\\n"} 0.2\n'
+        'api_request_duration_seconds_count{route="/api/\\"quoted\\"\\n"} 1\n'
+        "# TYPE api_requests_total counter\n"
+        'api_requests_total{route="/api/x",status="200"} 1\n'
+        'api_requests_total{route="/api/x",status="500"} 1\n'
+    )
@@ -0,0 +1,78 @@
+from datetime import datetime
+import json
+
+import pytest
+
+from load_to_postgres import ensure_raw_tables, iter_json_array, write_rows
+
+TABLE = "raw.telegram_messages"
+
+
+def loaded_at(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT channel, id, text, loaded_at FROM {TABLE} ORDER BY channel, id;")
+        return {(channel, message_id): (text, loaded) for channel, message_id, text, loaded in cur.fetchall()}
+
+
+def message(message_id, text):
+    return (message_id, "Chemed", datetime(2024, 1, 1), text, False, None, "2024-01-01/Chemed.json")
+
+
+@pytest.mark.parametrize("mode", ["insert", "batch", "copy"])
+def test_reload_moves_loaded_at_only_for_changed_messages(db_conn, mode):
+    ensure_raw_tables(db_conn, TABLE)
+    with db_conn.cursor() as cur:
+        write_rows(cur, TABLE, [message(1, "paracetamol"), message(2, "amoxicillin")], mode)
+    db_conn.commit()
+    first = loaded_at(db_conn)
+
+    with db_conn.cursor() as cur:
+        write_rows(cur, TABLE, [message(1, "paracetamol"), message(2, "amoxicillin 500mg")], mode)
+    db_conn.commit()
+    second = loaded_at(db_conn)
+
+    assert second[("Chemed", 1)] == first[("Chemed", 1)]
+    assert second[("Chemed", 2)][0] == "amoxicillin 500mg"
+    assert second[("Chemed", 2)][1] > first[("Chemed", 2)][1]
+
+
+def test_file_load_times_are_labelled_by_channel_only():
+    from scripts.instrumentation import REGISTRY
+    from load_to_postgres import _record_metrics
+
+    REGISTRY.reset()
+    _record_metrics([
+        {"file": f"data/raw/telegram_messages/2024-01-01/Chemed/{name}", "status": "loaded", "rows": 10, "bytes": 100, "seconds": 0.1}
+        for name in ("a.ndjson", "b.ndjson")
+    ])
+    series = [m for m in REGISTRY.snapshot() if m["name"] == "load_file_seconds"]
+    REGISTRY.reset()
+    assert [(m["labels"], m["count"]) for m in series] == [({"channel": "Chemed"}, 2)]
+
+
+JSON_ARRAYS = [
+    "[]",
+    " [ ] \n",
+    "[1.25]",
+    "[1.5e10, -2E-3, 0, -0.5]",
+    "[969040.650294099, 12345678901234567890]",
+    '[{"id": 1, "text": "ዋጋ 1,200 ብር \\u1200 \\"quoted\\"", "views": 3.5e2, "tags": [true, false, null]}, {"id": 2}]',
+    '["a", ["nested", [1.0, 2]], {"k": {"deep": -1e-7}}]\n',
+]
+
+
+@pytest.mark.parametrize("document", JSON_ARRAYS)
+def test_json_array_matches_json_loads_at_every_chunk_size(tmp_path, document):
+    path = tmp_path / "messages.json"
+    path.write_text(document, encoding="utf-8")
+    for chunk_size in range(1, len(document) + 2):
+        assert list(iter_json_array(str(path), chunk_size=chunk_size)) == json.loads(document), chunk_size
+
+
+@pytest.mark.parametrize("document", ["[1]]", "[1] garbage", "[] x", "[1,]", "[1 2]", "[1", "{}"])
+def test_invalid_json_array_is_rejected_at_every_chunk_size(tmp_path, document):
+    path = tmp_path / "messages.json"
+    path.write_text(document, encoding="utf-8")
+    for chunk_size in range(1, len(document) + 2):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(str(path), chunk_size=chunk_size))
@@ -0,0 +1,37 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+import yaml
+
+pytest.importorskip("dagster")
+pytest.importorskip("telethon")
+
+import scripts.pipeline
+from scripts.pipeline import WAREHOUSE_TAG, daily_partitions, is_latest_partition, medical_data_pipeline
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("partition_key, latest", [("2024-03-09", True), ("2024-03-10", True), ("2024-03-08", False)])
+def test_only_the_latest_partition_is_scraped(partition_key, latest):
+    now = datetime(2024, 3, 10, 0, 5, tzinfo=timezone.utc) # The scheduled run for 2024-03-09
+    assert is_latest_partition(daily_partitions.time_window_for_partition_key(partition_key), now) is latest
+
+
+def test_run_queue_admits_one_pipeline_run_at_a_time():
+    with open(os.path.join(ROOT_DIR, "dagster.yaml"), encoding="utf-8") as f:
+        limits = yaml.safe_load(f)["run_coordinator"]["config"]["tag_concurrency_limits"]
+    assert WAREHOUSE_TAG in medical_data_pipeline.tags
+    assert {"key": WAREHOUSE_TAG, "limit": 1} in limits
+
+
+def test_ops_record_into_the_registry_the_scripts_count_in():
+    import load_to_postgres
+    import scripts.instrumentation
+    import scripts.load_to_postgres
+
+    # The same registry whether a script is imported by bare name (tests, benchmarks) or from the package (pipeline, API)
+    assert load_to_postgres.increment.__self__ is scripts.instrumentation.REGISTRY
+    assert scripts.load_to_postgres.increment.__self__ is scripts.instrumentation.REGISTRY
+    assert scripts.pipeline.span.__self__ is scripts.instrumentation.REGISTRY
@@ -0,0 +1,72 @@
+from datetime import datetime
+import warnings
+
+import pandas as pd
+
+from load_to_postgres import ensure_raw_tables
+from price_extractor import attribute_prices, extract_prices, find_products, run_price_extraction
+from product_matcher import ProductMatcher
+
+MATCHER = ProductMatcher({"paracetamol": ["paracetamol"], "amoxicillin": ["amoxicillin"]})
+
+
+def messages(*texts):
+    return pd.DataFrame({"channel": "Chemed", "message_id": range(1, len(texts) + 1), "text": list(texts)})
+
+
+def test_prices_are_parsed_from_arabic_and_geez_amounts_and_ranges():
+    prices = extract_prices(messages("paracetamol 1,200 birr", "ዋጋ በ፲፪፻ ብር", "ETB 300-250"))
+    assert prices[["message_id", "price_min", "price_max"]].values.tolist() == [[1, 1200, 1200], [2, 1200, 1200], [3, 250, 300]]
+
+
+def test_single_product_and_price_list_attribution():
+    batch = messages("paracetamol 100 birr or 90 birr", "paracetamol 100 birr, amoxicillin 250 birr")
+    prices = attribute_prices(batch, extract_prices(batch), MATCHER)
+    assert prices["product_name"].tolist() == ["paracetamol", "paracetamol", "paracetamol", "amoxicillin"]
+
+
+def test_products_are_found_like_the_matcher_finds_them():
+    matcher = ProductMatcher({"cipro": ["cipro", "ሲፕሮ"], "ciprofloxacin": ["ciprofloxacin"], "sanitizer": ["Sanitizer"], "hand sanitizer": ["hand sanitizer"]})
+    texts = pd.Series(["ciprofloxacin then cipro", "no products", None, "ሲፕሮ, Hand Sanitizer, cipro", "sanitizer_x cipros"])
+    products = find_products(texts, matcher)
+    assert products[["row", "product_index", "product_name"]].values.tolist() == [
+        [0, 0, "ciprofloxacin"], [0, 1, "cipro"], [3, 0, "cipro"], [3, 1, "hand sanitizer"], [4, 0, "sanitizer"]
+    ]
+    # Same products per text as the mentions the loader stores
+    for row, text in texts.items():
+        assert set(products.loc[products["row"] == row, "product_name"]) == set(matcher.count_mentions(text))
+
+
+def test_prices_are_attributed_when_only_some_messages_have_prices():
+    batch = messages("amoxicillin in stock", "paracetamol 100 birr", "no price", "amoxicillin 250 birr")
+    prices = attribute_prices(batch, extract_prices(batch), MATCHER)
+    assert prices[["message_id", "product_name"]].values.tolist() == [[2, "paracetamol"], [4, "amoxicillin"]]
+
+
+def test_batch_with_nothing_attributable_keeps_null_product_names():
+    # Two products but one price, and a price without any product
+    batch = messages("paracetamol and amoxicillin, 100 birr", "only 50 birr")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        prices = attribute_prices(batch, extract_prices(batch), MATCHER)
+    assert prices["product_name"].tolist() == [None, None]
+
+
+def test_messages_without_an_id_are_skipped(db_conn):
+    ensure_raw_tables(db_conn, "raw.telegram_messages")
+    with db_conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO raw.telegram_messages (id, channel, date, text, loaded_at) VALUES (%s, 'Chemed', %s, %s, %s);",
+            [(1, datetime(2024, 1, 1), "paracetamol 100 birr", datetime(2024, 1, 1)),
+             (None, datetime(2024, 1, 1), "amoxicillin 250 birr", datetime(2024, 1, 2))]
+        )
+    db_conn.commit()
+
+    summary = run_price_extraction()
+
+    assert summary == {"messages": 1, "prices": 1, "attributed": 1}
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT message_id, product_name, price_min FROM raw.product_prices;")
+        assert cur.fetchall() == [(1, "paracetamol", 100)]
+        cur.execute("SELECT watermark FROM meta.stage_watermarks WHERE stage = 'price_extraction';")
+        assert cur.fetchone()[0] == datetime(2024, 1, 2)
@@ -0,0 +1,21 @@
+from collections import Counter
+
+from product_matcher import ProductMatcher
+
+
+def test_whole_words_only_and_case_insensitive():
+    matcher = ProductMatcher({"ciprofloxacin": ["ciprofloxacin", "cipro"]})
+    assert matcher.count_mentions("CIPRO 500mg, Ciprofloxacin in stock") == Counter({"ciprofloxacin": 2})
+    assert matcher.count_mentions("ciprox") == Counter()
+
+
+def test_nested_variants_count_once():
+    matcher = ProductMatcher({"hand sanitizer": ["hand sanitizer", "sanitizer"]})
+    assert matcher.count_mentions("hand sanitizer available") == Counter({"hand sanitizer": 1})
+    assert matcher.count_mentions("hand sanitizer and sanitizer refills") == Counter({"hand sanitizer": 2})
+
+
+def test_overlapping_products_keep_the_leftmost_longest_match():
+    matcher = ProductMatcher({"vitamin c": ["vitamin c"], "vitamin": ["vitamin"], "c serum": ["c serum"]})
+    assert matcher.count_mentions("vitamin c serum") == Counter({"vitamin c": 1})
+    assert matcher.count_mentions("vitamin d") == Counter({"vitamin": 1})
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("telethon")
+
+from scrape_telegram import load_checkpoint, media_store_path, scrape_channels
+
+
+class FakePhoto:
+    def __init__(self, photo_id):
+        self.id = photo_id
+        self.sizes = []
+
+
+class FakeMessage:
+    def __init__(self, client, message_id, photo_id=None):
+        self.client = client
+        self.id = message_id
+        self.date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.text = f"message {message_id}"
+        self.photo = FakePhoto(photo_id) if photo_id is not None else None
+
+    async def download_media(self, file=None, thumb=None):
+        self.client.downloads.append(self.id)
+        if self.id in self.client.failing_downloads:
+            raise ConnectionError("download interrupted")
+        # Telethon may append an extension to the requested file name and returns the path it wrote
+        path = file + self.client.download_suffix
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+        return path
+
+
+class FakeEntity:
+    def __init__(self, username):
+        self.username = username
+
+
+class FakeClient:
+    """In-process stand-in for TelegramClient: {channel name: [(message id, photo id or None), ...]}."""
+
+    def __init__(self, channels, failing_downloads=(), download_suffix=""):
+        self.channels = channels
+        self.failing_downloads = set(failing_downloads)
+        self.download_suffix = download_suffix
+        self.downloads = []
+
+    async def get_entity(self, channel_url):
+        return FakeEntity(channel_url.rstrip("/").split("/")[-1])
+
+    async def iter_messages(self, entity, limit=None, min_id=0):
+        # Newest first, like Telegram
+        messages = sorted(self.channels[entity.username], reverse=True)
+        for message_id, photo_id in [m for m in messages if m[0] > min_id][:limit]:
+            yield FakeMessage(self, message_id, photo_id)
+
+
+def scrape(client, tmp_path, channels):
+    return asyncio.run(scrape_channels(
+        [f"https://t.me/{channel}" for channel in channels], str(tmp_path / "messages"), client=client,
+        checkpoint_dir=str(tmp_path / "checkpoints"), media_store_dir=str(tmp_path / "media")
+    ))
+
+
+def written_ids(tmp_path, channel):
+    ids = []
+    for name in os.listdir(tmp_path / "messages" / channel):
+        with open(tmp_path / "messages" / channel / name, encoding="utf-8") as f:
+            ids.extend(json.loads(line)["id"] for line in f)
+    return ids
+
+
+def test_scrape_writes_messages_downloads_photos_and_checkpoints(tmp_path):
+    client = FakeClient({"Chemed": [(1, None), (2, 100), (3, None)]})
+    summary = scrape(client, tmp_path, ["Chemed"])
+
+    assert summary == {"https://t.me/Chemed": {"messages": 3, "min_id": 3, "failed_media": 0}}
+    assert sorted(written_ids(tmp_path, "Chemed")) == [1, 2, 3]
+    assert os.path.exists(media_store_path(100, "full", str(tmp_path / "media")))
+    assert load_checkpoint(str(tmp_path / "checkpoints"), "Chemed") == 3
+
+    # Nothing new: nothing is fetched and the checkpoint stays
+    summary = scrape(client, tmp_path, ["Chemed"])
+    assert summary["https://t.me/Chemed"]["messages"] == 0
+    assert load_checkpoint(str(tmp_path / "checkpoints"), "Chemed") == 3
+
+
+def test_photo_shared_by_channels_is_downloaded_once(tmp_path):
+    client = FakeClient({"Chemed": [(1, 100)], "tikvahpharma": [(7, 100)]})
+    scrape(client, tmp_path, ["Chemed", "tikvahpharma"])
+    assert len(client.downloads) == 1
+
+
+def test_failed_download_holds_the_checkpoint_and_is_retried(tmp_path):
+    client = FakeClient({"Chemed": [(1, None), (2, 100), (3, 101), (4, None)]}, failing_downloads={3})
+    summary = scrape(client, tmp_path, ["Chemed"])
+
+    assert summary["https://t.me/Chemed"] == {"messages": 4, "min_id": 2, "failed_media": 1}
+    assert load_checkpoint(str(tmp_path / "checkpoints"), "Chemed") == 2
+    assert not os.path.exists(media_store_path(101, "full", str(tmp_path / "media")))
+    photo_dir = os.path.dirname(media_store_path(101, "full", str(tmp_path / "media")))
+    assert not [name for name in os.listdir(photo_dir) if name.endswith(".part")]
+
+    client.failing_downloads.clear()
+    client.downloads.clear()
+    summary = scrape(client, tmp_path, ["Chemed"])
+
+    assert client.downloads == [3] # The stored photo of message 2 is not downloaded again
+    assert summary["https://t.me/Chemed"] == {"messages": 2, "min_id": 4, "failed_media": 0}
+    assert os.path.exists(media_store_path(101, "full", str(tmp_path / "media")))
+
+
+def test_download_is_moved_from_the_path_telethon_returns(tmp_path):
+    media_dir = str(tmp_path / "media")
+    photo_path = media_store_path(100, "full", media_dir)
+    os.makedirs(os.path.dirname(photo_path))
+    for stale in (f"{photo_path}.1.part", f"{photo_path}.1.part.jpg"): # Left by a crashed run
+        open(stale, "wb").close()
+
+    client = FakeClient({"Chemed": [(1, 100)]}, download_suffix=".jpg")
+    summary = scrape(client, tmp_path, ["Chemed"])
+
+    assert summary["https://t.me/Chemed"]["failed_media"] == 0
+    assert os.listdir(os.path.dirname(photo_path)) == [os.path.basename(photo_path)]
+    with open(tmp_path / "messages" / "Chemed" / os.listdir(tmp_path / "messages" / "Chemed")[0], encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {
+            "id": 1, "date": "2024-01-01T00:00:00+00:00", "text": "message 1", "has_image": True, "photo_path": photo_path
+        }
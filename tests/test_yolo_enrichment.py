@@ -0,0 +1,198 @@
+import multiprocessing
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from scripts.instrumentation import REGISTRY
+from pipeline_benchmark import StubModel
+import yolo_enrichment
+from yolo_enrichment import (
+    LEGACY_MODEL_VERSION, create_detection_cache_tables, create_raw_detections_table, detect_and_store,
+    detect_and_store_sharded, detections_from_result, iter_image_batches, plan_detection_jobs, store_detections
+)
+
+
+def write_image(path, width, height, value=0):
+    cv2.imwrite(str(path), np.full((height, width, 3), value, dtype=np.uint8))
+    return str(path)
+
+
+def create_legacy_table(conn, rows):
+    """raw.yolo_detections as it was before boxes moved to REAL columns, filled with (message_id, image_path, bbox json)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE SCHEMA raw;
+            CREATE TABLE raw.yolo_detections (
+                detection_id SERIAL PRIMARY KEY,
+                message_id BIGINT NOT NULL,
+                image_path VARCHAR(512) NOT NULL,
+                detected_class VARCHAR(255) NOT NULL,
+                confidence REAL NOT NULL,
+                bbox_xyxy JSONB,
+                detection_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        for message_id, image_path, bbox in rows:
+            cur.execute(
+                "INSERT INTO raw.yolo_detections (message_id, image_path, detected_class, confidence, bbox_xyxy) "
+                "VALUES (%s, %s, 'bottle', 0.9, %s::jsonb);",
+                (message_id, image_path, bbox)
+            )
+    conn.commit()
+
+
+def detections(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT message_id, image_path, model_version, x1, y1, x2, y2 FROM raw.yolo_detections ORDER BY detection_id;")
+        return cur.fetchall()
+
+
+def test_migration_drops_legacy_rows_without_a_usable_box(db_conn):
+    create_legacy_table(db_conn, [
+        (1, "a.jpg", "[1, 2, 3, 4]"),
+        (1, "a.jpg", "[1, 2, 3, 4]"), # Exact duplicate
+        (2, "b.jpg", None),
+        (3, "c.jpg", "[1, 2]"),
+        (4, "d.jpg", '["1", 2, 3, 4]'),
+        (5, "e.jpg", '{"x1": 1}'),
+    ])
+    create_raw_detections_table(db_conn)
+    assert detections(db_conn) == [(1, "a.jpg", LEGACY_MODEL_VERSION, 1.0, 2.0, 3.0, 4.0)]
+
+
+def test_store_detections_replaces_legacy_rows_of_the_same_image(db_conn):
+    create_legacy_table(db_conn, [(1, "a.jpg", "[1, 2, 3, 4]"), (2, "b.jpg", "[5, 6, 7, 8]")])
+    create_raw_detections_table(db_conn)
+    create_detection_cache_tables(db_conn)
+
+    detection = {"detected_class": "bottle", "confidence": 0.8, "bbox_xyxy": [10, 20, 30, 40]}
+    with db_conn.cursor() as cur:
+        store_detections(cur, [(1, "a.jpg", "hash-a", [detection])], "yolov8n.pt@abc")
+    db_conn.commit()
+
+    assert detections(db_conn) == [
+        (2, "b.jpg", LEGACY_MODEL_VERSION, 5.0, 6.0, 7.0, 8.0),
+        (1, "a.jpg", "yolov8n.pt@abc", 10.0, 20.0, 30.0, 40.0),
+    ]
+
+
+def test_batches_are_full_and_in_job_order(tmp_path):
+    jobs = [(key, write_image(tmp_path / f"{key}.jpg", 32, 24)) for key in range(5)]
+    batches = list(iter_image_batches(jobs, batch_size=2, decode_workers=3, imgsz=640))
+    assert [[key for key, _, _, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+    assert all(image.shape == (24, 32, 3) and scale == 1.0 for batch in batches for _, _, image, scale in batch)
+
+
+def test_images_that_fail_to_decode_are_left_out(tmp_path):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    jobs = [(0, write_image(tmp_path / "0.jpg", 8, 8)), (1, str(broken)), (2, str(tmp_path / "missing.jpg")),
+            (3, write_image(tmp_path / "3.jpg", 8, 8)), (4, write_image(tmp_path / "4.jpg", 8, 8))]
+    REGISTRY.reset()
+    batches = list(iter_image_batches(jobs, batch_size=2, decode_workers=2, imgsz=640))
+    errors = [m["value"] for m in REGISTRY.snapshot() if m["name"] == "yolo_decode_errors_total"]
+    REGISTRY.reset()
+
+    assert [[key for key, _, _, _ in batch] for batch in batches] == [[0, 3], [4]]
+    assert errors == [2]
+
+
+def test_boxes_on_downscaled_images_map_back_to_original_pixels(tmp_path):
+    jobs = [("large", write_image(tmp_path / "large.jpg", 1280, 960)), ("small", write_image(tmp_path / "small.jpg", 400, 200))]
+    (batch,) = iter_image_batches(jobs, batch_size=2, decode_workers=1, imgsz=640)
+    model = StubModel() # One box over the middle half of whatever image it is given
+    results = model([image for _, _, image, _ in batch])
+
+    (large_key, _, large_image, large_scale), (small_key, _, small_image, small_scale) = batch
+    assert large_image.shape[:2] == (480, 640) and large_scale == 0.5
+    assert small_image.shape[:2] == (200, 400) and small_scale == 1.0
+    large, small = (detections_from_result(result, scale, model.names) for result, (_, _, _, scale) in zip(results, batch))
+    assert large == [{"detected_class": "bottle", "confidence": pytest.approx(0.9), "bbox_xyxy": [320.0, 240.0, 960.0, 720.0]}]
+    assert small[0]["bbox_xyxy"] == [100.0, 50.0, 300.0, 150.0]
+
+
+class CountingStubModel(StubModel):
+    """StubModel that remembers how many images it was run on."""
+
+    def __init__(self):
+        self.images = 0
+
+    def __call__(self, images, imgsz=None, verbose=False):
+        self.images += len(images)
+        return super().__call__(images, imgsz, verbose)
+
+
+def stored_images(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT message_id, image_path, model_version FROM raw.yolo_detections ORDER BY message_id, model_version;")
+        return cur.fetchall()
+
+
+def detect(conn, jobs, model_version, model):
+    jobs_by_hash = plan_detection_jobs(conn, jobs, model_version, decode_workers=2)
+    detect_and_store(conn, model, model_version, jobs_by_hash, batch_size=4, decode_workers=2)
+    return jobs_by_hash
+
+
+@pytest.fixture
+def detection_tables(db_conn):
+    create_raw_detections_table(db_conn)
+    create_detection_cache_tables(db_conn)
+    return db_conn
+
+
+def test_duplicate_images_run_through_the_model_once(detection_tables, tmp_path):
+    first = write_image(tmp_path / "first.jpg", 64, 48, value=10)
+    repost = write_image(tmp_path / "repost.jpg", 64, 48, value=10) # Same bytes, different file
+    other = write_image(tmp_path / "other.jpg", 64, 48, value=200)
+    model = CountingStubModel()
+
+    jobs_by_hash = detect(detection_tables, [(1, first), (2, repost), (3, other)], "v1", model)
+
+    assert sorted(len(jobs) for jobs in jobs_by_hash.values()) == [1, 2]
+    assert model.images == 2
+    assert stored_images(detection_tables) == [(1, first, "v1"), (2, repost, "v1"), (3, other, "v1")]
+
+
+def test_cached_image_skips_the_model_for_the_same_version_only(detection_tables, tmp_path):
+    original = write_image(tmp_path / "original.jpg", 64, 48, value=10)
+    detect(detection_tables, [(1, original)], "v1", CountingStubModel())
+
+    # A later repost of the same photo: served from the cache
+    repost = write_image(tmp_path / "repost.jpg", 64, 48, value=10)
+    model = CountingStubModel()
+    assert detect(detection_tables, [(1, original), (2, repost)], "v1", model) == {}
+    assert model.images == 0
+    assert stored_images(detection_tables) == [(1, original, "v1"), (2, repost, "v1")]
+
+    # New model weights: the cached detections of v1 do not apply
+    model = CountingStubModel()
+    jobs_by_hash = detect(detection_tables, [(2, repost)], "v2", model)
+    assert list(jobs_by_hash.values()) == [[(2, repost)]]
+    assert model.images == 1
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the stub model and torch")
+def test_sharded_detection_processes_every_image_once(detection_tables, tmp_path, monkeypatch):
+    jobs = [(message_id, write_image(tmp_path / f"{message_id}.jpg", 32, 24, value=message_id * 20)) for message_id in range(1, 6)]
+    jobs_by_hash = plan_detection_jobs(detection_tables, jobs, "v1", decode_workers=2)
+    # Worker processes are forked, so they load the stub instead of YOLO and report the torch thread cap as a metric
+    monkeypatch.setattr(yolo_enrichment, "load_model", lambda model_path: CountingStubModel())
+    fake_torch = types.ModuleType("torch")
+    fake_torch.set_num_threads = lambda threads: REGISTRY.set_gauge("test_torch_threads", threads)
+    monkeypatch.setitem(sys.modules, "torch", fake_torch)
+    REGISTRY.reset()
+
+    processed = detect_and_store_sharded("stub.pt", "v1", jobs_by_hash, num_workers=2, batch_size=2, decode_workers=1)
+
+    metrics = {m["name"]: m["value"] for m in REGISTRY.snapshot()}
+    REGISTRY.reset()
+    assert processed == 5
+    assert metrics["yolo_images_total"] == 5 # Model runs summed over both workers: no image was run twice
+    assert metrics["test_torch_threads"] == max(1, (os.cpu_count() or 1) // 2)
+    assert stored_images(detection_tables) == [(message_id, path, "v1") for message_id, path in jobs]